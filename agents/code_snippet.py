@@ -1,17 +1,22 @@
 # agents/code_snippet.py
+from typing import Iterator, Optional, Tuple
 from langchain.prompts import PromptTemplate
+from utils.context_budget import clip_text, get_context_budget, record_truncation, section_digest
+from utils.conversation import Turn, continuation
 from utils.llm_loader import load_llm
+from utils.output_limits import OutputLimit
 
-class CodeSnippetAgent:
-    def __init__(self, model_name: str = "codellama:7b"):
-        self.llm = load_llm(model=model_name)
-        self.prompt = PromptTemplate(
-            input_variables=["article_content"],
-            template="""
+# The prompts ask for 2-4 examples, or one for a single section; a further
+# "## " header means the model has moved on from its examples
+CODE_LIMIT = OutputLimit(num_predict=2048, max_items=4, max_sections=1, stop=["\n## Conclusion"])
+CODE_SECTION_LIMIT = OutputLimit(num_predict=1024, max_items=1, max_sections=1)
+
+# The whole-article prompt, shared by the standalone and continuation requests;
+# {source} either includes the article digest or points at the article in context
+CODE_TEMPLATE = """
             You are an expert programmer reviewing a technical article.
             
-            Article content:
-            {article_content}
+            {source}
             
             Your task is to enhance this article by adding relevant code examples where appropriate.
             Follow these guidelines:
@@ -39,6 +44,46 @@ class CodeSnippetAgent:
             
             (Repeat for each example)
             """
+
+class CodeSnippetAgent:
+    def __init__(self, model_name: str = "codellama:7b"):
+        self.llm = load_llm(model=model_name, agent="code_snippet")
+        self.prompt = PromptTemplate(
+            input_variables=["article_content"],
+            template=CODE_TEMPLATE.format(source=(
+                "Article content (long sections are abridged and end with [...]):\n"
+                "            {article_content}"
+            )),
+        )
+        # Sent with the content generation's context, which already holds the whole article
+        self.continue_prompt = PromptTemplate(
+            input_variables=[],
+            template=CODE_TEMPLATE.format(source="The article is the one written above."),
+        )
+        self.section_prompt = PromptTemplate(
+            input_variables=["section_title", "section_content"],
+            template="""
+            You are an expert programmer reviewing one section of a technical article.
+            
+            Section "{section_title}":
+            {section_content}
+            
+            Write ONE code example that significantly improves understanding of this section:
+            - Add a brief explanation of what the code demonstrates
+            - Provide a relevant code example in the appropriate language (Python, JavaScript, etc.)
+            - Add a short explanation of the code's key components
+            
+            Format your response in Markdown:
+            
+            ### Example: [Brief Title]
+            Brief explanation of what this code demonstrates.
+            
+            ```python
+            # Sample code here
+            ```
+            
+            Explanation of key components in the code.
+            """
         )
 
     def run(self, article_content: str) -> str:
@@ -51,6 +96,86 @@ class CodeSnippetAgent:
         Returns:
             str: Generated code examples in Markdown format.
         """
-        final_prompt = self.prompt.format(article_content=article_content)
-        response = self.llm.invoke(final_prompt)
-        return response
\ No newline at end of file
+        final_prompt, turn = self._article_prompt(article_content)
+        response = self.llm.invoke(final_prompt, limit=CODE_LIMIT, continues=turn)
+        return response
+
+    def stream(self, article_content: str) -> Iterator[str]:
+        """
+        Generate code snippets for an article, yielding them as they are generated.
+
+        Args:
+            article_content (str): The article content to enhance with code examples.
+
+        Yields:
+            str: Chunks of the code examples in Markdown format.
+        """
+        final_prompt, turn = self._article_prompt(article_content)
+        yield from self.llm.stream(final_prompt, limit=CODE_LIMIT, continues=turn)
+
+    async def arun(self, article_content: str) -> str:
+        """
+        Generate code snippets for an article without blocking the event loop.
+        
+        Args:
+            article_content (str): The article content to enhance with code examples.
+            
+        Returns:
+            str: Generated code examples in Markdown format.
+        """
+        final_prompt, turn = self._article_prompt(article_content)
+        response = await self.llm.ainvoke(final_prompt, limit=CODE_LIMIT, continues=turn)
+        return response
+
+    def run_for_section(self, section_title: str, section_content: str) -> str:
+        """
+        Generate a code example for a single article section.
+        
+        Args:
+            section_title (str): The "## " title of the section.
+            section_content (str): The section body.
+            
+        Returns:
+            str: One code example in Markdown format.
+        """
+        final_prompt = self._section_prompt(section_title, section_content)
+        return self.llm.invoke(final_prompt, limit=CODE_SECTION_LIMIT)
+
+    async def arun_for_section(self, section_title: str, section_content: str) -> str:
+        """
+        Async variant of run_for_section().
+        
+        Args:
+            section_title (str): The "## " title of the section.
+            section_content (str): The section body.
+            
+        Returns:
+            str: One code example in Markdown format.
+        """
+        final_prompt = self._section_prompt(section_title, section_content)
+        return await self.llm.ainvoke(final_prompt, limit=CODE_SECTION_LIMIT)
+
+    def _article_prompt(self, article_content: str) -> Tuple[str, Optional[Turn]]:
+        """
+        Build the whole-article prompt from a section digest that fits the digest budget.
+
+        When the article was generated on this model earlier in the run, the
+        request continues that generation's context instead, which holds the
+        whole article at no further prompt-evaluation cost.
+
+        Returns:
+            Tuple[str, Optional[Turn]]: The prompt, and the generation it continues.
+        """
+        follow_up = self.continue_prompt.format()
+        turn = continuation("content", self.llm.model, article_content, follow_up, CODE_LIMIT.num_predict)
+        if turn is not None:
+            return follow_up, turn
+        digest, dropped = section_digest(article_content, get_context_budget().digest_tokens)
+        record_truncation("code_snippet", "article", dropped)
+        return self.prompt.format(article_content=digest), None
+
+    def _section_prompt(self, section_title: str, section_content: str) -> str:
+        """Build the per-section prompt, clipping an overlong section to the digest budget."""
+        section_content, dropped = clip_text(section_content, get_context_budget().digest_tokens)
+        record_truncation("code_snippet", "section", dropped)
+        return self.section_prompt.format(section_title=section_title, section_content=section_content)
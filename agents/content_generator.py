@@ -1,18 +1,29 @@
 # agents/content_generator.py
+import asyncio
+import contextvars
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Tuple
 from langchain.prompts import PromptTemplate
+from utils.cancellation import check_cancelled
+from utils.context_budget import clip_text, get_context_budget, record_truncation
+from utils.conversation import Turn, continuation
 from utils.llm_loader import load_llm
+from utils.markdown_utils import demote_headers, extract_list_items
+from utils.output_limits import OutputLimit
 
-class ContentGeneratorAgent:
-    def __init__(self, model_name: str = "mistral"):
-        self.llm = load_llm(model=model_name)
-        self.prompt = PromptTemplate(
-            input_variables=["topic_analysis"],
-            template="""
+# Word caps sit 20-25% above each prompt's target; num_predict allows about
+# two tokens per capped word for Markdown and code
+ARTICLE_LIMIT = OutputLimit(num_predict=3072, max_words=1800, last_section=r"^conclusion")
+INTRO_LIMIT = OutputLimit(num_predict=512, max_words=250, max_sections=1, last_section=r"^introduction", stop=["\n## Conclusion"])
+CONCLUSION_LIMIT = OutputLimit(num_predict=512, max_words=190, max_sections=1)
+
+# The whole-article prompt, shared by the standalone and continuation requests;
+# {source} either includes the topic analysis or points at the one in context
+ARTICLE_TEMPLATE = """
             You are a technical writer creating a detailed article based on topic analysis.
             
-            Use the following topic analysis to create a comprehensive technical article (1000-1500 words):
-            
-            {topic_analysis}
+            {source}
             
             Your article should include:
             
@@ -31,6 +42,77 @@ class ContentGeneratorAgent:
             
             Format your response in Markdown with appropriate headers (# for main title, ## for sections, ### for subsections).
             """
+
+class ContentGeneratorAgent:
+    def __init__(self, model_name: str = "mistral"):
+        self.llm = load_llm(model=model_name, agent="content_generator")
+        self.prompt = PromptTemplate(
+            input_variables=["topic_analysis"],
+            template=ARTICLE_TEMPLATE.format(source=(
+                "Use the following topic analysis to create a comprehensive technical article (1000-1500 words):\n"
+                "            \n"
+                "            {topic_analysis}"
+            )),
+        )
+        # Sent with the analysis generation's context, which already holds the analysis
+        self.continue_prompt = PromptTemplate(
+            input_variables=[],
+            template=ARTICLE_TEMPLATE.format(source=(
+                "Use the topic analysis you wrote above to create a comprehensive technical article (1000-1500 words)."
+            )),
+        )
+        self.intro_prompt = PromptTemplate(
+            input_variables=["topic_analysis", "outline"],
+            template="""
+            You are a technical writer creating the opening of a detailed article based on topic analysis.
+            
+            {topic_analysis}
+            
+            The article will cover these sections, in order:
+            {outline}
+            
+            Write ONLY:
+            1. The article title as a Markdown "# " header on the first line
+            2. An introduction (150-200 words) giving a brief overview of the topic and why it's important/interesting
+            
+            Do not write the other sections or a conclusion.
+            """
+        )
+        self.section_prompt = PromptTemplate(
+            input_variables=["topic_analysis", "outline", "section", "word_count"],
+            template="""
+            You are a technical writer creating one section of a detailed article based on topic analysis.
+            
+            {topic_analysis}
+            
+            The article covers these sections, in order:
+            {outline}
+            
+            Write ONLY the body of the section "{section}" ({word_count} words):
+            - Detailed explanation of this sub-topic
+            - Technical concepts with clear explanations
+            - Practical applications and examples
+            
+            Do not repeat material that belongs to the other sections. Do not write an introduction or conclusion.
+            Format your response in Markdown, using ### for any subsections. Do not repeat the section title.
+            """
+        )
+        self.conclusion_prompt = PromptTemplate(
+            input_variables=["topic_analysis", "outline"],
+            template="""
+            You are a technical writer creating the conclusion of a detailed article based on topic analysis.
+            
+            {topic_analysis}
+            
+            The article covered these sections:
+            {outline}
+            
+            Write ONLY the conclusion (100-150 words):
+            - Summary of key points
+            - Future outlook or implications
+            
+            Format your response in Markdown. Do not include a header.
+            """
         )
 
     def run(self, topic_analysis: str) -> str:
@@ -43,6 +125,225 @@ class ContentGeneratorAgent:
         Returns:
             str: Generated article content in Markdown format.
         """
-        final_prompt = self.prompt.format(topic_analysis=topic_analysis)
-        response = self.llm.invoke(final_prompt)
-        return response
\ No newline at end of file
+        final_prompt, turn = self._article_prompt(topic_analysis)
+        response = self.llm.invoke(final_prompt, limit=ARTICLE_LIMIT, continues=turn, remember_as="content")
+        return response
+
+    def stream(self, topic_analysis: str) -> Iterator[str]:
+        """
+        Generate content based on topic analysis, yielding it as it is generated.
+
+        Args:
+            topic_analysis (str): Analysis from the topic analyzer agent.
+
+        Yields:
+            str: Chunks of the article content in Markdown format.
+        """
+        final_prompt, turn = self._article_prompt(topic_analysis)
+        yield from self.llm.stream(final_prompt, limit=ARTICLE_LIMIT, continues=turn, remember_as="content")
+
+    async def arun(self, topic_analysis: str) -> str:
+        """
+        Generate content based on topic analysis without blocking the event loop.
+        
+        Args:
+            topic_analysis (str): Analysis from the topic analyzer agent.
+            
+        Returns:
+            str: Generated article content in Markdown format.
+        """
+        final_prompt, turn = self._article_prompt(topic_analysis)
+        response = await self.llm.ainvoke(final_prompt, limit=ARTICLE_LIMIT, continues=turn, remember_as="content")
+        return response
+
+    async def astream(self, topic_analysis: str) -> AsyncIterator[str]:
+        """
+        Async variant of stream().
+        
+        Args:
+            topic_analysis (str): Analysis from the topic analyzer agent.
+            
+        Yields:
+            str: Chunks of the article content in Markdown format.
+        """
+        final_prompt, turn = self._article_prompt(topic_analysis)
+        async for token in self.llm.astream(final_prompt, limit=ARTICLE_LIMIT, continues=turn, remember_as="content"):
+            yield token
+
+    def plan_sections(self, topic_analysis: str, max_sections: int = 6) -> List[str]:
+        """
+        Turn the "Key Sub-Topics" of a topic analysis into body section titles.
+
+        Args:
+            topic_analysis (str): Analysis from the topic analyzer agent.
+            max_sections (int): Upper bound on the number of body sections.
+
+        Returns:
+            List[str]: Section titles, or an empty list if no sub-topics were found.
+        """
+        sections = []
+        for item in extract_list_items(topic_analysis, "Key Sub-Topics"):
+            # "Neural Networks: the core building block" -> "Neural Networks"
+            title = item.split(":", 1)[0].strip().rstrip(".")
+            if title and title not in sections:
+                sections.append(title)
+        return sections[:max_sections]
+
+    def run_sections(
+        self,
+        topic_analysis: str,
+        max_sections: int = 6,
+        on_section: Optional[Callable[[str, str], None]] = None,
+    ) -> str:
+        """
+        Generate the article one section per request, with all requests in flight at once.
+
+        The introduction, every body section and the conclusion are generated
+        concurrently and stitched into a single Markdown article. Falls back to
+        run() when the analysis has no usable sub-topics.
+
+        Args:
+            topic_analysis (str): Analysis from the topic analyzer agent.
+            max_sections (int): Upper bound on the number of body sections.
+            on_section (Callable[[str, str], None]): Called with (title, body) as
+                soon as each body section is finished, in completion order.
+
+        Returns:
+            str: Generated article content in Markdown format.
+        """
+        sections = self.plan_sections(topic_analysis, max_sections)
+        if len(sections) < 2:
+            return self.run(topic_analysis)
+
+        check_cancelled()
+        prompts = self._section_prompts(topic_analysis, sections)
+        limits = self._section_limits(sections)
+        with ThreadPoolExecutor(max_workers=len(prompts)) as pool:
+            # Copy the context so calls stay attributed to the current run's metrics
+            futures = [
+                pool.submit(contextvars.copy_context().run, self.llm.invoke, prompt, limit=limit)
+                for prompt, limit in zip(prompts, limits)
+            ]
+            if on_section:
+                body_futures = {futures[i + 1]: section for i, section in enumerate(sections)}
+                for future in as_completed(body_futures):
+                    section = body_futures[future]
+                    on_section(section, self._clean_part(future.result(), section))
+            responses = [future.result() for future in futures]
+        return self._stitch(sections, responses)
+
+    async def arun_sections(
+        self,
+        topic_analysis: str,
+        max_sections: int = 6,
+        on_section: Optional[Callable[[str, str], None]] = None,
+    ) -> str:
+        """
+        Async variant of run_sections().
+
+        Args:
+            topic_analysis (str): Analysis from the topic analyzer agent.
+            max_sections (int): Upper bound on the number of body sections.
+            on_section (Callable[[str, str], None]): Called with (title, body) as
+                soon as each body section is finished, in completion order.
+
+        Returns:
+            str: Generated article content in Markdown format.
+        """
+        sections = self.plan_sections(topic_analysis, max_sections)
+        if len(sections) < 2:
+            return await self.arun(topic_analysis)
+
+        prompts = self._section_prompts(topic_analysis, sections)
+        limits = self._section_limits(sections)
+
+        async def generate(index: int, prompt: str) -> str:
+            response = await self.llm.ainvoke(prompt, limit=limits[index])
+            if on_section and 0 < index <= len(sections):
+                section = sections[index - 1]
+                on_section(section, self._clean_part(response, section))
+            return response
+
+        responses = await asyncio.gather(*(generate(i, prompt) for i, prompt in enumerate(prompts)))
+        return self._stitch(sections, responses)
+
+    def _section_prompts(self, topic_analysis: str, sections: List[str]) -> List[str]:
+        """Build the intro, per-section and conclusion prompts, in article order."""
+        topic_analysis = self._fit_analysis(topic_analysis)
+        outline = "\n".join(f"- {section}" for section in sections)
+        word_count = f"{700 // len(sections)}-{1100 // len(sections)}"
+        prompts = [self.intro_prompt.format(topic_analysis=topic_analysis, outline=outline)]
+        for section in sections:
+            prompts.append(self.section_prompt.format(
+                topic_analysis=topic_analysis, outline=outline, section=section, word_count=word_count
+            ))
+        prompts.append(self.conclusion_prompt.format(topic_analysis=topic_analysis, outline=outline))
+        return prompts
+
+    def _section_limits(self, sections: List[str]) -> List[OutputLimit]:
+        """Output limits for the prompts of _section_prompts(), in the same order."""
+        max_words = (1100 // len(sections)) * 5 // 4
+        # A body may repeat its own title as a "## " header, but not start another section
+        section_limit = OutputLimit(
+            num_predict=max_words * 2, max_words=max_words, max_sections=1, stop=["\n## Conclusion"]
+        )
+        return [INTRO_LIMIT] + [section_limit] * len(sections) + [CONCLUSION_LIMIT]
+
+    def _article_prompt(self, topic_analysis: str) -> Tuple[str, Optional[Turn]]:
+        """
+        Build the whole-article prompt.
+
+        When the analysis was generated on this model earlier in the run, the
+        request continues that generation's context instead of repeating the
+        analysis, so the server does not evaluate it again.
+
+        Returns:
+            Tuple[str, Optional[Turn]]: The prompt, and the generation it continues.
+        """
+        follow_up = self.continue_prompt.format()
+        turn = continuation("analysis", self.llm.model, topic_analysis, follow_up, ARTICLE_LIMIT.num_predict)
+        if turn is not None:
+            return follow_up, turn
+        return self.prompt.format(topic_analysis=self._fit_analysis(topic_analysis)), None
+
+    def _fit_analysis(self, topic_analysis: str) -> str:
+        """Clip an overlong topic analysis, which every content prompt repeats, to the digest budget."""
+        topic_analysis, dropped = clip_text(topic_analysis, get_context_budget().digest_tokens)
+        record_truncation("content_generator", "analysis", dropped)
+        return topic_analysis
+
+    def _stitch(self, sections: List[str], responses: List[str]) -> str:
+        """
+        Join independently generated parts into one article with consistent headers.
+
+        Args:
+            sections (List[str]): Body section titles.
+            responses (List[str]): Intro, one response per section, then conclusion.
+
+        Returns:
+            str: The article in Markdown format.
+        """
+        intro, bodies, conclusion = responses[0], responses[1:-1], responses[-1]
+
+        parts = []
+        title_match = re.search(r'^#\s+(.+)$', intro, re.MULTILINE)
+        if title_match:
+            parts.append(f"# {title_match.group(1).strip()}")
+            intro = intro[:title_match.start()] + intro[title_match.end():]
+        parts.append("## Introduction\n\n" + self._clean_part(intro, "Introduction"))
+
+        for section, body in zip(sections, bodies):
+            parts.append(f"## {section}\n\n" + self._clean_part(body, section))
+
+        parts.append("## Conclusion\n\n" + self._clean_part(conclusion, "Conclusion"))
+        return "\n\n".join(parts)
+
+    def _clean_part(self, text: str, section: str) -> str:
+        """Drop a repeated leading section header and keep nested headers below ##."""
+        text = text.strip()
+        lines = text.split("\n", 1)
+        first = lines[0].lstrip("#").strip().strip("*").strip().rstrip(":").lower()
+        is_header = lines[0].startswith("#") and (first in section.lower() or section.lower() in first)
+        if is_header or first == section.lower():
+            text = lines[1].strip() if len(lines) > 1 else ""
+        return demote_headers(text, 3)
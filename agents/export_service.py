@@ -0,0 +1,146 @@
+# agents/export_service.py
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from agents.exporter import DOCX_RENDERER, render_docx, render_pdf, warm_up
+from utils.markdown_doc import Document
+from utils.cancellation import current_token, wait_event
+
+
+def _ready() -> bool:
+    return True
+
+
+class ExportService:
+    """
+    Persistent process pool that renders DOCX and PDF files.
+
+    Workers import the renderers and build their stylesheets once at startup
+    (see exporter.warm_up), so jobs only pay for rendering. Each export submits
+    the two formats as separate jobs, so they render in parallel, and the pool
+    is safe to share between concurrently running pipelines. Articles are
+    parsed in the calling process and sent to the workers as a Document, so
+    the Markdown is parsed once per export rather than once per format.
+    """
+
+    def __init__(self, workers: int = 2):
+        self.workers = workers
+        # Spawned rather than forked: the pipeline runs many threads, which fork does not copy safely
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=warm_up,
+        )
+        # Start every worker now instead of on the first export
+        for future in [self._pool.submit(_ready) for _ in range(workers)]:
+            future.result()
+
+    def submit(self, document: Document, title: str, output_dir: str) -> Tuple[Future, Future]:
+        """
+        Queue an export.
+
+        Args:
+            document (Document): The parsed article, from parse_markdown().
+            title (str): The title of the article.
+            output_dir (str): Directory to write the files to.
+
+        Returns:
+            Tuple[Future, Future]: Futures for (PDF path, PDF renderer) and the DOCX path.
+        """
+        pdf_future = self._pool.submit(render_pdf, document, title, output_dir)
+        docx_future = self._pool.submit(render_docx, document, title, output_dir)
+        return pdf_future, docx_future
+
+    def run(self, document: Document, title: str, output_dir: str) -> Tuple[str, str, str]:
+        """
+        Export an article and wait for both files.
+
+        Args:
+            document (Document): The parsed article, from parse_markdown().
+            title (str): The title of the article.
+            output_dir (str): Directory to write the files to.
+
+        Returns:
+            Tuple[str, str, str]: Paths to the generated PDF and DOCX files, and
+            the renderer that produced the PDF.
+
+        Raises:
+            RunCancelled: If the current cancellation token fires first; renders
+                that have not started are dropped, running ones finish in their worker.
+        """
+        pdf_future, docx_future = self.submit(document, title, output_dir)
+        self._wait(pdf_future, docx_future)
+        pdf_path, renderer = pdf_future.result()
+        return pdf_path, docx_future.result(), renderer
+
+    def render(self, fmt: str, document: Document, title: str, output_dir: str) -> Tuple[str, str]:
+        """
+        Export an article to one format and wait for the file.
+
+        Args:
+            fmt (str): "pdf" or "docx".
+            document (Document): The parsed article, from parse_markdown().
+            title (str): The title of the article.
+            output_dir (str): Directory to write the file to.
+
+        Returns:
+            Tuple[str, str]: Path to the generated file, and the renderer used.
+
+        Raises:
+            RunCancelled: As in run().
+        """
+        if fmt == "pdf":
+            future = self._pool.submit(render_pdf, document, title, output_dir)
+            self._wait(future)
+            return future.result()
+        future = self._pool.submit(render_docx, document, title, output_dir)
+        self._wait(future)
+        return future.result(), DOCX_RENDERER
+
+    @staticmethod
+    def _wait(*futures: Future) -> None:
+        """Wait for futures, dropping them if the current cancellation token fires first."""
+        token = current_token()
+        if token is None:
+            return
+        done = threading.Event()
+        for future in futures:
+            future.add_done_callback(lambda _: all(f.done() for f in futures) and done.set())
+        try:
+            wait_event(done, token, "export")
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+_service: Optional[ExportService] = None
+_service_lock = threading.Lock()
+
+
+def get_export_service() -> Optional[ExportService]:
+    """
+    Return the process-wide export pool, starting it on first use.
+
+    The pool size is read from EXPORT_WORKERS (default: up to 4, at least 2 so
+    both formats render at once); EXPORT_WORKERS=0 disables the pool and
+    exports run in the calling process.
+
+    Returns:
+        Optional[ExportService]: The shared service, or None if disabled.
+    """
+    global _service
+    workers = int(os.environ.get("EXPORT_WORKERS", max(2, min(4, os.cpu_count() or 1))))
+    if workers <= 0:
+        return None
+
+    with _service_lock:
+        if _service is None:
+            _service = ExportService(workers)
+        return _service
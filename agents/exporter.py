@@ -1,13 +1,256 @@
 # agents/exporter.py
+import html
 import os
-from typing import Tuple
-import markdown2
+import threading
+from importlib import metadata
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from utils.artifact_store import content_hash, get_artifact_store
+from utils.cancellation import check_cancelled
+from utils.markdown_doc import Document, parse_inline, parse_markdown, to_html
+from utils.metrics import REGISTRY
+
+_DEFAULT = object()
+
+# PDF backends in order of preference; "html" writes an HTML file instead of a PDF
+PDF_RENDERERS = ("weasyprint", "reportlab", "html")
+DOCX_RENDERER = "python-docx"
+
+# Bump when the rendering code changes output, so stored artifacts are not reused
+EXPORT_LAYOUT_VERSION = "1"
+
+WEASYPRINT_CSS = """
+body { font-family: Arial, sans-serif; margin: 40px; }
+h1 { color: #2c3e50; border-bottom: 2px solid #3498db; padding-bottom: 10px; }
+h1:first-of-type { margin-top: 0; }
+h2 { color: #34495e; margin-top: 30px; }
+h3 { color: #7f8c8d; }
+pre {
+    background-color: #f8f9fa;
+    padding: 15px;
+    border-radius: 8px;
+    border: 1px solid #dee2e6;
+    overflow-x: auto;
+    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+    margin: 15px 0;
+}
+code { font-family: 'Courier New', monospace; }
+p { line-height: 1.6; }
+"""
+
+def _writable(path: str) -> str:
+    """
+    Create the directory of a file about to be written and return the path.
+
+    Called right before each write rather than ahead of rendering, so an
+    artifact store directory that garbage collection removed while it was
+    still empty is recreated.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    return path
+
+
+_weasyprint = None
+_weasyprint_error = None
+_weasyprint_lock = threading.Lock()
+
+
+def _load_weasyprint():
+    """
+    Import WeasyPrint and build the stylesheet and font configuration once.
+    
+    Returns:
+        tuple: (HTML class, compiled stylesheet, FontConfiguration).
+        
+    Raises:
+        RuntimeError: If WeasyPrint or its native libraries are unavailable.
+        The failure is remembered, so later calls fail fast.
+    """
+    global _weasyprint, _weasyprint_error
+    with _weasyprint_lock:
+        if _weasyprint is None and _weasyprint_error is None:
+            try:
+                from weasyprint import CSS, HTML
+                from weasyprint.text.fonts import FontConfiguration
+                font_config = FontConfiguration()
+                _weasyprint = (HTML, CSS(string=WEASYPRINT_CSS, font_config=font_config), font_config)
+            except Exception as e:
+                _weasyprint_error = f"{type(e).__name__}: {e}"
+    if _weasyprint_error is not None:
+        raise RuntimeError(_weasyprint_error)
+    return _weasyprint
+
+
+@lru_cache(maxsize=None)
+def _reportlab_styles():
+    """Build the ReportLab stylesheet and code style once per process."""
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    
+    styles = getSampleStyleSheet()
+    code_style = ParagraphStyle(
+        'Code',
+        parent=styles['Normal'],
+        fontName='Courier',
+        fontSize=10,
+        leading=12,
+        leftIndent=12,
+        rightIndent=12,
+        spaceBefore=6,
+        spaceAfter=6,
+        borderPadding=5,
+        borderColor=styles['Normal'].textColor,
+        backColor='#f0f0f0'
+    )
+    return styles, code_style
+
+
+def _probe_weasyprint() -> None:
+    # Importing is not enough: the native libraries are only needed once rendering starts
+    HTML, stylesheet, font_config = _load_weasyprint()
+    HTML(string="<p>probe</p>").write_pdf(stylesheets=[stylesheet], font_config=font_config)
+
+
+@lru_cache(maxsize=None)
+def probe_renderers() -> Dict[str, Optional[str]]:
+    """
+    Check once per process which PDF backends work on this host.
+    
+    Returns:
+        Dict[str, Optional[str]]: For each name in PDF_RENDERERS, None if the
+        backend is usable, otherwise the reason it is not.
+    """
+    probes = {"weasyprint": _probe_weasyprint, "reportlab": _reportlab_styles, "html": lambda: None}
+    results = {}
+    for name in PDF_RENDERERS:
+        try:
+            probes[name]()
+            results[name] = None
+        except Exception as e:
+            results[name] = str(e) or type(e).__name__
+    return results
+
+
+def select_pdf_renderers() -> List[str]:
+    """
+    Return the PDF backends to use, best first.
+    
+    Operators can pin one backend with EXPORT_PDF_RENDERER; a pinned backend
+    is used on its own, without fallbacks.
+    
+    Returns:
+        List[str]: Usable backend names, in the order they are tried.
+        
+    Raises:
+        ValueError: If EXPORT_PDF_RENDERER names an unknown backend.
+        RuntimeError: If the pinned backend is not usable on this host.
+    """
+    probes = probe_renderers()
+    pinned = os.environ.get("EXPORT_PDF_RENDERER", "").strip().lower()
+    if pinned:
+        if pinned not in PDF_RENDERERS:
+            raise ValueError(f"EXPORT_PDF_RENDERER must be one of {', '.join(PDF_RENDERERS)}, got {pinned!r}")
+        if probes[pinned] is not None:
+            raise RuntimeError(f"Pinned PDF renderer {pinned} is unavailable: {probes[pinned]}")
+        return [pinned]
+    return [name for name in PDF_RENDERERS if probes[name] is None]
+
+
+def renderer_config() -> dict:
+    """
+    Describe the export backends selected on this host.
+    
+    Returns:
+        dict: The selected "pdf" and "docx" renderers, the PDF fallbacks, the
+        pinned backend (if any) and why unavailable backends were skipped.
+    """
+    selected = select_pdf_renderers()
+    return {
+        "pdf": selected[0],
+        "pdf_fallbacks": selected[1:],
+        "docx": DOCX_RENDERER,
+        "pinned": os.environ.get("EXPORT_PDF_RENDERER") or None,
+        "unavailable": {name: reason for name, reason in probe_renderers().items() if reason is not None},
+    }
+
+
+@lru_cache(maxsize=None)
+def renderer_version(name: str) -> str:
+    """
+    Identify a renderer and its installed version, for keying stored artifacts.
+    
+    Args:
+        name (str): A name from PDF_RENDERERS, or DOCX_RENDERER.
+        
+    Returns:
+        str: e.g. "reportlab-4.2.0/1", where the suffix is EXPORT_LAYOUT_VERSION.
+    """
+    try:
+        version = metadata.version(name) if name != "html" else "builtin"
+    except metadata.PackageNotFoundError:
+        version = "unknown"
+    return f"{name}-{version}/{EXPORT_LAYOUT_VERSION}"
+
+
+def warm_up() -> None:
+    """
+    Import the renderers and build their styles ahead of the first export.
+    
+    Used as the export worker initializer; missing optional renderers are
+    recorded by the probe and skipped.
+    """
+    try:
+        import docx  # noqa: F401
+    except ImportError:
+        pass
+    probe_renderers()
+
+
+_worker_agent: Optional["ExporterAgent"] = None
+
+
+def _worker_exporter(output_dir: str) -> "ExporterAgent":
+    global _worker_agent
+    if _worker_agent is None:
+        _worker_agent = ExporterAgent(output_dir, service=None, store=None)
+    return _worker_agent
+
+
+def render_docx(document: Document, title: str, output_dir: str) -> str:
+    """Render a DOCX file; a module-level entry point for export worker processes."""
+    return _worker_exporter(output_dir)._create_docx(document, title, output_dir)
+
+
+def render_pdf(document: Document, title: str, output_dir: str) -> Tuple[str, str]:
+    """Render a PDF (or fallback) file and return (path, renderer); a module-level entry point for export worker processes."""
+    return _worker_exporter(output_dir)._render_pdf(document, title, output_dir)
+
 
 class ExporterAgent:
-    def __init__(self, output_dir: str = "output"):
+    def __init__(self, output_dir: str = "output", service=_DEFAULT, store=_DEFAULT):
+        """
+        Args:
+            output_dir (str): Directory the exported files are written to.
+            service (ExportService): Worker pool that renders the formats in
+                parallel. Defaults to the shared pool; pass None to render
+                in-process.
+            store (ArtifactStore): Content-addressed store that files are
+                written to and reused from. Defaults to the shared store for
+                output_dir; pass None to write <title>.pdf/.docx directly.
+        """
         self.output_dir = output_dir
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
+        if service is _DEFAULT:
+            from agents.export_service import get_export_service
+            service = get_export_service()
+        self.service = service
+        self.store = get_artifact_store(output_dir) if store is _DEFAULT else store
+        
+        # Probed once per process; fail fast on a bad EXPORT_PDF_RENDERER pin
+        self.renderers = renderer_config()
+        REGISTRY.set_gauge("article_export_renderer_info", 1, labels={"format": "pdf", "renderer": self.renderers["pdf"]})
+        REGISTRY.set_gauge("article_export_renderer_info", 1, labels={"format": "docx", "renderer": DOCX_RENDERER})
 
     def run(self, content: str, title: str) -> Tuple[str, str]:
         """
@@ -19,142 +262,196 @@ class ExporterAgent:
             
         Returns:
             Tuple[str, str]: Paths to the generated PDF and DOCX files.
+
+        Raises:
+            RunCancelled: If the current cancellation token fires before the files are written.
         """
-        # Create DOCX
-        docx_path = self._create_docx(content, title)
+        check_cancelled("export")
+        if self.store is None:
+            pdf_path, docx_path, _ = self._render(parse_markdown(content), title, self.output_dir)
+            return pdf_path, docx_path
         
-        # Try to create PDF with multiple fallback options
-        pdf_path = self._create_pdf_with_fallback(content, title)
+        # Identical content rendered by the same renderer versions is reused as is
+        digest = content_hash(content, title)
+        pdf_path = self.store.lookup(digest, "pdf", *self._renderer_versions("pdf"))
+        docx_path = self.store.lookup(digest, "docx", *self._renderer_versions("docx"))
+        if pdf_path and docx_path:
+            REGISTRY.inc("article_export_cache_total", labels={"result": "hit"})
+            return pdf_path, docx_path
         
+        REGISTRY.inc("article_export_cache_total", labels={"result": "miss"})
+        pdf_path, docx_path, renderer = self._render(parse_markdown(content), title, self.store.directory_for(digest))
+        self.store.register(digest, "pdf", renderer_version(renderer), pdf_path)
+        self.store.register(digest, "docx", renderer_version(DOCX_RENDERER), docx_path)
         return pdf_path, docx_path
 
-    def _create_pdf_with_fallback(self, content: str, title: str) -> str:
+    def export(self, fmt: str, content: str, title: str) -> str:
         """
-        Try multiple methods to create PDF, with fallbacks.
-        
+        Export the content to one format, so the formats can be produced independently.
+
         Args:
+            fmt (str): "pdf" or "docx".
             content (str): The formatted article content in Markdown format.
             title (str): The title of the article.
+
+        Returns:
+            str: Path to the generated file (for "pdf", possibly the HTML fallback).
+
+        Raises:
+            ValueError: If fmt is not a supported format.
+            RunCancelled: If the current cancellation token fires before the file is written.
+        """
+        if fmt not in ("pdf", "docx"):
+            raise ValueError(f"Unsupported export format {fmt!r}")
+        check_cancelled("export")
+        if self.store is None:
+            return self._render_one(fmt, parse_markdown(content), title, self.output_dir)[0]
+
+        digest = content_hash(content, title)
+        path = self.store.lookup(digest, fmt, *self._renderer_versions(fmt))
+        if path:
+            REGISTRY.inc("article_export_cache_total", labels={"result": "hit"})
+            return path
+
+        REGISTRY.inc("article_export_cache_total", labels={"result": "miss"})
+        path, renderer = self._render_one(fmt, parse_markdown(content), title, self.store.directory_for(digest))
+        self.store.register(digest, fmt, renderer_version(renderer), path)
+        return path
+
+    def _renderer_versions(self, fmt: str) -> List[str]:
+        """
+        Versions of every renderer that may produce fmt on this host, best first.
+
+        Artifacts are registered under the renderer that actually ran, which
+        is a fallback when the preferred one fails on an article, so lookups
+        try each of them.
+        """
+        if fmt == "pdf":
+            names = [self.renderers["pdf"]] + self.renderers["pdf_fallbacks"]
+        else:
+            names = [DOCX_RENDERER]
+        return [renderer_version(name) for name in names]
+
+    def _render_one(self, fmt: str, document: Document, title: str, output_dir: str) -> Tuple[str, str]:
+        """
+        Render one format into output_dir, on the worker pool when available.
+
+        Workers receive the already parsed document rather than parsing the
+        Markdown again.
+
+        Returns:
+            Tuple[str, str]: The path and the renderer used.
+        """
+        if self.service is not None:
+            try:
+                path, renderer = self.service.render(fmt, document, title, output_dir)
+                REGISTRY.inc("article_exports_total", labels={"format": fmt, "renderer": renderer})
+                return path, renderer
+            except BrokenProcessPool as e:
+                print(f"Export workers failed ({e}); exporting in-process.")
+
+        if fmt == "pdf":
+            path, renderer = self._render_pdf(document, title, output_dir)
+        else:
+            path, renderer = self._create_docx(document, title, output_dir), DOCX_RENDERER
+        REGISTRY.inc("article_exports_total", labels={"format": fmt, "renderer": renderer})
+        return path, renderer
+
+    def _render(self, document: Document, title: str, output_dir: str) -> Tuple[str, str, str]:
+        """
+        Render both formats into output_dir, on the worker pool when available.
+
+        Both formats, in-process or in the workers, render the one parsed document.
+        
+        Returns:
+            Tuple[str, str, str]: The PDF path, the DOCX path and the PDF renderer used.
+        """
+        if self.service is not None:
+            try:
+                pdf_path, docx_path, renderer = self.service.run(document, title, output_dir)
+                return self._exported(pdf_path, docx_path, renderer)
+            except BrokenProcessPool as e:
+                print(f"Export workers failed ({e}); exporting in-process.")
+        
+        # Create DOCX
+        docx_path = self._create_docx(document, title, output_dir)
+        check_cancelled("export")
+        
+        # Create PDF with the best available renderer
+        pdf_path, renderer = self._render_pdf(document, title, output_dir)
+        
+        return self._exported(pdf_path, docx_path, renderer)
+
+    @staticmethod
+    def _exported(pdf_path: str, docx_path: str, renderer: str) -> Tuple[str, str, str]:
+        """Count a finished export by renderer and pass its results through."""
+        REGISTRY.inc("article_exports_total", labels={"format": "pdf", "renderer": renderer})
+        REGISTRY.inc("article_exports_total", labels={"format": "docx", "renderer": DOCX_RENDERER})
+        return pdf_path, docx_path, renderer
+
+    def _render_pdf(self, document: Document, title: str, output_dir: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Render the PDF with the backends from select_pdf_renderers(), in order.
+        
+        Backends found unusable at startup are never attempted; a backend that
+        fails on this particular article falls through to the next one.
+        
+        Args:
+            document (Document): The parsed article, from parse_markdown().
+            title (str): The title of the article.
+            output_dir (str): Directory to write to. Defaults to self.output_dir.
             
         Returns:
-            str: Path to the generated PDF file (or fallback).
+            Tuple[str, str]: Path to the generated file, and the renderer used.
         """
         sanitized_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip().replace(' ', '_')
-        pdf_path = os.path.join(self.output_dir, f"{sanitized_title}.pdf")
+        pdf_path = os.path.join(output_dir or self.output_dir, f"{sanitized_title}.pdf")
         
-        # Method 1: Try WeasyPrint
-        try:
-            from weasyprint import HTML
-            import re
-            html_content = markdown2.markdown(content, extras=['fenced-code-blocks', 'tables'])
-            html_content = re.sub(r'<h1.*?>\s*' + re.escape(title) + r'\s*</h1>', '', html_content, flags=re.IGNORECASE)
-            # Add enhanced styling with code block borders and better formatting
-            styled_html = f"""
-            <html>
-            <head>
-                <style>
-                    body {{ font-family: Arial, sans-serif; margin: 40px; }}
-                    h1 {{ color: #2c3e50; border-bottom: 2px solid #3498db; padding-bottom: 10px; }}
-                    h1:first-of-type {{ margin-top: 0; }}
-                    h2 {{ color: #34495e; margin-top: 30px; }}
-                    h3 {{ color: #7f8c8d; }}
-                    pre {{ 
-                        background-color: #f8f9fa; 
-                        padding: 15px; 
-                        border-radius: 8px; 
-                        border: 1px solid #dee2e6;
-                        overflow-x: auto; 
-                        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                        margin: 15px 0;
-                    }}
-                    code {{ font-family: 'Courier New', monospace; }}
-                    p {{ line-height: 1.6; }}                    
-                </style>
-            </head>
-            <body>
-                <h1>{title}</h1>
-                {html_content}
-            </body>
-            </html>
-            """
-            HTML(string=styled_html).write_pdf(pdf_path)
-            return pdf_path
-            
-        except Exception as e:
-            print(f"WeasyPrint failed: {e}")
-            # Continue to fallback methods
+        # Every backend renders the same parsed document tree
+        renderers = select_pdf_renderers()
+        for name in renderers:
+            try:
+                return getattr(self, f"_pdf_{name}")(document, title, pdf_path), name
+            except Exception as e:
+                print(f"PDF renderer {name} failed: {e}")
+        raise RuntimeError(f"Every PDF renderer failed: {', '.join(renderers)}")
+
+    def _pdf_weasyprint(self, document: Document, title: str, pdf_path: str) -> str:
+        HTML, stylesheet, font_config = _load_weasyprint()
+        styled_html = f"""
+        <html>
+        <body>
+            <h1>{html.escape(title)}</h1>
+            {to_html(document, skip_title=title)}
+        </body>
+        </html>
+        """
+        HTML(string=styled_html).write_pdf(_writable(pdf_path), stylesheets=[stylesheet], font_config=font_config)
+        return pdf_path
+
+    def _pdf_reportlab(self, document: Document, title: str, pdf_path: str) -> str:
+        from reportlab.lib.pagesizes import letter
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
         
-        # Method 2: Try ReportLab (if available)
-        try:
-            from reportlab.lib.pagesizes import letter
-            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from reportlab.lib.enums import TA_LEFT
-            
-            # Create a simple PDF with ReportLab
-            doc = SimpleDocTemplate(pdf_path, pagesize=letter)
-            styles = getSampleStyleSheet()
-            story = []
-            
-            # Add title
-            title_para = Paragraph(title, styles['Title'])
-            story.append(title_para)
-            story.append(Spacer(1, 12))
-            
-            code_style = ParagraphStyle(
-                'Code',
-                parent=styles['Normal'],
-                fontName='Courier',
-                fontSize=10,
-                leading=12,
-                leftIndent=12,
-                rightIndent=12,
-                spaceBefore=6,
-                spaceAfter=6,
-                borderPadding=5,
-                borderColor=styles['Normal'].textColor,
-                backColor='#f0f0f0'
-            )
-
-            # Process content with basic Markdown support
-            lines = content.split('\n')
-            in_code_block = False
-            for line in lines:
-                if line.startswith('```'):
-                    if in_code_block:
-                        # End of a code block
-                        para = Paragraph(''.join(code_content).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;'), code_style)
-                        story.append(para)
-                        code_content = []
-                    in_code_block = not in_code_block
-                elif in_code_block:
-                    # Accumulate lines within a code block
-                    code_content.append(line + '\n')
-                elif line.startswith('# ') and title.lower() in line.lower():
-                    continue # Skip title, already added
-                elif line.startswith('## '):
-                    story.append(Paragraph(line[3:], styles['h2']))
-                elif line.startswith('### '):
-                    story.append(Paragraph(line[4:], styles['h3']))
-                elif line.strip() and not line.startswith('#'):
-                    para = Paragraph(line, styles['Normal'])
-                    story.append(para)
-                elif not line.strip() and not in_code_block:
-                    story.append(Spacer(1, 12))
-            
-            doc.build(story)
-            return pdf_path
-            
-        except ImportError:
-            print("ReportLab not available.")
-        except Exception as e:
-            print(f"ReportLab failed: {e}")
+        # Create a simple PDF with ReportLab
+        doc = SimpleDocTemplate(pdf_path, pagesize=letter)
+        styles, code_style = _reportlab_styles()
+        story = []
+        
+        # Add title
+        title_para = Paragraph(html.escape(title), styles['Title'])
+        story.append(title_para)
+        story.append(Spacer(1, 12))
         
-        # Method 3: Fallback to HTML
-        import re
+        story.extend(self._reportlab_story(document, title, styles, code_style))
+        
+        _writable(pdf_path)
+        doc.build(story)
+        return pdf_path
+
+    def _pdf_html(self, document: Document, title: str, pdf_path: str) -> str:
         html_path = pdf_path.replace('.pdf', '.html')
-        html_content = markdown2.markdown(content, extras=['fenced-code-blocks', 'tables'])
-        html_content = re.sub(r'<h1.*?>\s*' + re.escape(title) + r'\s*</h1>', '', html_content, flags=re.IGNORECASE)
+        html_content = to_html(document, skip_title=title)
         
         # Add enhanced styling with code block borders and better formatting
         styled_html = f"""
@@ -180,26 +477,28 @@ class ExporterAgent:
             </style>
         </head>
         <body>
-            <h1>{title}</h1>
+            <h1>{html.escape(title)}</h1>
             {html_content}
         </body>
         </html>
         """
         
-        with open(html_path, 'w', encoding='utf-8') as f:
+        with open(_writable(html_path), 'w', encoding='utf-8') as f:
             f.write(styled_html)
         
-        print(f"PDF generation failed. Created HTML file instead: {html_path}")
+        print(f"Created HTML file instead of a PDF: {html_path}")
         return html_path
 
-    def _create_docx(self, markdown_content: str, title: str) -> str:
+    def _create_docx(self, document: Document, title: str, output_dir: Optional[str] = None) -> str:
         """
-        Create a DOCX file from Markdown content with improved code snippet handling.
+        Create a DOCX file from a parsed Markdown document with improved code snippet handling.
         """
         from docx import Document
         from docx.shared import Pt, RGBColor
         from docx.enum.text import WD_COLOR_INDEX
         from docx.shared import Inches
+        from docx.oxml import OxmlElement
+        from docx.oxml.ns import qn
         
         doc = Document()
         # Set document properties
@@ -211,63 +510,168 @@ class ExporterAgent:
         title_para.style.font.size = Pt(24)
         title_para.style.font.color.rgb = RGBColor(44, 62, 80)  # Dark blue
         
-        # Parse markdown content
-        lines = markdown_content.split('\n')
-        in_code_block = False
-        code_language = ""
-        code_content = []
-        
-        for line in lines:
-            if line.startswith('```'):
-                # Code block start/end
-                if in_code_block:
-                    # End code block - add formatted code
-                    if code_content:
-                        # Add a note about the code block
-                        if code_language:
-                            p = doc.add_paragraph()
-                            p.add_run(f"Code example ({code_language}):").italic = True
-                        
-                        # Add code content with monospace font and better formatting
-                        code_para = doc.add_paragraph()
-                        code_para.paragraph_format.left_indent = Inches(0.3)
-                        code_para.paragraph_format.right_indent = Inches(0.3)
-                        code_para.paragraph_format.space_before = Pt(6)
-                        code_para.paragraph_format.space_after = Pt(6)
-                        
-                        run = code_para.add_run()
-                        run.font.name = 'Courier New'
-                        run.font.size = Pt(10)
-                        run.text = '\n'.join(code_content)
-                        
-                        # Apply light gray background to the paragraph's formatting
-                        shd = code_para.paragraph_format.shading
-                        # The python-docx library expects a specific format for shading.
-                        # This is a way to apply a solid fill color.
-                        shd.element.xpath('w:shd')[0].attrib['{http://schemas.openxmlformats.org/wordprocessingml/2006/main}fill'] = "F0F0F0" # Light Gray
-                        # Add spacing after code block
-                        spacer = doc.add_paragraph()
-                        spacer.paragraph_format.space_before = Pt(12)
-                    
-                    # Reset code block variables
-                    in_code_block = False
-                    code_language = ""
-                    code_content = []
-                else:
-                    in_code_block = True
-                    code_language = line[3:].strip() if len(line) > 3 else ""
-            elif in_code_block:
-                code_content.append(line)
-            elif line.startswith('# ') and title.lower() in line.lower():
-                continue # Skip title, already added as main heading
-            elif line.startswith('## '):
-                doc.add_heading(line[3:], level=2)
-            elif line.startswith('### '):
-                doc.add_heading(line[4:], level=3)
-            elif line.strip():
-                doc.add_paragraph(line)
+        # Walk the parsed document
+        skip_title = title
+        for block in document.blocks:
+            if skip_title is not None and document.is_title(block, skip_title):
+                skip_title = None # Skip title, already added as main heading
+            elif block.kind == "heading":
+                doc.add_heading(block.text, level=min(block.level, 4))
+            elif block.kind == "paragraph":
+                self._add_docx_runs(doc.add_paragraph(), block.text)
+            elif block.kind == "list":
+                base = "List Number" if block.ordered else "List Bullet"
+                for level, text in block.items:
+                    style = base if level == 0 else f"{base} {min(level + 1, 3)}"
+                    self._add_docx_runs(doc.add_paragraph(style=style), text)
+            elif block.kind == "quote":
+                self._add_docx_runs(doc.add_paragraph(style="Quote"), block.text)
+            elif block.kind == "table":
+                columns = max(len(row) for row in block.rows)
+                table = doc.add_table(rows=len(block.rows), cols=columns)
+                table.style = "Table Grid"
+                for row_index, row in enumerate(block.rows):
+                    for column, cell in enumerate(row):
+                        paragraph = table.cell(row_index, column).paragraphs[0]
+                        self._add_docx_runs(paragraph, cell, bold=row_index == 0)
+            elif block.kind == "code" and block.text:
+                # Add a note about the code block
+                if block.language:
+                    p = doc.add_paragraph()
+                    p.add_run(f"Code example ({block.language}):").italic = True
+                
+                # Add code content with monospace font and better formatting
+                code_para = doc.add_paragraph()
+                code_para.paragraph_format.left_indent = Inches(0.3)
+                code_para.paragraph_format.right_indent = Inches(0.3)
+                code_para.paragraph_format.space_before = Pt(6)
+                code_para.paragraph_format.space_after = Pt(6)
+                
+                run = code_para.add_run()
+                run.font.name = 'Courier New'
+                run.font.size = Pt(10)
+                run.text = block.text
+                
+                # Apply light gray background to the paragraph's formatting.
+                # python-docx has no shading API, so add a w:shd element directly.
+                shd = OxmlElement('w:shd')
+                shd.set(qn('w:val'), 'clear')
+                shd.set(qn('w:color'), 'auto')
+                shd.set(qn('w:fill'), 'F0F0F0')  # Light Gray
+                code_para._p.get_or_add_pPr().append(shd)
+                # Add spacing after code block
+                spacer = doc.add_paragraph()
+                spacer.paragraph_format.space_before = Pt(12)
         
         sanitized_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip().replace(' ', '_')
-        docx_path = os.path.join(self.output_dir, f"{sanitized_title}.docx")
-        doc.save(docx_path)
-        return docx_path
\ No newline at end of file
+        docx_path = os.path.join(output_dir or self.output_dir, f"{sanitized_title}.docx")
+        doc.save(_writable(docx_path))
+        return docx_path
+
+    @staticmethod
+    def _add_docx_runs(paragraph, text: str, bold: bool = False) -> None:
+        """
+        Add inline Markdown to a DOCX paragraph as styled runs.
+        
+        Args:
+            paragraph: The python-docx paragraph to append to.
+            text (str): Inline Markdown text.
+            bold (bool): Make every run bold, e.g. for table headers.
+        """
+        from docx.shared import Pt, RGBColor
+        
+        for span in parse_inline(text):
+            run = paragraph.add_run(span.text)
+            run.bold = span.bold or bold or None
+            run.italic = span.italic or None
+            if span.code:
+                run.font.name = 'Courier New'
+                run.font.size = Pt(10)
+            if span.href:
+                run.underline = True
+                run.font.color.rgb = RGBColor(52, 152, 219)
+
+    @staticmethod
+    def _reportlab_markup(text: str) -> str:
+        """Convert inline Markdown to ReportLab paragraph markup."""
+        parts = []
+        for span in parse_inline(text):
+            part = html.escape(span.text, quote=False)
+            if span.code:
+                part = f'<font face="Courier">{part}</font>'
+            if span.bold:
+                part = f"<b>{part}</b>"
+            if span.italic:
+                part = f"<i>{part}</i>"
+            if span.href:
+                part = f'<a href="{html.escape(span.href)}" color="blue">{part}</a>'
+            parts.append(part)
+        return ''.join(parts)
+
+    def _reportlab_story(self, document: Document, title: str, styles, code_style) -> list:
+        """
+        Build ReportLab flowables for a parsed document.
+        
+        Args:
+            document (Document): The parsed article.
+            title (str): The article title; its heading is skipped, since the
+                title is already added.
+            styles: ReportLab sample style sheet.
+            code_style: Paragraph style for code blocks.
+            
+        Returns:
+            list: The flowables, in document order.
+        """
+        from reportlab.lib import colors
+        from reportlab.lib.styles import ParagraphStyle
+        from reportlab.platypus import Paragraph, Preformatted, Spacer, Table, TableStyle
+        
+        heading_styles = {1: styles['h1'], 2: styles['h2']}
+        quote_style = ParagraphStyle('Quote', parent=styles['Normal'], leftIndent=24, textColor=colors.grey)
+        list_styles = {}
+        story = []
+        skip_title = title
+        for block in document.blocks:
+            if skip_title is not None and document.is_title(block, skip_title):
+                skip_title = None
+                continue
+            if block.kind == "heading":
+                story.append(Paragraph(self._reportlab_markup(block.text), heading_styles.get(block.level, styles['h3'])))
+            elif block.kind == "paragraph":
+                story.append(Paragraph(self._reportlab_markup(block.text), styles['Normal']))
+                story.append(Spacer(1, 12))
+            elif block.kind == "list":
+                counters = []
+                for level, text in block.items:
+                    # One counter per nesting level; returning to a level resumes its count
+                    del counters[level + 1:]
+                    counters.extend([0] * (level + 1 - len(counters)))
+                    counters[level] += 1
+                    bullet = f"{counters[level]}." if block.ordered else "•"
+                    if level not in list_styles:
+                        list_styles[level] = ParagraphStyle(
+                            f'ListItem{level}', parent=styles['Normal'],
+                            leftIndent=18 * (level + 1), bulletIndent=18 * level + 6
+                        )
+                    story.append(Paragraph(self._reportlab_markup(text), list_styles[level], bulletText=bullet))
+                story.append(Spacer(1, 12))
+            elif block.kind == "code":
+                story.append(Preformatted(block.text, code_style))
+            elif block.kind == "table":
+                data = [[Paragraph(self._reportlab_markup(cell), styles['Normal']) for cell in row] for row in block.rows]
+                columns = max(len(row) for row in data)
+                data = [row + [''] * (columns - len(row)) for row in data]
+                table = Table(data, repeatRows=1)
+                table.setStyle(TableStyle([
+                    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f0f0f0')),
+                    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+                ]))
+                story.append(table)
+                story.append(Spacer(1, 12))
+            elif block.kind == "quote":
+                story.append(Paragraph(self._reportlab_markup(block.text), quote_style))
+                story.append(Spacer(1, 12))
+            elif block.kind == "rule":
+                story.append(Spacer(1, 12))
+        return story
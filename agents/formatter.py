@@ -1,18 +1,21 @@
 # agents/formatter.py
 import re
-from typing import Tuple
+from typing import Dict, Tuple, Union
+from utils.markdown_doc import parse_markdown
 
 class FormatterAgent:
     def __init__(self):
         pass
 
-    def run(self, content: str, code_snippets: str = "") -> str:
+    def run(self, content: str, code_snippets: Union[str, Dict[str, str]] = "") -> str:
         """
         Format the article content with consistent styling and add code snippets if provided.
         
         Args:
             content (str): The main article content in Markdown format.
-            code_snippets (str): Optional code snippets to include.
+            code_snippets (Union[str, Dict[str, str]]): Optional code snippets to include.
+                A string is inserted as one block before the conclusion; a dict
+                maps "## " section titles to the examples for that section.
             
         Returns:
             str: Formatted article content in Markdown format.
@@ -20,6 +23,10 @@ class FormatterAgent:
         # Clean up any extra whitespace
         formatted_content = re.sub(r'\n{3,}', '\n\n', content.strip())
         
+        if isinstance(code_snippets, dict):
+            # Examples land in their own section; any left over fall through to the default placement
+            formatted_content, code_snippets = self._attach_to_sections(formatted_content, code_snippets)
+
         # Add code snippets if provided
         if code_snippets:
             # Insert code snippets before the conclusion section
@@ -32,6 +39,36 @@ class FormatterAgent:
         
         return formatted_content
 
+    def _attach_to_sections(self, content: str, code_by_section: Dict[str, str]) -> Tuple[str, str]:
+        """
+        Insert each section's code examples at the end of that section.
+        
+        Args:
+            content (str): The article content in Markdown format.
+            code_by_section (Dict[str, str]): Code examples keyed by "## " section title.
+            
+        Returns:
+            Tuple[str, str]: The content with examples attached, and any examples
+            whose section was not found, joined for the default placement.
+        """
+        pending = {title.strip(): snippet.strip() for title, snippet in code_by_section.items() if snippet.strip()}
+        lines = []
+        current = None
+        in_code_block = False
+
+        for line in content.split('\n'):
+            if line.startswith('```'):
+                in_code_block = not in_code_block
+            if not in_code_block and line.startswith('## '):
+                if current in pending:
+                    lines.extend([pending.pop(current), ''])
+                current = line[3:].strip()
+            lines.append(line)
+        if current in pending:
+            lines.extend(['', pending.pop(current)])
+
+        return '\n'.join(lines), '\n\n'.join(pending.values())
+
     def extract_title(self, content: str) -> str:
         """
         Extract the main title from the content.
@@ -42,8 +79,5 @@ class FormatterAgent:
         Returns:
             str: The main title.
         """
-        # Find the first H1 header
-        match = re.search(r'^#\s+(.+)$', content, re.MULTILINE)
-        if match:
-            return match.group(1).strip()
-        return "Technical Article"
\ No newline at end of file
+        # Find the first H1 header; the parsed document is reused by the exporter
+        return parse_markdown(content).title or "Technical Article"
\ No newline at end of file
@@ -1,10 +1,15 @@
 # agents/topic_analyzer.py
+from typing import Iterator
 from langchain.prompts import PromptTemplate
 from utils.llm_loader import load_llm
+from utils.output_limits import OutputLimit
+
+# The analysis ends with its "Practical Applications" list
+ANALYSIS_LIMIT = OutputLimit(num_predict=1024, max_words=600, last_section=r"practical applications")
 
 class TopicAnalyzerAgent:
     def __init__(self, model_name: str = "mistral"):
-        self.llm = load_llm(model=model_name)
+        self.llm = load_llm(model=model_name, agent="topic_analyzer")
         self.prompt = PromptTemplate(
             input_variables=["topic"],
             template="""
@@ -38,5 +43,32 @@ class TopicAnalyzerAgent:
             str: Structured analysis text.
         """
         final_prompt = self.prompt.format(topic=topic)
-        response = self.llm.invoke(final_prompt)
+        response = self.llm.invoke(final_prompt, limit=ANALYSIS_LIMIT, remember_as="analysis")
+        return response
+
+    def stream(self, topic: str) -> Iterator[str]:
+        """
+        Analyze the topic using the LLM, yielding the analysis as it is generated.
+
+        Args:
+            topic (str): Raw topic input from user.
+
+        Yields:
+            str: Chunks of the structured analysis text.
+        """
+        final_prompt = self.prompt.format(topic=topic)
+        yield from self.llm.stream(final_prompt, limit=ANALYSIS_LIMIT, remember_as="analysis")
+
+    async def arun(self, topic: str) -> str:
+        """
+        Analyze the topic using the LLM without blocking the event loop.
+
+        Args:
+            topic (str): Raw topic input from user.
+
+        Returns:
+            str: Structured analysis text.
+        """
+        final_prompt = self.prompt.format(topic=topic)
+        response = await self.llm.ainvoke(final_prompt, limit=ANALYSIS_LIMIT, remember_as="analysis")
         return response
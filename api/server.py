@@ -0,0 +1,259 @@
+# api/server.py
+import argparse
+import json
+import mimetypes
+import os
+import re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from orchestrator.jobs import TERMINAL_STATES, JobManager, QueueFull, get_job_manager
+from utils.llm_scheduler import BATCH
+from utils.metrics import REGISTRY
+from utils.model_residency import get_residency
+
+REGISTRY.describe("article_api_requests_total", "HTTP API requests by route and status code.")
+REGISTRY.describe("article_api_rejected_total", "Job submissions rejected because the queue was full.")
+
+DEFAULT_MAX_QUEUE = 16
+MAX_LIST_LIMIT = 100
+KEEPALIVE_SECONDS = 15.0
+
+_JOB_ROUTE = re.compile(r"^/jobs/(?P<id>[0-9a-f]+)(?:/(?P<action>events|result|artifacts/(?P<format>pdf|docx)))?$")
+
+
+class GenerationServer(ThreadingHTTPServer):
+    """
+    HTTP front end for a JobManager.
+
+    Routes:
+        POST   /jobs                        submit a job (202, or 429 when the queue is full)
+        GET    /jobs                        list recent jobs
+        GET    /jobs/<id>                   job status
+        GET    /jobs/<id>/events            progress as Server-Sent Events
+        GET    /jobs/<id>/result            content, file paths and metrics of a finished job
+        GET    /jobs/<id>/artifacts/pdf     download the PDF (or its HTML fallback)
+        GET    /jobs/<id>/artifacts/docx    download the DOCX
+        DELETE /jobs/<id>                   cancel a job
+        GET    /healthz                     liveness and queue depth
+        GET    /metrics                     Prometheus metrics
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, jobs: JobManager, max_queue: int = DEFAULT_MAX_QUEUE):
+        super().__init__(address, _Handler)
+        self.jobs = jobs
+        self.max_queue = max_queue
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: GenerationServer
+
+    # ---------------------------
+    # Routing
+    # ---------------------------
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/healthz":
+            self._json(200, {"status": "ok", "queue_depth": self.server.jobs.queue_depth(), "max_queue": self.server.max_queue})
+        elif url.path == "/metrics":
+            self._send(200, REGISTRY.render_prometheus().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+        elif url.path == "/jobs":
+            limit = self._int_param(parse_qs(url.query).get("limit", ["20"])[0], "limit")
+            if limit is None:
+                return
+            limit = min(max(limit, 1), MAX_LIST_LIMIT)
+            self._json(200, {"jobs": [self._summary(job) for job in self.server.jobs.list_jobs(limit)]})
+        else:
+            route = _JOB_ROUTE.match(url.path)
+            job = self.server.jobs.status(route.group("id")) if route else None
+            if job is None:
+                self._error(404, "not found")
+            elif route.group("action") is None:
+                self._json(200, self._summary(job))
+            elif route.group("action") == "events":
+                self._events(job, url.query)
+            elif route.group("action") == "result":
+                self._result(job)
+            else:
+                self._artifact(job, route.group("format"))
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/jobs":
+            self._error(404, "not found")
+            return
+
+        jobs = self.server.jobs
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(request, dict):
+                raise ValueError("request body must be a JSON object")
+            topic = request.pop("topic", "")
+            # API traffic yields to interactive UI users unless it asks otherwise
+            request.setdefault("priority", BATCH)
+            if "max_queue" in request:
+                raise ValueError("unknown job options: max_queue")
+            job_id = jobs.submit(topic, max_queue=self.server.max_queue, **request)
+        except QueueFull:
+            REGISTRY.inc("article_api_rejected_total")
+            self._error(429, "job queue is full, retry later", headers={"Retry-After": "30"})
+            return
+        except (ValueError, TypeError) as e:
+            self._error(400, str(e))
+            return
+
+        self._json(202, self._summary(jobs.status(job_id)), headers={"Location": f"/jobs/{job_id}"})
+
+    def do_DELETE(self):
+        route = _JOB_ROUTE.match(urlparse(self.path).path)
+        if not route or route.group("action") is not None:
+            self._error(404, "not found")
+            return
+
+        job_id = route.group("id")
+        if self.server.jobs.status(job_id) is None:
+            self._error(404, "not found")
+        elif not self.server.jobs.cancel(job_id):
+            self._error(409, "job has already finished")
+        else:
+            self._json(202, self._summary(self.server.jobs.status(job_id)))
+
+    # ---------------------------
+    # Job endpoints
+    # ---------------------------
+    def _events(self, job: dict, query: str) -> None:
+        """Stream a job's events as SSE, resuming after Last-Event-ID if given."""
+        header = self.headers.get("Last-Event-ID")
+        last_id = header or parse_qs(query).get("after", [None])[0]
+        after = 0
+        if last_id is not None:
+            last_id = self._int_param(last_id, "Last-Event-ID" if header else "after")
+            if last_id is None:
+                return
+            after = max(last_id + 1, 0)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self._count(200)
+
+        try:
+            while True:
+                finished = False
+                for event in self.server.jobs.events(job["id"], after=after, timeout=KEEPALIVE_SECONDS):
+                    after = event["index"] + 1
+                    finished = event["type"] == "status"
+                    self.wfile.write(
+                        f"id: {event['index']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n".encode("utf-8")
+                    )
+                self.wfile.flush()
+                if finished:
+                    return
+                self.wfile.write(b": keepalive\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away; the job keeps running
+            pass
+
+    def _result(self, job: dict) -> None:
+        if job["status"] not in TERMINAL_STATES:
+            self._error(409, f"job is {job['status']}")
+        elif job["result"] is None:
+            self._error(409, f"job {job['status']}: {job['error']}")
+        else:
+            self._json(200, job["result"])
+
+    def _artifact(self, job: dict, fmt: str) -> None:
+        path = (job["result"] or {}).get(f"{fmt}_path")
+        if job["status"] not in TERMINAL_STATES:
+            self._error(409, f"job is {job['status']}")
+        elif not path or not os.path.exists(path):
+            self._error(404, f"no {fmt} artifact for this job")
+        else:
+            with open(path, "rb") as f:
+                body = f.read()
+            content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            disposition = f'attachment; filename="{os.path.basename(path)}"'
+            self._send(200, body, content_type, headers={"Content-Disposition": disposition})
+
+    @staticmethod
+    def _summary(job: dict) -> dict:
+        """A job row without the article body, plus links to its resources."""
+        summary = {key: value for key, value in job.items() if key != "result"}
+        links = {"self": f"/jobs/{job['id']}", "events": f"/jobs/{job['id']}/events"}
+        if job["result"] is not None:
+            links.update(
+                result=f"/jobs/{job['id']}/result",
+                pdf=f"/jobs/{job['id']}/artifacts/pdf",
+                docx=f"/jobs/{job['id']}/artifacts/docx",
+            )
+        summary["links"] = links
+        return summary
+
+    def _int_param(self, value: str, name: str) -> Optional[int]:
+        """Parse an integer request parameter, answering 400 and returning None if it is not one."""
+        try:
+            return int(value)
+        except ValueError:
+            self._error(400, f"{name} must be an integer")
+            return None
+
+    # ---------------------------
+    # Responses
+    # ---------------------------
+    def _json(self, code: int, payload: dict, headers: Optional[dict] = None) -> None:
+        self._send(code, json.dumps(payload).encode("utf-8"), "application/json", headers)
+
+    def _error(self, code: int, message: str, headers: Optional[dict] = None) -> None:
+        self._json(code, {"error": message}, headers)
+
+    def _send(self, code: int, body: bytes, content_type: str, headers: Optional[dict] = None) -> None:
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self._count(code)
+
+    def _count(self, code: int) -> None:
+        route = re.sub(r"/jobs/[0-9a-f]+", "/jobs/{id}", urlparse(self.path).path)
+        REGISTRY.inc("article_api_requests_total", labels={"method": self.command, "route": route, "code": str(code)})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Serve the article generator over HTTP.")
+    parser.add_argument("--host", default="0.0.0.0", help="interface to bind (default: 0.0.0.0)")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on (default: 8000)")
+    parser.add_argument("--workers", type=int, help="concurrent jobs (default: JOB_WORKERS or 2)")
+    parser.add_argument(
+        "--max-queue", type=int, default=int(os.environ.get("API_MAX_QUEUE", DEFAULT_MAX_QUEUE)),
+        help=f"queued plus running jobs before submissions get 429 (default: API_MAX_QUEUE or {DEFAULT_MAX_QUEUE})"
+    )
+    args = parser.parse_args(argv)
+
+    if args.workers is not None:
+        os.environ["JOB_WORKERS"] = str(args.workers)
+
+    get_residency().warm_up(background=True)
+    server = GenerationServer((args.host, args.port), get_job_manager(), max_queue=args.max_queue)
+    print(f"Serving the generation API at http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,95 @@
+# benchmarks/corpus.py
+import random
+from typing import Dict, List
+
+VOCABULARY = (
+    "model inference latency throughput token context cache memory pipeline stage agent prompt "
+    "section article request response stream batch queue worker thread process server client "
+    "vector embedding attention layer weight gradient tensor kernel buffer schedule retry "
+    "timeout budget parallel concurrent sequential render export format markdown document "
+    "system design tradeoff benchmark metric signal resource bound cost quality accuracy"
+).split()
+
+CODE_LINES = (
+    "def handle(request):",
+    "    payload = parse(request.body)",
+    "    result = model.generate(payload, max_tokens=256)",
+    "    cache.set(key, result)",
+    "    return {\"status\": \"ok\", \"result\": result}",
+    "for item in batch:",
+    "    queue.put(item)",
+    "with timer(\"stage\"):",
+    "    run_pipeline(config)",
+)
+
+# (body sections, paragraphs per section, words per paragraph, code blocks)
+SIZES: Dict[str, tuple] = {
+    "small": (3, 2, 40, 1),
+    "medium": (6, 4, 60, 3),
+    "large": (12, 8, 80, 8),
+}
+
+
+def words(rng: random.Random, count: int) -> str:
+    """Return `count` pseudo-random vocabulary words as one sentence-cased string."""
+    text = " ".join(rng.choice(VOCABULARY) for _ in range(count))
+    return text[:1].upper() + text[1:] + "."
+
+
+def title_case(rng: random.Random, count: int = 3) -> str:
+    """Return a short pseudo-random title."""
+    return " ".join(rng.choice(VOCABULARY).capitalize() for _ in range(count))
+
+
+def code_block(rng: random.Random, lines: int = 6) -> str:
+    """Return a fenced Python code block."""
+    body = "\n".join(rng.choice(CODE_LINES) for _ in range(lines))
+    return f"```python\n{body}\n```"
+
+
+def synthetic_article(size: str = "medium", seed: int = 0) -> str:
+    """
+    Build a deterministic Markdown article shaped like the generator's output.
+
+    Args:
+        size (str): One of the keys of SIZES.
+        seed (int): Seed for the word choices; the same seed gives the same article.
+
+    Returns:
+        str: The article, with a title, sections, subsections, lists and code blocks.
+    """
+    sections, paragraphs, paragraph_words, code_blocks = SIZES[size]
+    rng = random.Random(f"{size}:{seed}")
+    parts = [f"# {title_case(rng, 5)}", "## Introduction", words(rng, paragraph_words)]
+    for index in range(sections):
+        parts.append(f"## {title_case(rng)}")
+        for paragraph in range(paragraphs):
+            if paragraph == paragraphs // 2:
+                parts.append(f"### {title_case(rng)}")
+            parts.append(words(rng, paragraph_words))
+        parts.append("\n".join(f"- **{title_case(rng, 2)}**: {words(rng, 10)}" for _ in range(3)))
+        if index < code_blocks:
+            parts.append(words(rng, 15))
+            parts.append(code_block(rng))
+    parts.append("## Conclusion")
+    parts.append(words(rng, paragraph_words))
+    return "\n\n".join(parts)
+
+
+def corpus(sizes: List[str] = None, per_size: int = 3) -> List[dict]:
+    """
+    Build the benchmark corpus.
+
+    Args:
+        sizes (List[str]): Sizes to include. Defaults to every size.
+        per_size (int): Articles per size.
+
+    Returns:
+        List[dict]: Entries with "size", "title" and "content" keys.
+    """
+    entries = []
+    for size in sizes or list(SIZES):
+        for seed in range(per_size):
+            content = synthetic_article(size, seed)
+            entries.append({"size": size, "title": content.splitlines()[0][2:], "content": content})
+    return entries
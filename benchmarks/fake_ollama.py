@@ -0,0 +1,351 @@
+# benchmarks/fake_ollama.py
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from benchmarks.corpus import SIZES, code_block, synthetic_article, title_case, words
+
+
+class FakeOllamaServer:
+    """
+    Deterministic stand-in for Ollama's /api/generate, for offline benchmarks.
+
+    Responses are chosen by recognizing each agent's prompt and are seeded by
+    the model and prompt, so the same request always gets the same text. Timing
+    is simulated: `latency` seconds before the first token (prompt evaluation,
+    plus one second per `prompt_tokens_per_second` prompt words when set),
+    then tokens at `tokens_per_second`, plus `load_seconds` the first time a
+    model is used or whenever a request asks for a different num_ctx than the
+    model was loaded with. With `max_loaded_models`, loading a model beyond
+    that many evicts the least recently used one, as on a GPU that fits only a
+    few models, so switching back costs another load. Responses carry Ollama's
+    timing fields so metrics work. `overrun` appends that many unrequested
+    sections (or code examples) to every response, like a model that keeps
+    going past its target; num_predict and stop options are honoured.
+
+    Every response returns a `context` of pseudo token IDs. A request that
+    sends back a context the model still holds in its KV cache (one of its
+    last `kv_slots` generations, cleared when the model is reloaded) skips
+    evaluating those tokens; any other context is evaluated like prompt text.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.05,
+        tokens_per_second: float = 200.0,
+        article_size: str = "medium",
+        load_seconds: float = 0.0,
+        max_loaded_models: int = 0,
+        prompt_tokens_per_second: float = 0.0,
+        overrun: int = 0,
+        kv_slots: int = 4,
+    ):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.article_size = article_size
+        self.load_seconds = load_seconds
+        self.max_loaded_models = max_loaded_models
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.overrun = overrun
+        self.kv_slots = kv_slots
+        self.requests = 0
+        self.reused_context_tokens = 0
+        self.model_loads = 0
+        self.aborted_streams = 0
+        self.loaded_models = set()
+        self._context_sizes = {}
+        self._kv: Dict[str, List[tuple]] = {}
+        self._recent_models: List[str] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def host(self) -> str:
+        """The host:port to use as OLLAMA_HOST."""
+        host, port = self._server.server_address[:2]
+        return f"{host}:{port}"
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}"
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    # ---------------------------
+    # Responses
+    # ---------------------------
+    def respond(self, model: str, prompt: str) -> str:
+        """
+        Build the response text for a prompt.
+
+        Args:
+            model (str): The requested model.
+            prompt (str): The full prompt.
+
+        Returns:
+            str: Markdown shaped like what the prompting agent expects.
+        """
+        seed = hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+        rng = random.Random(seed)
+        sections, paragraphs, paragraph_words, _ = SIZES[self.article_size]
+
+        if "technical research assistant" in prompt:
+            sub_topics = "\n".join(f"- **{title_case(rng)}**: {words(rng, 12)}" for _ in range(sections))
+            return (
+                f"### Refined Description\n- {words(rng, 40)}\n\n"
+                f"### Key Sub-Topics\n{sub_topics}\n\n"
+                f"### Related Fields\n- {title_case(rng, 2)}\n- {title_case(rng, 2)}\n\n"
+                f"### Practical Applications\n- {words(rng, 12)}\n- {words(rng, 12)}"
+            )
+        if "creating the opening" in prompt:
+            return f"# {title_case(rng, 5)}\n\n## Introduction\n\n" + self._paragraphs(rng, 2, paragraph_words)
+        if "creating one section" in prompt:
+            return (
+                self._paragraphs(rng, paragraphs // 2 or 1, paragraph_words)
+                + f"\n\n### {title_case(rng)}\n\n"
+                + self._paragraphs(rng, paragraphs - paragraphs // 2 or 1, paragraph_words)
+            )
+        if "creating the conclusion" in prompt:
+            return self._paragraphs(rng, 1, paragraph_words)
+        if "creating a detailed article" in prompt:
+            return synthetic_article(self.article_size, seed=int(seed[:8], 16))
+        if "reviewing one section" in prompt:
+            match = re.search(r'Section "([^"]+)"', prompt)
+            return self._example(rng, match.group(1) if match else title_case(rng))
+        if "reviewing a technical article" in prompt:
+            return "## Code Examples\n\n" + "\n\n".join(self._example(rng, title_case(rng)) for _ in range(3))
+        return self._paragraphs(rng, 1, paragraph_words)
+
+    def complete(self, model: str, prompt: str, options: dict) -> str:
+        """Build the generated text for a request: the response plus any overrun, cut by options."""
+        text = self.respond(model, prompt)
+        rng = random.Random(text)
+        paragraph_words = SIZES[self.article_size][2]
+        for _ in range(self.overrun):
+            if "reviewing" in prompt:
+                text += "\n\n" + self._example(rng, title_case(rng))
+            else:
+                text += f"\n\n## {title_case(rng)}\n\n" + self._paragraphs(rng, 2, paragraph_words)
+        for stop in options.get("stop") or []:
+            if stop in text:
+                text = text[:text.index(stop)]
+        if options.get("num_predict", -1) > 0:
+            text = "".join(self.tokenize(text)[:options["num_predict"]])
+        return text
+
+    @staticmethod
+    def _paragraphs(rng: random.Random, count: int, paragraph_words: int) -> str:
+        return "\n\n".join(words(rng, paragraph_words) for _ in range(count))
+
+    @staticmethod
+    def _example(rng: random.Random, title: str) -> str:
+        return f"### Example: {title}\n{words(rng, 15)}\n\n{code_block(rng)}\n\n{words(rng, 20)}"
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        """Split text into whitespace-preserving pseudo-tokens."""
+        return re.findall(r"\S+\s*|\s+", text)
+
+    # ---------------------------
+    # HTTP
+    # ---------------------------
+    def prompt_seconds(self, prompt_tokens: int) -> float:
+        """Simulated prompt evaluation time."""
+        if not self.prompt_tokens_per_second:
+            return self.latency
+        return self.latency + prompt_tokens / self.prompt_tokens_per_second
+
+    @staticmethod
+    def token_ids(text: str) -> List[int]:
+        """Pseudo token IDs for text, one per word, for the returned context."""
+        return [zlib.crc32(word.encode("utf-8")) & 0xFFFF for word in text.split()]
+
+    def _prompt_tokens(self, model: str, prompt: str, context: List[int]) -> int:
+        """Tokens a request must evaluate: the prompt, plus its context unless cached."""
+        with self._lock:
+            if context and tuple(context) in self._kv.get(model, []):
+                self.reused_context_tokens += len(context)
+                return len(prompt.split())
+        return len(context) + len(prompt.split())
+
+    def _cache_context(self, model: str, context: List[int]) -> None:
+        """Keep a finished generation's context in the model's KV cache."""
+        with self._lock:
+            slots = self._kv.setdefault(model, [])
+            slots.append(tuple(context))
+            del slots[:-self.kv_slots]
+
+    def _timings(self, prompt_tokens: int, tokens: int, load: float) -> dict:
+        generate = tokens / self.tokens_per_second
+        prompt_seconds = self.prompt_seconds(prompt_tokens)
+        return {
+            "done": True,
+            "eval_count": tokens,
+            "eval_duration": int(generate * 1e9),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prompt_seconds * 1e9),
+            "load_duration": int(load * 1e9),
+            "total_duration": int((load + prompt_seconds + generate) * 1e9),
+        }
+
+    def _load(self, model: str, num_ctx: Optional[int] = None) -> float:
+        """Return the simulated load time for a request, marking the model loaded."""
+        with self._lock:
+            self.requests += 1
+            if model in self._recent_models:
+                self._recent_models.remove(model)
+            self._recent_models.append(model)
+            if model in self.loaded_models and self._context_sizes.get(model) == num_ctx:
+                return 0.0
+            self._context_sizes[model] = num_ctx
+            # A (re)loaded runner starts with an empty KV cache
+            self._kv.pop(model, None)
+            if model in self.loaded_models:
+                # Ollama restarts the model's runner to change its context size
+                self.model_loads += 1
+                return self.load_seconds
+            if self.max_loaded_models and len(self.loaded_models) >= self.max_loaded_models:
+                evicted = self._recent_models.pop(0)
+                self.loaded_models.discard(evicted)
+                self._kv.pop(evicted, None)
+            self.loaded_models.add(model)
+            self.model_loads += 1
+        return self.load_seconds
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, body: dict) -> None:
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path in ("/api/tags", "/api/ps"):
+                    self._send_json(200, {"models": [{"name": name} for name in sorted(server.loaded_models)]})
+                elif self.path == "/api/version":
+                    self._send_json(200, {"version": "0.0.0-fake"})
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._send_json(400, {"error": "invalid JSON"})
+                    return
+                if self.path != "/api/generate":
+                    self._send_json(404, {"error": "not found"})
+                    return
+
+                model = body.get("model", "")
+                prompt = body.get("prompt", "")
+                load = server._load(model, (body.get("options") or {}).get("num_ctx"))
+                text = server.complete(model, prompt, body.get("options") or {})
+                tokens = server.tokenize(text)
+                context = list(body.get("context") or [])
+                prompt_tokens = server._prompt_tokens(model, prompt, context)
+                time.sleep(load + server.prompt_seconds(prompt_tokens))
+                context += server.token_ids(prompt) + server.token_ids(text)
+                final = dict(server._timings(prompt_tokens, len(tokens), load), model=model, context=context)
+
+                if not body.get("stream", True):
+                    time.sleep(len(tokens) / server.tokens_per_second)
+                    server._cache_context(model, context)
+                    self._send_json(200, dict(final, response=text))
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                started = time.perf_counter()
+                try:
+                    for index, token in enumerate(tokens):
+                        # Pace against the clock rather than sleeping per token, so
+                        # high token rates are not dominated by sleep granularity
+                        delay = started + (index + 1) / server.tokens_per_second - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+                        self._write_chunk({"model": model, "response": token, "done": False})
+                    server._cache_context(model, context)
+                    self._write_chunk(dict(final, response=""))
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client closed the stream early, as Ollama sees on cancellation
+                    with server._lock:
+                        server.aborted_streams += 1
+
+            def _write_chunk(self, body: dict) -> None:
+                data = (json.dumps(body) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run a deterministic fake Ollama server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds before the first token")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="generated tokens per second")
+    parser.add_argument("--article-size", choices=sorted(SIZES), default="medium")
+    parser.add_argument("--load-seconds", type=float, default=0.0, help="simulated first-use model load time")
+    parser.add_argument("--max-loaded-models", type=int, default=0, help="models that fit in memory (default: no limit)")
+    parser.add_argument("--overrun", type=int, default=0, help="extra sections or examples per response")
+    parser.add_argument(
+        "--prompt-rate", type=float, default=0.0,
+        help="prompt words evaluated per second (default: prompt length is free)"
+    )
+    args = parser.parse_args(argv)
+
+    server = FakeOllamaServer(
+        args.host, args.port, args.latency, args.token_rate, args.article_size, args.load_seconds,
+        args.max_loaded_models, args.prompt_rate, args.overrun,
+    ).start()
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,347 @@
+# benchmarks/run.py
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.corpus import SIZES, corpus
+from benchmarks.fake_ollama import FakeOllamaServer
+
+SCENARIOS = ("stages", "run", "batch", "export")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile.
+
+    Args:
+        values (List[float]): Observations.
+        pct (float): Percentile between 0 and 100.
+
+    Returns:
+        float: The percentile, or 0.0 for no observations.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+def summarize(name: str, latencies: List[float], peak_bytes: int = 0, items: int = 1, **extra) -> dict:
+    """
+    Describe one benchmark as a result record.
+
+    Args:
+        name (str): Benchmark name, e.g. "run.sequential".
+        latencies (List[float]): Seconds per iteration.
+        peak_bytes (int): Peak traced Python memory of one iteration.
+        items (int): Work items (articles) per iteration, for throughput.
+        **extra: Additional fields to include.
+
+    Returns:
+        dict: p50/p95/mean latency in seconds, items per second and peak MiB.
+    """
+    total = sum(latencies)
+    record = {
+        "name": name,
+        "iterations": len(latencies),
+        "p50": round(percentile(latencies, 50), 4),
+        "p95": round(percentile(latencies, 95), 4),
+        "mean": round(total / len(latencies), 4) if latencies else 0.0,
+        "throughput": round(items * len(latencies) / total, 3) if total else 0.0,
+        "peak_mib": round(peak_bytes / (1024 * 1024), 2),
+    }
+    record.update(extra)
+    return record
+
+
+def measure(name: str, fn: Callable[[], object], iterations: int, items: int = 1, warmup: int = 1) -> dict:
+    """
+    Time a callable and measure its peak memory.
+
+    Latency iterations run without tracing; peak memory is taken from one extra
+    traced iteration, since tracemalloc slows allocation-heavy code noticeably.
+
+    Args:
+        name (str): Benchmark name.
+        fn (Callable[[], object]): The work to measure.
+        iterations (int): Timed iterations.
+        items (int): Work items per call, for throughput.
+        warmup (int): Untimed iterations run first.
+
+    Returns:
+        dict: The result record from summarize().
+    """
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return summarize(name, latencies, peak, items)
+
+
+def read_run_summaries(path: str, offset: int) -> List[dict]:
+    """Read the run summaries appended to the metrics log after `offset` bytes."""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        f.seek(offset)
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def stage_breakdown(summaries: List[dict]) -> Dict[str, dict]:
+    """Aggregate per-stage p50/p95 seconds from run summaries."""
+    per_stage: Dict[str, List[float]] = {}
+    for summary in summaries:
+        for stage, seconds in summary.get("stages", {}).items():
+            per_stage.setdefault(stage, []).append(seconds)
+    return {
+        stage: {"p50": round(percentile(values, 50), 4), "p95": round(percentile(values, 95), 4)}
+        for stage, values in per_stage.items()
+    }
+
+
+class Benchmark:
+    """
+    Drives the pipeline against a FakeOllamaServer and collects result records.
+    """
+
+    def __init__(self, workdir: str, iterations: int = 5, batch_size: int = 8, concurrency: List[int] = None,
+                 model_name: str = "mistral", code_model_name: str = "codellama:7b",
+                 server: Optional[FakeOllamaServer] = None):
+        self.workdir = workdir
+        self.server = server
+        self.iterations = iterations
+        self.batch_size = batch_size
+        self.concurrency = concurrency or [1, 4]
+        self.model_name = model_name
+        self.code_model_name = code_model_name
+        self.output_dir = os.path.join(workdir, "output")
+        self.metrics_log = os.environ["METRICS_LOG_PATH"]
+        self.results: List[dict] = []
+
+    def _orchestrator(self, **options):
+        from agents.exporter import ExporterAgent
+        from orchestrator.workflow import OrchestratorAgent
+
+        orchestrator = OrchestratorAgent(self.model_name, self.code_model_name, **options)
+        orchestrator.exporter = ExporterAgent(output_dir=self.output_dir)
+        return orchestrator
+
+    def _log_offset(self) -> int:
+        return os.path.getsize(self.metrics_log) if os.path.exists(self.metrics_log) else 0
+
+    def stages(self) -> None:
+        """Each agent on its own, fed with the previous stage's output."""
+        from agents.code_snippet import CodeSnippetAgent
+        from agents.content_generator import ContentGeneratorAgent
+        from agents.exporter import ExporterAgent
+        from agents.formatter import FormatterAgent
+        from agents.topic_analyzer import TopicAnalyzerAgent
+
+        topic = "Benchmarking retrieval-augmented generation pipelines"
+        analyzer = TopicAnalyzerAgent(self.model_name)
+        generator = ContentGeneratorAgent(self.model_name)
+        coder = CodeSnippetAgent(self.code_model_name)
+        formatter = FormatterAgent()
+        exporter = ExporterAgent(output_dir=self.output_dir, store=None)
+
+        analysis = analyzer.run(topic)
+        content = generator.run(analysis)
+        code = coder.run(content)
+        formatted = formatter.run(content, code)
+        title = formatter.extract_title(formatted)
+
+        n = self.iterations
+        self.results.append(measure("stage.analysis", lambda: analyzer.run(topic), n))
+        self.results.append(measure("stage.content", lambda: generator.run(analysis), n))
+        self.results.append(measure("stage.content_sections", lambda: generator.run_sections(analysis), n))
+        self.results.append(measure("stage.code", lambda: coder.run(content), n))
+        self.results.append(measure("stage.format", lambda: formatter.run(content, code), n))
+        self.results.append(measure("stage.export", lambda: exporter.run(formatted, title), n))
+
+    def run(self) -> None:
+        """OrchestratorAgent.run end to end in each generation mode."""
+        modes = {
+            "sequential": {},
+            "parallel_sections": {"parallel_sections": True},
+            "pipeline_code": {"parallel_sections": True, "pipeline_code": True},
+        }
+        for mode, options in modes.items():
+            orchestrator = self._orchestrator(**options)
+            counter = iter(range(10 ** 6))
+            offset = self._log_offset()
+            result = measure(f"run.{mode}", lambda: orchestrator.run(f"Benchmark topic {next(counter)}"), self.iterations)
+            # Warmup and the traced iteration are included in the breakdown
+            result["stages"] = stage_breakdown(read_run_summaries(self.metrics_log, offset))
+            self.results.append(result)
+
+    def batch(self) -> None:
+        """BatchRunner over a fixed topic list at each concurrency level, per article and grouped by model."""
+        from orchestrator.batch import BatchRunner
+
+        input_path = os.path.join(self.workdir, "batch.jsonl")
+        with open(input_path, "w", encoding="utf-8") as f:
+            for index in range(self.batch_size):
+                f.write(json.dumps({"topic": f"Batch topic {index}"}) + "\n")
+
+        for concurrency, grouped in [(concurrency, grouped) for concurrency in self.concurrency for grouped in (False, True)]:
+            name = f"batch.c{concurrency}" + (".grouped" if grouped else "")
+            runner = BatchRunner(concurrency=concurrency, orchestrator=self._orchestrator(), group_by_model=grouped)
+            output_path = os.path.join(self.workdir, f"{name}.jsonl")
+            loads = self.server.model_loads if self.server else 0
+            result = measure(
+                name,
+                lambda: runner.run(input_path, output_path, resume=False),
+                iterations=1,
+                items=self.batch_size,
+                warmup=0,
+            )
+            if self.server:
+                result["model_loads"] = self.server.model_loads - loads
+            with open(output_path, "r", encoding="utf-8") as f:
+                records = [json.loads(line) for line in f if line.strip()]
+            item_latencies = [record["elapsed_seconds"] for record in records]
+            result["item_p50"] = round(percentile(item_latencies, 50), 4)
+            result["item_p95"] = round(percentile(item_latencies, 95), 4)
+            result["failed"] = sum(record["status"] != "ok" for record in records)
+            self.results.append(result)
+
+    def export(self) -> None:
+        """ExporterAgent over the synthetic corpus, by article size and format."""
+        from agents.exporter import ExporterAgent
+        from utils.markdown_doc import parse_markdown
+
+        # Without the artifact store every iteration renders; export.<size>.cached measures reuse
+        exporter = ExporterAgent(output_dir=self.output_dir, store=None)
+        cached_exporter = ExporterAgent(output_dir=self.output_dir)
+        for size in SIZES:
+            entries = corpus([size])
+
+            def export_all(render) -> None:
+                for entry in entries:
+                    render(entry["content"], entry["title"])
+
+            n = self.iterations
+            items = len(entries)
+            self.results.append(measure(f"export.{size}", lambda: export_all(exporter.run), n, items))
+            self.results.append(measure(f"export.{size}.cached", lambda: export_all(cached_exporter.run), n, items))
+            self.results.append(
+                measure(f"export.{size}.docx", lambda: export_all(lambda content, title: exporter._create_docx(parse_markdown(content), title)), n, items)
+            )
+            self.results.append(
+                measure(f"export.{size}.pdf", lambda: export_all(lambda content, title: exporter._render_pdf(parse_markdown(content), title)), n, items)
+            )
+
+
+def format_table(results: List[dict]) -> str:
+    """Render result records as an aligned text table."""
+    columns = ("name", "iterations", "p50", "p95", "mean", "throughput", "peak_mib")
+    rows = [columns] + [tuple(str(result.get(column, "")) for column in columns) for result in results]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    lines = ["  ".join(cell.ljust(width) for cell, width in zip(row, widths)) for row in rows]
+    for result in results:
+        for stage, stats in result.get("stages", {}).items():
+            lines.append(f"  {result['name']} / {stage}: p50={stats['p50']}s p95={stats['p95']}s")
+    return "\n".join(lines)
+
+
+def compare(results: List[dict], baseline_path: str, tolerance: float) -> List[str]:
+    """
+    Find benchmarks whose p50 latency regressed against a baseline.
+
+    Args:
+        results (List[dict]): Current result records.
+        baseline_path (str): JSON file written earlier with --json.
+        tolerance (float): Allowed relative slowdown, e.g. 0.2 for 20%.
+
+    Returns:
+        List[str]: One message per regression.
+    """
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {result["name"]: result for result in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        before = baseline.get(result["name"])
+        if before and before["p50"] > 0 and result["p50"] > before["p50"] * (1 + tolerance):
+            change = (result["p50"] / before["p50"] - 1) * 100
+            regressions.append(f"{result['name']}: p50 {before['p50']}s -> {result['p50']}s (+{change:.0f}%)")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the article pipeline against a fake Ollama server.")
+    parser.add_argument("-s", "--scenario", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("-n", "--iterations", type=int, default=3, help="timed iterations per benchmark (default: 3)")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake time to first token in seconds")
+    parser.add_argument("--token-rate", type=float, default=1000.0, help="fake generated tokens per second")
+    parser.add_argument("--article-size", choices=sorted(SIZES), default="medium", help="size of generated articles")
+    parser.add_argument("--load-seconds", type=float, default=0.0, help="fake model load time")
+    parser.add_argument(
+        "--max-loaded-models", type=int, default=0,
+        help="models the fake server holds at once; 1 makes every model switch pay --load-seconds"
+    )
+    parser.add_argument("--prompt-rate", type=float, default=0.0, help="fake prompt words evaluated per second")
+    parser.add_argument("--overrun", type=int, default=0, help="fake extra sections or examples per response")
+    parser.add_argument("--batch-size", type=int, default=8, help="topics per batch benchmark (default: 8)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4], help="batch concurrency levels")
+    parser.add_argument("--json", dest="json_path", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file; exit 1 if any p50 regressed")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p50 slowdown vs. baseline (default: 0.2)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show the pipeline's own output")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="article-bench-") as workdir, FakeOllamaServer(
+        latency=args.latency, tokens_per_second=args.token_rate, article_size=args.article_size,
+        load_seconds=args.load_seconds, max_loaded_models=args.max_loaded_models,
+        prompt_tokens_per_second=args.prompt_rate, overrun=args.overrun,
+    ) as server:
+        # Must be set before the first agent creates the shared client and cache
+        os.environ["OLLAMA_HOST"] = server.host
+        os.environ["LLM_CACHE_DISABLED"] = "1"
+        os.environ["METRICS_LOG_PATH"] = os.path.join(workdir, "metrics.jsonl")
+
+        benchmark = Benchmark(workdir, args.iterations, args.batch_size, args.concurrency, server=server)
+        for scenario in args.scenario:
+            print(f"Running {scenario} benchmarks...", file=sys.stderr)
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            with output:
+                getattr(benchmark, scenario)()
+        requests_served = server.requests
+        reused_tokens = server.reused_context_tokens
+
+    print(format_table(benchmark.results))
+    print(f"\nFake Ollama requests served: {requests_served}")
+    print(f"Context tokens served from the KV cache: {reused_tokens}")
+
+    if args.json_path:
+        config = {key: value for key, value in vars(args).items() if key not in ("json_path", "compare", "verbose")}
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"created_at": time.time(), "config": config, "results": benchmark.results}, f, indent=2)
+
+    if args.compare:
+        regressions = compare(benchmark.results, args.compare, args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,270 @@
+# orchestrator/batch.py
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+from orchestrator.checkpoint import CheckpointStore
+from orchestrator.workflow import OrchestratorAgent
+from utils.llm_scheduler import BATCH, llm_priority
+from utils.model_residency import get_residency
+from utils.metrics import start_metrics_server
+
+
+def batch_item_id(item: dict) -> str:
+    """
+    Return a stable identifier for a batch entry.
+
+    Uses the entry's "id" when present, otherwise a hash of its topic and options
+    so that resuming a batch recognizes topics that were already generated.
+
+    Args:
+        item (dict): A batch entry with at least a "topic" key.
+
+    Returns:
+        str: The entry identifier.
+    """
+    if item.get("id"):
+        return str(item["id"])
+    material = json.dumps({"topic": item["topic"], "include_code": item.get("include_code")}, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:16]
+
+
+def load_batch(path: str) -> List[dict]:
+    """
+    Read batch entries from a JSONL file.
+
+    Each non-empty line is either a JSON object with a "topic" key (and
+    optionally "id" and "include_code") or a bare JSON string topic.
+
+    Args:
+        path (str): Path to the input JSONL file.
+
+    Returns:
+        List[dict]: The batch entries, each with an "id" assigned.
+
+    Raises:
+        ValueError: If a line is not valid JSON or has no topic.
+    """
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON: {e}") from e
+            if isinstance(item, str):
+                item = {"topic": item}
+            if not isinstance(item, dict) or not str(item.get("topic", "")).strip():
+                raise ValueError(f"{path}:{line_number}: entry has no topic")
+            item["id"] = batch_item_id(item)
+            items.append(item)
+    return items
+
+
+def load_completed(path: str) -> Set[str]:
+    """
+    Collect the ids of entries that already finished successfully.
+
+    Args:
+        path (str): Path to the output JSONL file of a previous run.
+
+    Returns:
+        Set[str]: Ids of entries with status "ok". Failed entries are not
+        included, so they are retried on resume.
+    """
+    completed = set()
+    if not os.path.exists(path):
+        return completed
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A truncated last line from an interrupted run
+                continue
+            if record.get("status") == "ok":
+                completed.add(record.get("id"))
+    return completed
+
+
+class BatchRunner:
+    def __init__(
+        self,
+        concurrency: int = 4,
+        model_name: str = "mistral",
+        code_model_name: str = "codellama:7b",
+        include_code: bool = True,
+        parallel_sections: bool = False,
+        pipeline_code: bool = False,
+        checkpoint_dir: Optional[str] = ".runs",
+        orchestrator: Optional[OrchestratorAgent] = None,
+        group_by_model: bool = False,
+    ):
+        self.concurrency = concurrency
+        self.include_code = include_code
+        # Run stage by stage across the batch (see OrchestratorAgent.arun_grouped)
+        self.group_by_model = group_by_model
+        self.orchestrator = orchestrator or OrchestratorAgent(
+            model_name,
+            code_model_name,
+            parallel_sections=parallel_sections,
+            pipeline_code=pipeline_code,
+            checkpoints=CheckpointStore(checkpoint_dir) if checkpoint_dir else None,
+        )
+
+    async def arun(self, input_path: str, output_path: str, resume: bool = True) -> dict:
+        """
+        Generate an article for every topic in a JSONL file.
+
+        Topics run concurrently up to the configured limit, at batch priority in
+        the LLM scheduler. Each result or error is appended to the output file
+        as soon as it finishes, so an interrupted batch can be resumed without
+        regenerating completed topics.
+
+        Args:
+            input_path (str): JSONL file with one topic per line.
+            output_path (str): JSONL file to append results to.
+            resume (bool): Skip topics already completed in output_path. When
+                False, the output file is truncated first.
+
+        Returns:
+            dict: Counts of total, skipped, succeeded and failed entries.
+        """
+        items = load_batch(input_path)
+        if resume:
+            completed = load_completed(output_path)
+        else:
+            completed = set()
+            open(output_path, "w", encoding="utf-8").close()
+
+        pending = [item for item in items if item["id"] not in completed]
+        summary = {"total": len(items), "skipped": len(items) - len(pending), "succeeded": 0, "failed": 0}
+        print(f"Batch: {len(pending)} topics to generate, {summary['skipped']} already completed.")
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        write_lock = asyncio.Lock()
+
+        with open(output_path, "a", encoding="utf-8") as out:
+
+            async def write(record: dict) -> None:
+                async with write_lock:
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()
+                    summary["succeeded" if record["status"] == "ok" else "failed"] += 1
+                    print(f"[{record['status']}] {record['topic']}")
+
+            async def process(item: dict) -> None:
+                async with semaphore:
+                    record = await self._run_item(item)
+                await write(record)
+
+            with llm_priority(BATCH):
+                if self.group_by_model:
+                    await self._run_grouped(pending, write)
+                else:
+                    await asyncio.gather(*(process(item) for item in pending))
+
+        return summary
+
+    async def _run_grouped(self, items: List[dict], write: Callable[[dict], Awaitable[None]]) -> None:
+        """Run entries stage by stage across the batch, writing each record as it finishes."""
+        started = time.time()
+        requests = [(item["topic"], item.get("include_code", self.include_code)) for item in items]
+
+        async def on_done(index: int, result: Optional[Tuple[str, str, str]], error: Optional[Exception]) -> None:
+            await write(self._record(items[index], requests[index][1], started, result, error))
+
+        await self.orchestrator.arun_grouped(requests, concurrency=self.concurrency, on_done=on_done)
+
+    async def _run_item(self, item: dict) -> dict:
+        """Run one batch entry and describe the outcome as an output record."""
+        include_code = item.get("include_code", self.include_code)
+        started = time.time()
+        try:
+            result = await self.orchestrator.arun(item["topic"], include_code)
+        except Exception as e:
+            return self._record(item, include_code, started, None, e)
+        return self._record(item, include_code, started, result, None)
+
+    @staticmethod
+    def _record(
+        item: dict,
+        include_code: bool,
+        started: float,
+        result: Optional[Tuple[str, str, str]],
+        error: Optional[Exception],
+    ) -> dict:
+        """Describe the outcome of one entry as an output record."""
+        record = {"id": item["id"], "topic": item["topic"], "include_code": include_code}
+        if error is not None:
+            record.update(status="error", error_type=type(error).__name__, error=str(error))
+        else:
+            content, pdf_path, docx_path = result
+            record.update(status="ok", content=content, pdf_path=pdf_path, docx_path=docx_path)
+        record["elapsed_seconds"] = round(time.time() - started, 3)
+        return record
+
+    def run(self, input_path: str, output_path: str, resume: bool = True) -> dict:
+        """
+        Synchronous wrapper around arun().
+
+        Args:
+            input_path (str): JSONL file with one topic per line.
+            output_path (str): JSONL file to append results to.
+            resume (bool): Skip topics already completed in output_path.
+
+        Returns:
+            dict: Counts of total, skipped, succeeded and failed entries.
+        """
+        return asyncio.run(self.arun(input_path, output_path, resume=resume))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate technical articles for every topic in a JSONL file.")
+    parser.add_argument("input", help="JSONL file with one topic per line")
+    parser.add_argument("output", help="JSONL file that results are appended to")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="maximum topics in flight (default: 4)")
+    parser.add_argument("--model", default="mistral", help="content model (default: mistral)")
+    parser.add_argument("--code-model", default="codellama:7b", help="code model (default: codellama:7b)")
+    parser.add_argument("--no-code", action="store_true", help="skip code examples unless an entry asks for them")
+    parser.add_argument("--parallel-sections", action="store_true", help="generate article sections concurrently")
+    parser.add_argument("--pipeline-code", action="store_true", help="overlap code generation with content generation")
+    parser.add_argument("--checkpoint-dir", default=".runs", help="stage checkpoint directory (default: .runs)")
+    parser.add_argument("--no-checkpoints", action="store_true", help="do not persist per-stage checkpoints")
+    parser.add_argument("--no-resume", action="store_true", help="regenerate every topic and overwrite the output")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port while the batch runs")
+    parser.add_argument(
+        "--group-by-model", action="store_true",
+        help="run all content-model stages before any code-model stage, to avoid model swaps"
+    )
+    args = parser.parse_args(argv)
+
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+        print(f"Serving metrics at http://localhost:{args.metrics_port}/metrics")
+    get_residency().warm_up(background=True)
+
+    runner = BatchRunner(
+        concurrency=args.concurrency,
+        model_name=args.model,
+        code_model_name=args.code_model,
+        include_code=not args.no_code,
+        parallel_sections=args.parallel_sections,
+        pipeline_code=args.pipeline_code,
+        checkpoint_dir=None if args.no_checkpoints else args.checkpoint_dir,
+        group_by_model=args.group_by_model,
+    )
+    summary = runner.run(args.input, args.output, resume=not args.no_resume)
+    print(f"Batch finished: {json.dumps(summary)}")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
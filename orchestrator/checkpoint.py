@@ -0,0 +1,110 @@
+# orchestrator/checkpoint.py
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Optional
+
+STAGES = ("analysis", "content", "code", "format", "export_pdf", "export_docx")
+
+
+def hash_inputs(inputs: Any) -> str:
+    """
+    Hash the inputs of a pipeline stage.
+
+    Args:
+        inputs (Any): JSON-serializable stage inputs.
+
+    Returns:
+        str: A SHA-256 hex digest of the canonical JSON encoding.
+    """
+    material = json.dumps(inputs, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class CheckpointStore:
+    """
+    Persist the output of each pipeline stage so a failed run can be resumed.
+
+    Every run gets a directory <root>/<run_id>/ holding one JSON file per
+    stage. Each file records the hash of the inputs the stage was computed
+    from; a checkpoint whose input hash no longer matches, or that cannot be
+    read, is treated as missing and the stage is recomputed.
+    """
+
+    def __init__(self, root: str = ".runs"):
+        self.root = root
+
+    def run_id_for(self, inputs: dict) -> str:
+        """
+        Derive a run ID from the inputs of a whole run.
+
+        Args:
+            inputs (dict): The topic, options and models of the run.
+
+        Returns:
+            str: A short, stable run identifier.
+        """
+        return hash_inputs(inputs)[:16]
+
+    def _path(self, run_id: str, stage: str) -> str:
+        return os.path.join(self.root, run_id, f"{stage}.json")
+
+    def load(self, run_id: str, stage: str, input_hash: str) -> Optional[Any]:
+        """
+        Load a stage's output if a valid checkpoint exists.
+
+        Args:
+            run_id (str): The run identifier.
+            stage (str): The stage name.
+            input_hash (str): Hash of the stage's current inputs.
+
+        Returns:
+            Optional[Any]: The stored output, or None if missing, unreadable or stale.
+        """
+        path = self._path(run_id, stage)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(record, dict) or record.get("input_hash") != input_hash:
+            return None
+        return record.get("output")
+
+    def save(self, run_id: str, stage: str, input_hash: str, output: Any) -> None:
+        """
+        Store a stage's output atomically.
+
+        Args:
+            run_id (str): The run identifier.
+            stage (str): The stage name.
+            input_hash (str): Hash of the inputs the output was computed from.
+            output (Any): JSON-serializable stage output.
+        """
+        path = self._path(run_id, stage)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        record = {"stage": stage, "input_hash": input_hash, "saved_at": time.time(), "output": output}
+        # A unique temp file per save, so concurrent saves of a stage never share one
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{stage}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(record, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def clear(self, run_id: str) -> None:
+        """
+        Delete every checkpoint of a run.
+
+        Args:
+            run_id (str): The run identifier.
+        """
+        shutil.rmtree(os.path.join(self.root, run_id), ignore_errors=True)
@@ -0,0 +1,597 @@
+# orchestrator/graph.py
+import asyncio
+import contextvars
+import os
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, Generator, Iterable, List, Optional, Sequence, Tuple, TypedDict
+
+from utils.cancellation import (
+    CancellationToken,
+    RunCancelled,
+    await_or_cancel,
+    check_cancelled,
+    child_token,
+    context_with,
+    current_token,
+)
+from utils.metrics import REGISTRY, stage_timer
+
+REGISTRY.describe("article_graph_node_retries_total", "Pipeline graph node attempts that failed and were retried, by node.")
+REGISTRY.describe("article_graph_node_timeouts_total", "Pipeline graph node attempts that ran past their timeout, by node.")
+
+ENGINES = ("langgraph", "builtin")
+
+# Receives the progress events of the graph run in progress, if its caller listens
+_sink: contextvars.ContextVar[Optional[Callable[[dict], None]]] = contextvars.ContextVar("graph_event_sink", default=None)
+
+# Marks the end of a streamed graph run
+_DONE = object()
+
+
+def emit(event: dict) -> None:
+    """
+    Send a progress event to the caller of the current graph run.
+
+    Nodes call this to report what they produce as they go, e.g. streamed
+    tokens; without a listener (see listening()) the event is dropped.
+
+    Args:
+        event (dict): The event, with a "type" key.
+    """
+    sink = _sink.get()
+    if sink is not None:
+        sink(event)
+
+
+def listening() -> bool:
+    """Whether the current graph run's caller receives events, so nodes should stream."""
+    return _sink.get() is not None
+
+
+class NodeTimeout(TimeoutError):
+    """Raised when a node attempt runs past its timeout."""
+
+
+class Node:
+    """
+    One step of a pipeline graph.
+
+    A node reads the values named in after (graph inputs or other nodes'
+    outputs), passed to run() positionally in that order, and provides one
+    value per name in provides. Nodes that do not depend on each other run
+    concurrently.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        run: Callable[..., Any],
+        after: Sequence[str] = (),
+        arun: Optional[Callable[..., Awaitable[Any]]] = None,
+        provides: Optional[Sequence[str]] = None,
+        label: Optional[str] = None,
+        cache_inputs: Optional[Callable[..., dict]] = None,
+        validate: Optional[Callable[[Any], bool]] = None,
+        retries: int = 0,
+        retry_delay: float = 1.0,
+        timeout: Optional[float] = None,
+    ):
+        """
+        Args:
+            name (str): Node name; also the stage name for timings and the cache.
+            run (Callable): Computes the output from the values in after.
+            after (Sequence[str]): Values the node needs.
+            arun (Callable): Async variant of run; without one, async runs
+                call run in a worker thread.
+            provides (Sequence[str]): Names of the values the node returns;
+                defaults to the node name. With more than one name, run
+                returns a tuple in the same order.
+            label (str): Printed when the node starts, e.g. "Step 1: Analyzing topic".
+                Labelled nodes also emit a stage event when they start.
+            cache_inputs (Callable): Maps the values in after to the inputs
+                the output is cached under; None disables caching.
+            validate (Callable): Rejects a cached output, e.g. a missing file.
+            retries (int): Extra attempts after a failure; cancellations are
+                never retried.
+            retry_delay (float): Seconds before the first retry, doubled for each next one.
+            timeout (float): Seconds one attempt may take.
+        """
+        self.name = name
+        self.run = run
+        self.after = tuple(after)
+        self.arun = arun
+        self.provides = tuple(provides or (name,))
+        self.label = label
+        self.cache_inputs = cache_inputs
+        self.validate = validate
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+
+    def outputs(self, output: Any) -> Dict[str, Any]:
+        """Map the node's return value to the values it provides."""
+        if len(self.provides) == 1:
+            return {self.provides[0]: output}
+        return dict(zip(self.provides, output))
+
+
+class NodeCache:
+    """Where a graph run keeps the outputs of nodes with cache inputs; this one keeps nothing."""
+
+    def load(self, node: str, inputs: dict, validate: Optional[Callable[[Any], bool]] = None) -> Optional[Any]:
+        return None
+
+    def save(self, node: str, inputs: dict, output: Any) -> None:
+        pass
+
+
+_langgraph = None
+_langgraph_error = None
+_langgraph_lock = threading.Lock()
+
+
+def _load_langgraph():
+    """
+    Import LangGraph once.
+
+    Returns:
+        tuple: (StateGraph, START, END, RunnableLambda).
+
+    Raises:
+        RuntimeError: If LangGraph cannot be imported. The failure is
+        remembered, so later calls fail fast.
+    """
+    global _langgraph, _langgraph_error
+    with _langgraph_lock:
+        if _langgraph is None and _langgraph_error is None:
+            try:
+                from langchain_core.runnables import RunnableLambda
+                from langgraph.graph import END, START, StateGraph
+                _langgraph = (StateGraph, START, END, RunnableLambda)
+            except Exception as e:
+                _langgraph_error = f"{type(e).__name__}: {e}"
+    if _langgraph_error is not None:
+        raise RuntimeError(_langgraph_error)
+    return _langgraph
+
+
+def select_engine() -> str:
+    """
+    Return the engine that runs pipeline graphs.
+
+    Graphs run on LangGraph. The built-in scheduler is used only when an
+    operator opts into it with PIPELINE_GRAPH_ENGINE=builtin; a broken
+    LangGraph install is an error rather than a silent fallback.
+
+    Returns:
+        str: "langgraph" or "builtin".
+
+    Raises:
+        ValueError: If PIPELINE_GRAPH_ENGINE names an unknown engine.
+        RuntimeError: If LangGraph is selected but cannot be imported.
+    """
+    engine = os.environ.get("PIPELINE_GRAPH_ENGINE", "").strip().lower() or "langgraph"
+    if engine not in ENGINES:
+        raise ValueError(f"PIPELINE_GRAPH_ENGINE must be one of {', '.join(ENGINES)}, got {engine!r}")
+    if engine == "builtin":
+        return "builtin"
+    try:
+        _load_langgraph()
+    except RuntimeError as e:
+        raise RuntimeError(
+            f"LangGraph is unavailable ({e}); install the langgraph and langchain-core versions "
+            "in requirements.txt, or set PIPELINE_GRAPH_ENGINE=builtin"
+        ) from None
+    return "langgraph"
+
+
+class PipelineGraph:
+    """
+    A pipeline declared as a dependency graph of nodes.
+
+    run() and arun() execute the same graph synchronously or on the event
+    loop; stream() runs it in a worker thread and yields its events. Values
+    passed in are not recomputed, so a caller that already has some outputs
+    (e.g. a streamed article) runs just the rest of the graph.
+
+    Each node gets, in order: a cancellation check, a cache lookup, and
+    attempts bounded by its timeout and retried on failure. A node that
+    fails cancels the nodes running beside it.
+    """
+
+    def __init__(self, nodes: Iterable[Node], inputs: Sequence[str] = ()):
+        """
+        Args:
+            nodes (Iterable[Node]): The nodes; each may only depend on inputs
+                and on nodes listed before it, so the graph has no cycles.
+            inputs (Sequence[str]): Values the caller provides.
+
+        Raises:
+            ValueError: If a name is provided twice or a dependency is unknown.
+        """
+        self.nodes: List[Node] = []
+        self.inputs = tuple(inputs)
+        self._producers: Dict[str, Node] = {}
+        self._compiled: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        for node in nodes:
+            self._add(node)
+
+    def _add(self, node: Node) -> None:
+        known = set(self.inputs) | set(self._producers)
+        if any(node.name == other.name for other in self.nodes):
+            raise ValueError(f"Duplicate node {node.name!r}")
+        for value in node.provides:
+            if value in known:
+                raise ValueError(f"Node {node.name!r} provides {value!r}, which is already provided")
+        for dependency in node.after:
+            if dependency not in known:
+                raise ValueError(f"Node {node.name!r} depends on unknown value {dependency!r}")
+        self.nodes.append(node)
+        for value in node.provides:
+            self._producers[value] = node
+
+    @property
+    def values(self) -> List[str]:
+        """Every value the graph reads or provides."""
+        return list(self.inputs) + list(self._producers)
+
+    def plan(self, provided: Iterable[str], targets: Optional[Iterable[str]] = None) -> List[Node]:
+        """
+        Pick the nodes needed to compute targets from the provided values.
+
+        Args:
+            provided (Iterable[str]): Values already known.
+            targets (Iterable[str]): Values wanted; defaults to every value.
+
+        Returns:
+            List[Node]: The nodes to run, in dependency order.
+
+        Raises:
+            ValueError: If a needed value is neither provided nor computed by any node.
+        """
+        provided = set(provided)
+        needed = set()
+        pending = list(targets if targets is not None else self._producers)
+        while pending:
+            value = pending.pop()
+            if value in provided:
+                continue
+            node = self._producers.get(value)
+            if node is None:
+                raise ValueError(f"Value {value!r} is neither provided nor computed by any node")
+            if node.name not in needed:
+                needed.add(node.name)
+                pending.extend(node.after)
+        return [node for node in self.nodes if node.name in needed]
+
+    # ---------------------------
+    # Execution
+    # ---------------------------
+    def run(
+        self,
+        values: Dict[str, Any],
+        targets: Optional[Iterable[str]] = None,
+        cache: Optional[NodeCache] = None,
+        on_event: Optional[Callable[[dict], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Run the graph in the calling thread, with independent nodes in worker threads.
+
+        Args:
+            values (Dict[str, Any]): The inputs, plus any outputs already known.
+            targets (Iterable[str]): Values wanted; defaults to every value.
+            cache (NodeCache): Where cacheable node outputs are kept.
+            on_event (Callable): Called, from any thread, with each progress
+                event: {"type": "stage", "stage": <node>} when a labelled node
+                starts (with "retry": <n> when it starts over), plus whatever
+                the nodes emit().
+
+        Returns:
+            Dict[str, Any]: The given values and every computed one.
+
+        Raises:
+            RunCancelled: If the current cancellation token fires.
+            NodeTimeout: If a node's last attempt timed out.
+        """
+        plan = self.plan(values, targets)
+        cache = cache or NodeCache()
+        if not plan:
+            return dict(values)
+        listener = _sink.set(on_event) if on_event is not None else None
+        try:
+            with child_token() as token:
+                try:
+                    if select_engine() == "langgraph":
+                        return self._compile(plan).invoke(dict(values), config=self._config(plan, cache))
+                    return self._run_builtin(plan, dict(values), cache)
+                except BaseException:
+                    # Stop nodes still running beside the one that failed
+                    token.cancel("pipeline graph failed")
+                    raise
+        finally:
+            if listener is not None:
+                _sink.reset(listener)
+
+    async def arun(
+        self,
+        values: Dict[str, Any],
+        targets: Optional[Iterable[str]] = None,
+        cache: Optional[NodeCache] = None,
+        on_event: Optional[Callable[[dict], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Async variant of run(): nodes with arun are awaited on the event loop,
+        the others run in worker threads.
+        """
+        plan = self.plan(values, targets)
+        cache = cache or NodeCache()
+        if not plan:
+            return dict(values)
+        listener = _sink.set(on_event) if on_event is not None else None
+        try:
+            with child_token() as token:
+                try:
+                    if select_engine() == "langgraph":
+                        return await self._compile(plan).ainvoke(dict(values), config=self._config(plan, cache))
+                    return await self._arun_builtin(plan, dict(values), cache)
+                except BaseException:
+                    token.cancel("pipeline graph failed")
+                    raise
+        finally:
+            if listener is not None:
+                _sink.reset(listener)
+
+    def stream(
+        self,
+        values: Dict[str, Any],
+        targets: Optional[Iterable[str]] = None,
+        cache: Optional[NodeCache] = None,
+    ) -> Generator[dict, None, Dict[str, Any]]:
+        """
+        Run the graph in a worker thread, yielding its progress events as they happen.
+
+        Closing the generator early cancels the run.
+
+        Args:
+            values (Dict[str, Any]): As in run().
+            targets (Iterable[str]): As in run().
+            cache (NodeCache): As in run().
+
+        Yields:
+            dict: Progress events, as passed to run()'s on_event.
+
+        Returns:
+            Dict[str, Any]: The given values and every computed one.
+        """
+        events: queue.Queue = queue.Queue()
+        outcome: Dict[str, Any] = {}
+        # The worker gets a token of its own, so closing the generator stops it
+        # without cancelling the caller's token
+        token = CancellationToken()
+        parent = current_token()
+        unregister = parent.on_cancel(lambda: token.cancel(parent.reason)) if parent is not None else (lambda: None)
+
+        def work() -> None:
+            try:
+                outcome["values"] = self.run(values, targets, cache, on_event=events.put)
+            except BaseException as e:
+                outcome["error"] = e
+            finally:
+                events.put(_DONE)
+
+        worker = threading.Thread(target=context_with(token).run, args=(work,), name="graph-stream", daemon=True)
+        worker.start()
+        try:
+            while True:
+                event = events.get()
+                if event is _DONE:
+                    break
+                yield event
+        finally:
+            if worker.is_alive():
+                token.cancel("graph stream closed")
+                worker.join()
+            unregister()
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["values"]
+
+    def _run_builtin(self, plan: List[Node], values: Dict[str, Any], cache: NodeCache) -> Dict[str, Any]:
+        """Run the plan on a thread pool, starting each node once its dependencies are done."""
+        pending = list(plan)
+        running = {}
+        with ThreadPoolExecutor(max_workers=len(plan), thread_name_prefix="graph") as pool:
+            while pending or running:
+                for node in [node for node in pending if all(value in values for value in node.after)]:
+                    pending.remove(node)
+                    future = pool.submit(contextvars.copy_context().run, self._call, node, dict(values), cache)
+                    running[future] = node
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del running[future]
+                    values.update(future.result())
+        return values
+
+    async def _arun_builtin(self, plan: List[Node], values: Dict[str, Any], cache: NodeCache) -> Dict[str, Any]:
+        """Async variant of _run_builtin() with one task per node."""
+        pending = list(plan)
+        running = {}
+        try:
+            while pending or running:
+                for node in [node for node in pending if all(value in values for value in node.after)]:
+                    pending.remove(node)
+                    running[asyncio.ensure_future(self._acall(node, dict(values), cache))] = node
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    del running[task]
+                    values.update(task.result())
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+        return values
+
+    def _compile(self, plan: List[Node]):
+        """Build the LangGraph StateGraph for a plan, once per distinct plan."""
+        key = tuple(node.name for node in plan)
+        with self._lock:
+            if key in self._compiled:
+                return self._compiled[key]
+
+        StateGraph, START, END, RunnableLambda = _load_langgraph()
+        state = TypedDict("PipelineState", {value: Any for value in self.values}, total=False)
+        builder = StateGraph(state)
+        names = {node.name for node in plan}
+        upstream_nodes = set()
+        for node in plan:
+            builder.add_node(node.name, RunnableLambda(self._step(node), afunc=self._astep(node), name=node.name))
+            upstream = sorted({
+                self._producers[value].name for value in node.after
+                if value in self._producers and self._producers[value].name in names
+            })
+            upstream_nodes.update(upstream)
+            if not upstream:
+                builder.add_edge(START, node.name)
+            else:
+                # A list waits for every upstream node, not just the first to finish
+                builder.add_edge(upstream if len(upstream) > 1 else upstream[0], node.name)
+        for node in plan:
+            if node.name not in upstream_nodes:
+                builder.add_edge(node.name, END)
+        compiled = builder.compile()
+
+        with self._lock:
+            return self._compiled.setdefault(key, compiled)
+
+    @staticmethod
+    def _config(plan: List[Node], cache: NodeCache) -> dict:
+        return {"configurable": {"node_cache": cache}, "recursion_limit": len(plan) + 2}
+
+    def _step(self, node: Node) -> Callable[[dict, dict], Dict[str, Any]]:
+        def step(state: dict, config: dict) -> Dict[str, Any]:
+            return self._call(node, state, config["configurable"]["node_cache"])
+        return step
+
+    def _astep(self, node: Node) -> Callable[[dict, dict], Awaitable[Dict[str, Any]]]:
+        async def astep(state: dict, config: dict) -> Dict[str, Any]:
+            return await self._acall(node, state, config["configurable"]["node_cache"])
+        return astep
+
+    # ---------------------------
+    # Nodes
+    # ---------------------------
+    def _call(self, node: Node, values: Dict[str, Any], cache: NodeCache) -> Dict[str, Any]:
+        """Run one node: cancellation check, cache, then attempts with retries."""
+        check_cancelled()
+        args = [values[value] for value in node.after]
+        if node.label:
+            print(f"{node.label}...")
+            emit({"type": "stage", "stage": node.name})
+        with stage_timer(node.name):
+            cache_inputs = node.cache_inputs(*args) if node.cache_inputs is not None else None
+            output = cache.load(node.name, cache_inputs, node.validate) if cache_inputs is not None else None
+            if output is None:
+                for attempt in range(node.retries + 1):
+                    try:
+                        output = self._attempt(node, args)
+                        break
+                    except Exception as e:
+                        self._retrying(node, attempt, e)
+                        token = current_token()
+                        if token.wait(node.retry_delay * 2 ** attempt):
+                            token.raise_if_cancelled()
+                        self._restarting(node, attempt)
+                if cache_inputs is not None:
+                    cache.save(node.name, cache_inputs, output)
+        return node.outputs(output)
+
+    async def _acall(self, node: Node, values: Dict[str, Any], cache: NodeCache) -> Dict[str, Any]:
+        """Async variant of _call()."""
+        check_cancelled()
+        args = [values[value] for value in node.after]
+        if node.label:
+            print(f"{node.label}...")
+            emit({"type": "stage", "stage": node.name})
+        with stage_timer(node.name):
+            cache_inputs = node.cache_inputs(*args) if node.cache_inputs is not None else None
+            output = cache.load(node.name, cache_inputs, node.validate) if cache_inputs is not None else None
+            if output is None:
+                for attempt in range(node.retries + 1):
+                    try:
+                        output = await self._aattempt(node, args)
+                        break
+                    except Exception as e:
+                        self._retrying(node, attempt, e)
+                        # Wakes as soon as the run is cancelled, like token.wait() in _call()
+                        await await_or_cancel(asyncio.sleep(node.retry_delay * 2 ** attempt), current_token(), "stage")
+                        check_cancelled()
+                        self._restarting(node, attempt)
+                if cache_inputs is not None:
+                    cache.save(node.name, cache_inputs, output)
+        return node.outputs(output)
+
+    @staticmethod
+    def _retrying(node: Node, attempt: int, error: Exception) -> None:
+        """
+        Re-raise error unless the node has attempts left.
+
+        A node that gives up cancels the graph run's token, so the nodes
+        running beside it stop at their next check instead of finishing work
+        that will be thrown away.
+        """
+        if isinstance(error, RunCancelled):
+            raise error
+        if attempt >= node.retries:
+            current_token().cancel(f"{node.name} failed")
+            raise error
+        REGISTRY.inc("article_graph_node_retries_total", labels={"node": node.name})
+        print(f"{node.name} failed ({type(error).__name__}: {error}); retrying ({attempt + 1}/{node.retries}).")
+
+    @staticmethod
+    def _restarting(node: Node, attempt: int) -> None:
+        """Tell listeners a labelled node starts over, so they drop what its failed attempt emitted."""
+        if node.label:
+            emit({"type": "stage", "stage": node.name, "retry": attempt + 1})
+
+    @staticmethod
+    def _attempt(node: Node, args: list) -> Any:
+        """
+        Run one attempt of a node, bounded by its timeout.
+
+        The timeout cancels a token of the attempt's own, so it stops at the
+        node's next cancellation check (a streamed chunk, a model slot, an
+        export) without cancelling the rest of the run.
+        """
+        if node.timeout is None:
+            return node.run(*args)
+        reason = f"{node.name} timed out after {node.timeout}s"
+        with child_token() as token:
+            timer = threading.Timer(node.timeout, token.cancel, args=(reason,))
+            timer.daemon = True
+            timer.start()
+            try:
+                return node.run(*args)
+            except RunCancelled:
+                if token.reason != reason:
+                    raise
+                REGISTRY.inc("article_graph_node_timeouts_total", labels={"node": node.name})
+                raise NodeTimeout(reason) from None
+            finally:
+                timer.cancel()
+
+    @classmethod
+    async def _aattempt(cls, node: Node, args: list) -> Any:
+        """Async variant of _attempt(); nodes without arun run in a worker thread."""
+        if node.arun is None:
+            return await asyncio.to_thread(cls._attempt, node, args)
+        if node.timeout is None:
+            return await node.arun(*args)
+        try:
+            return await asyncio.wait_for(node.arun(*args), node.timeout)
+        except asyncio.TimeoutError:
+            REGISTRY.inc("article_graph_node_timeouts_total", labels={"node": node.name})
+            raise NodeTimeout(f"{node.name} timed out after {node.timeout}s") from None
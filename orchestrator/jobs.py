@@ -0,0 +1,592 @@
+# orchestrator/jobs.py
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from orchestrator.checkpoint import CheckpointStore
+from orchestrator.workflow import OrchestratorAgent
+from utils.cancellation import CancellationToken, RunCancelled
+from utils.llm_scheduler import INTERACTIVE, PRIORITIES, llm_priority
+from utils.metrics import REGISTRY
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TERMINAL_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+DEFAULT_OPTIONS = {
+    "include_code": True,
+    "model": "mistral",
+    "code_model": "codellama:7b",
+    "parallel_sections": False,
+    "pipeline_code": False,
+    "priority": INTERACTIVE,
+    "abandon_after": 0,
+}
+
+# How often the reaper looks for jobs whose client has stopped polling
+REAP_INTERVAL_SECONDS = 1.0
+
+# A process owns its queued and running jobs for this long after its last
+# heartbeat; other processes resume them only once the lease has expired
+LEASE_SECONDS = 60.0
+HEARTBEAT_SECONDS = 10.0
+
+REGISTRY.describe("article_jobs_active", "Jobs queued or running in this process.")
+REGISTRY.describe("article_jobs_total", "Finished jobs by final status.")
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's worker when the job has been cancelled."""
+
+
+class QueueFull(Exception):
+    """Raised by submit() when the process already has max_queue jobs queued or running."""
+
+
+class JobStore:
+    """
+    Persistent job table backed by SQLite.
+
+    Records each job's topic, options, status, timestamps and final result so
+    jobs survive page reloads and process restarts.
+    """
+
+    def __init__(self, path: str = os.path.join(".runs", "jobs.sqlite3")):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                topic TEXT NOT NULL,
+                options TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stage TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                result TEXT,
+                error TEXT,
+                owner TEXT,
+                lease_until REAL
+            )
+            """
+        )
+        # Stores created before leases were added
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs(created_at)")
+        self._conn.commit()
+
+    def create(self, job_id: str, topic: str, options: dict, owner: Optional[str] = None, lease_until: Optional[float] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, topic, options, status, created_at, owner, lease_until) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, topic, json.dumps(options), QUEUED, time.time(), owner, lease_until),
+            )
+            self._conn.commit()
+
+    def update(self, job_id: str, **fields) -> None:
+        """Set columns of a job; "result" is stored as JSON."""
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def transition(self, job_id: str, expected: str, status: str, **fields) -> bool:
+        """
+        Change a job's status only if it is still expected (compare-and-set).
+
+        When two callers race to move the same job on (a worker starting it
+        and cancel() stopping it while queued), exactly one of them wins.
+
+        Args:
+            job_id (str): The job ID.
+            expected (str): The status the job must be in.
+            status (str): The new status.
+            **fields: Other columns to set along with it.
+
+        Returns:
+            bool: Whether this call changed the status.
+        """
+        fields["status"] = status
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ? AND status = ?", (*fields.values(), job_id, expected)
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            columns = [column[0] for column in cursor.description]
+        return self._decode(dict(zip(columns, row))) if row else None
+
+    def list(self, limit: int = 20, statuses: Optional[Tuple[str, ...]] = None) -> List[dict]:
+        """Return the most recent jobs, optionally only those in the given statuses."""
+        query = "SELECT * FROM jobs"
+        params: tuple = ()
+        if statuses:
+            query += f" WHERE status IN ({', '.join('?' for _ in statuses)})"
+            params = tuple(statuses)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        with self._lock:
+            cursor = self._conn.execute(query, (*params, limit))
+            rows = cursor.fetchall()
+            columns = [column[0] for column in cursor.description]
+        return [self._decode(dict(zip(columns, row))) for row in rows]
+
+    def renew(self, owner: str, lease_until: float) -> None:
+        """Extend the lease on every queued or running job of owner."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE owner = ? AND status IN (?, ?)",
+                (lease_until, owner, QUEUED, RUNNING),
+            )
+            self._conn.commit()
+
+    def claim_expired(self, owner: str, lease_until: float) -> List[dict]:
+        """
+        Take over queued or running jobs whose owner's lease has expired.
+
+        Each job is claimed with a conditional UPDATE, so when several
+        processes look at once, every job goes to exactly one of them.
+
+        Args:
+            owner (str): The claiming process.
+            lease_until (float): When the new lease expires.
+
+        Returns:
+            List[dict]: The claimed jobs, oldest first, reset to queued.
+        """
+        now = time.time()
+        expired = "status IN (?, ?) AND (owner IS NULL OR lease_until IS NULL OR lease_until < ?)"
+        with self._lock:
+            candidates = self._conn.execute(
+                f"SELECT id FROM jobs WHERE {expired} ORDER BY created_at", (QUEUED, RUNNING, now)
+            ).fetchall()
+            claimed = []
+            for (job_id,) in candidates:
+                cursor = self._conn.execute(
+                    f"UPDATE jobs SET owner = ?, lease_until = ?, status = ?, stage = NULL WHERE id = ? AND {expired}",
+                    (owner, lease_until, QUEUED, job_id, QUEUED, RUNNING, now),
+                )
+                if cursor.rowcount == 1:
+                    claimed.append(job_id)
+            self._conn.commit()
+        return [job for job in (self.get(job_id) for job_id in claimed) if job is not None]
+
+    @staticmethod
+    def _decode(job: dict) -> dict:
+        job["options"] = json.loads(job["options"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+class _LiveJob:
+    """In-memory progress of a job that is queued or running in this process."""
+
+    def __init__(self):
+        self.events: List[dict] = []
+        self.text: Dict[str, str] = {}
+        self.token = CancellationToken()
+        self.abandon_after = 0.0
+        self.seen = time.monotonic()
+        self.done = False
+        self.condition = threading.Condition()
+
+    def publish(self, event: dict) -> None:
+        with self.condition:
+            if event["type"] == "token":
+                self.text[event["stage"]] = self.text.get(event["stage"], "") + event["text"]
+            elif event["type"] == "stage" and event.get("retry"):
+                # The stage starts over, so its text so far is discarded
+                self.text.pop(event["stage"], None)
+            self.events.append(event)
+            self.condition.notify_all()
+
+
+class JobManager:
+    """
+    Runs article generation jobs on a bounded worker pool.
+
+    Jobs are submitted with submit() and inspected with status(), progress(),
+    events() and result(); cancel() stops a queued or running job. A job
+    submitted with abandon_after is cancelled once nobody has polled it
+    (touch() or events()) for that many seconds. Job rows
+    are persisted in a JobStore, which several processes (the UI and the API
+    server) may share. Each process holds a lease on its own queued and running
+    jobs and renews it while alive; jobs whose owner stopped renewing (it
+    exited or crashed) are claimed by another manager, or by the next one to
+    start, and resume from their stage checkpoints.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        store: Optional[JobStore] = None,
+        checkpoint_dir: Optional[str] = ".runs",
+        orchestrator_factory: Optional[Callable[[dict], OrchestratorAgent]] = None,
+        resume: bool = True,
+    ):
+        self.workers = workers
+        self.store = store or JobStore()
+        self.checkpoint_dir = checkpoint_dir
+        self._orchestrator_factory = orchestrator_factory or self._build_orchestrator
+        self._orchestrators: Dict[tuple, OrchestratorAgent] = {}
+        self._live: Dict[str, _LiveJob] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="article-job")
+        self._closed = threading.Event()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.resume = resume
+        if resume:
+            self._resume_expired()
+        threading.Thread(target=self._reap, name="article-job-reaper", daemon=True).start()
+
+    # ---------------------------
+    # Operations
+    # ---------------------------
+    def submit(self, topic: str, max_queue: Optional[int] = None, **options) -> str:
+        """
+        Queue an article generation job.
+
+        Args:
+            topic (str): The topic to generate an article about.
+            max_queue (int): Refuse the job if this many jobs are already
+                queued or running in this process; None accepts any number.
+            **options: Any of include_code, model, code_model,
+                parallel_sections, pipeline_code, priority
+                ("interactive" or "batch", for the LLM scheduler) and
+                abandon_after (seconds without a poll before the job is
+                cancelled; 0 keeps it running).
+
+        Returns:
+            str: The job ID.
+
+        Raises:
+            TypeError: If the topic is not a string.
+            ValueError: If the topic is empty or an option is unknown or invalid.
+            QueueFull: If max_queue jobs are already queued or running.
+        """
+        if not isinstance(topic, str):
+            raise TypeError("topic must be a string")
+        if not topic.strip():
+            raise ValueError("topic must not be empty")
+        unknown = set(options) - set(DEFAULT_OPTIONS)
+        if unknown:
+            raise ValueError(f"unknown job options: {', '.join(sorted(unknown))}")
+        for name in ("include_code", "parallel_sections", "pipeline_code"):
+            if name in options and not isinstance(options[name], bool):
+                raise ValueError(f"{name} must be true or false")
+        for name in ("model", "code_model"):
+            if name in options and not (isinstance(options[name], str) and options[name].strip()):
+                raise ValueError(f"{name} must be a non-empty string")
+        if options.get("priority", INTERACTIVE) not in PRIORITIES:
+            raise ValueError(f"priority must be one of: {', '.join(PRIORITIES)}")
+        abandon_after = options.get("abandon_after", 0)
+        if isinstance(abandon_after, bool) or not isinstance(abandon_after, (int, float)) or abandon_after < 0:
+            raise ValueError("abandon_after must be a non-negative number of seconds")
+
+        job_id = uuid.uuid4().hex[:16]
+        options = dict(DEFAULT_OPTIONS, **options)
+        # Checked and reserved under one lock, so concurrent submissions cannot overshoot max_queue
+        self._register(job_id, options, max_queue)
+        try:
+            self.store.create(job_id, topic.strip(), options, self.owner, time.time() + LEASE_SECONDS)
+        except BaseException:
+            self._unregister(job_id)
+            raise
+        self._pool.submit(self._run_job, job_id, topic.strip(), options)
+        return job_id
+
+    def status(self, job_id: str) -> Optional[dict]:
+        """
+        Return a job's row: id, topic, options, status, stage, timestamps,
+        result and error. None if the job does not exist.
+        """
+        return self.store.get(job_id)
+
+    def progress(self, job_id: str) -> Dict[str, str]:
+        """
+        Return the text generated so far by a live job, keyed by stage.
+
+        Returns:
+            Dict[str, str]: e.g. {"analysis": ..., "content": ..., "code": ...};
+            empty once the job has finished or if it runs in another process.
+        """
+        live = self._live.get(job_id)
+        if live is None:
+            return {}
+        with live.condition:
+            return dict(live.text)
+
+    def events(self, job_id: str, after: int = 0, timeout: Optional[float] = None) -> Iterator[dict]:
+        """
+        Stream a job's progress events, starting at index `after`.
+
+        Yields the orchestrator's stage/token/result events as they happen and
+        ends with a {"type": "status", "status": ...} event once the job is
+        finished. A job that is not live in this process yields only its
+        final status event.
+
+        Args:
+            job_id (str): The job ID.
+            after (int): Number of events the caller has already seen.
+            timeout (float): Stop waiting for new events after this many
+                seconds of silence; None waits until the job finishes.
+
+        Yields:
+            dict: Progress events, each with its "index".
+        """
+        live = self._live.get(job_id)
+        index = after
+        while live is not None:
+            live.seen = time.monotonic()
+            with live.condition:
+                if index >= len(live.events) and not live.done:
+                    if not live.condition.wait(timeout) and timeout is not None:
+                        return
+                pending = live.events[index:]
+                done = live.done
+            for event in pending:
+                yield dict(event, index=index)
+                index += 1
+            if done and index >= len(live.events):
+                break
+
+        job = self.store.get(job_id)
+        if job is not None:
+            yield {"type": "status", "status": job["status"], "error": job["error"], "index": index}
+
+    def cancel(self, job_id: str, reason: str = "cancelled") -> bool:
+        """
+        Cancel a queued or running job.
+
+        A queued job never starts. A running job stops at its next check:
+        between streamed chunks, while waiting for a model or an export, or
+        at a stage boundary. Its open LLM streams are closed, which stops
+        generation on the server unless another job shares it.
+
+        Args:
+            job_id (str): The job ID.
+            reason (str): Why the job was cancelled, for the logs.
+
+        Returns:
+            bool: True if the job was live and is now being cancelled.
+        """
+        live = self._live.get(job_id)
+        if live is None:
+            return False
+        live.token.cancel(reason)
+        # A job that is still queued is finished here; once a worker has
+        # started it, the worker sees the token and finishes it instead
+        self._finish(job_id, CANCELLED, expected=QUEUED)
+        return True
+
+    def touch(self, job_id: str) -> bool:
+        """
+        Record that a client is still waiting for a job, postponing its abandonment.
+
+        Returns:
+            bool: True if the job is live in this process.
+        """
+        live = self._live.get(job_id)
+        if live is None:
+            return False
+        live.seen = time.monotonic()
+        return True
+
+    def result(self, job_id: str) -> Optional[dict]:
+        """
+        Return a finished job's result.
+
+        Returns:
+            Optional[dict]: content, pdf_path, docx_path and metrics, or None if
+            the job does not exist or has not succeeded.
+        """
+        job = self.store.get(job_id)
+        return job["result"] if job and job["status"] == SUCCEEDED else None
+
+    def list_jobs(self, limit: int = 20) -> List[dict]:
+        """Return the most recent jobs, newest first."""
+        return self.store.list(limit=limit)
+
+    def queue_depth(self) -> int:
+        """Number of jobs queued or running in this process."""
+        with self._lock:
+            return len(self._live)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting work; running jobs are left to finish when wait is True."""
+        self._closed.set()
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    # ---------------------------
+    # Workers
+    # ---------------------------
+    def _enqueue(self, job_id: str, topic: str, options: dict) -> None:
+        self._register(job_id, options)
+        self._pool.submit(self._run_job, job_id, topic, options)
+
+    def _register(self, job_id: str, options: dict, max_queue: Optional[int] = None) -> None:
+        """Track a job as live in this process, refusing it if max_queue jobs already are."""
+        live = _LiveJob()
+        live.abandon_after = float(options.get("abandon_after", 0))
+        with self._lock:
+            if max_queue is not None and len(self._live) >= max_queue:
+                raise QueueFull(f"{len(self._live)} jobs are already queued or running")
+            self._live[job_id] = live
+            REGISTRY.set_gauge("article_jobs_active", len(self._live))
+
+    def _unregister(self, job_id: str) -> Optional[_LiveJob]:
+        with self._lock:
+            live = self._live.pop(job_id, None)
+            REGISTRY.set_gauge("article_jobs_active", len(self._live))
+        return live
+
+    def _build_orchestrator(self, options: dict) -> OrchestratorAgent:
+        return OrchestratorAgent(
+            options["model"],
+            options["code_model"],
+            parallel_sections=options["parallel_sections"],
+            pipeline_code=options["pipeline_code"],
+            checkpoints=CheckpointStore(self.checkpoint_dir) if self.checkpoint_dir else None,
+        )
+
+    def _orchestrator_for(self, options: dict) -> OrchestratorAgent:
+        """Reuse one orchestrator per model/mode combination."""
+        key = tuple(sorted((name, value) for name, value in options.items() if name not in ("include_code", "priority", "abandon_after")))
+        with self._lock:
+            if key not in self._orchestrators:
+                self._orchestrators[key] = self._orchestrator_factory(options)
+            return self._orchestrators[key]
+
+    def _run_job(self, job_id: str, topic: str, options: dict) -> None:
+        live = self._live.get(job_id)
+        if live is None or live.token.cancelled:
+            return
+        if not self.store.transition(job_id, QUEUED, RUNNING, started_at=time.time()):
+            # cancel() finished it while it was queued
+            return
+
+        events = None
+        try:
+            with llm_priority(options.get("priority", INTERACTIVE)):
+                events = self._orchestrator_for(options).stream(
+                    topic, options["include_code"], cancel_token=live.token
+                )
+                for event in events:
+                    if live.token.cancelled:
+                        raise JobCancelled()
+                    if event["type"] == "stage":
+                        self.store.update(job_id, stage=event["stage"])
+                    elif event["type"] == "result":
+                        result = {key: value for key, value in event.items() if key != "type"}
+                        self.store.update(job_id, result=result)
+                    live.publish(event)
+        except (JobCancelled, RunCancelled):
+            if events is not None:
+                events.close()
+            print(f"Job {job_id} cancelled: {live.token.reason}")
+            status, error = CANCELLED, None
+        except Exception as e:
+            status, error = FAILED, f"{type(e).__name__}: {e}"
+        else:
+            status, error = SUCCEEDED, None
+        if not self._finish(job_id, status, error):
+            # Another process claimed the job after this one's lease lapsed
+            self._release(job_id)
+
+    def _resume_expired(self) -> None:
+        """Claim and resubmit jobs whose owner's lease has expired."""
+        for job in self.store.claim_expired(self.owner, time.time() + LEASE_SECONDS):
+            print(f"Resuming job {job['id']} ({job['topic']})")
+            self._enqueue(job["id"], job["topic"], job["options"])
+
+    def _reap(self) -> None:
+        """
+        Cancel jobs that nobody has polled within their abandon_after window,
+        renew this process's leases and take over jobs whose lease has expired.
+        """
+        heartbeat = time.monotonic()
+        while not self._closed.wait(REAP_INTERVAL_SECONDS):
+            if time.monotonic() - heartbeat >= HEARTBEAT_SECONDS:
+                heartbeat = time.monotonic()
+                try:
+                    self.store.renew(self.owner, time.time() + LEASE_SECONDS)
+                    if self.resume:
+                        self._resume_expired()
+                except sqlite3.Error as e:
+                    print(f"Could not renew job leases: {e}")
+            now = time.monotonic()
+            with self._lock:
+                abandoned = [
+                    job_id for job_id, live in self._live.items()
+                    if live.abandon_after > 0 and now - live.seen > live.abandon_after and not live.token.cancelled
+                ]
+            for job_id in abandoned:
+                self.cancel(job_id, "abandoned by its client")
+
+    def _finish(self, job_id: str, status: str, error: Optional[str] = None, expected: str = RUNNING) -> bool:
+        """
+        Move a job from expected to a final status, then count and release it.
+
+        Returns:
+            bool: Whether this call finished the job; False if its status had
+            already moved on, in which case nothing is recorded.
+        """
+        if not self.store.transition(job_id, expected, status, finished_at=time.time(), error=error):
+            return False
+        REGISTRY.inc("article_jobs_total", labels={"status": status})
+        self._release(job_id)
+        return True
+
+    def _release(self, job_id: str) -> None:
+        """Stop tracking a job in this process and wake its event readers."""
+        live = self._unregister(job_id)
+        if live is not None:
+            with live.condition:
+                live.done = True
+                live.condition.notify_all()
+
+
+_manager: Optional[JobManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """
+    Return the process-wide job manager, starting it on first use.
+
+    The worker count is read from JOB_WORKERS (default: 2).
+
+    Returns:
+        JobManager: The shared manager.
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager(workers=int(os.environ.get("JOB_WORKERS", 2)))
+        return _manager
@@ -1,51 +1,701 @@
 # orchestrator/workflow.py
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from agents.topic_analyzer import TopicAnalyzerAgent
 from agents.content_generator import ContentGeneratorAgent
 from agents.code_snippet import CodeSnippetAgent
 from agents.formatter import FormatterAgent
 from agents.exporter import ExporterAgent
-from typing import Tuple, Optional
+from orchestrator.checkpoint import CheckpointStore, hash_inputs
+from orchestrator.graph import Node, NodeCache, PipelineGraph, emit, listening, select_engine
+from utils.cancellation import CancellationToken, await_or_cancel, cancellation, current_token, iterate_with
+from utils.conversation import conversation
+from utils.markdown_utils import SectionStreamSplitter, split_sections
+from utils.metrics import track_run
+from utils.single_flight import SingleFlight
+from typing import Any, Awaitable, Callable, Dict, Generator, Iterator, List, Tuple, Optional, Union
+
+# Sections that never get a code example of their own
+NON_CODE_SECTIONS = ("", "introduction", "conclusion")
+
+# Identical pipelines requested at the same time run once
+_pipelines = SingleFlight("pipeline")
+
+
+class _StageCheckpoints(NodeCache):
+    """Keeps pipeline graph node outputs as the stage checkpoints of one run."""
+
+    def __init__(self, orchestrator: "OrchestratorAgent", run_id: Optional[str]):
+        self.orchestrator = orchestrator
+        self.run_id = run_id
+
+    def load(self, node: str, inputs: dict, validate: Optional[Callable[[Any], bool]] = None) -> Optional[Any]:
+        return self.orchestrator._load_stage(self.run_id, node, inputs, validate)
+
+    def save(self, node: str, inputs: dict, output: Any) -> None:
+        self.orchestrator._save_stage(self.run_id, node, inputs, output)
+
 
 class OrchestratorAgent:
-    def __init__(self, model_name: str = "mistral", code_model_name: str = "codellama:7b"):
+    def __init__(
+        self,
+        model_name: str = "mistral",
+        code_model_name: str = "codellama:7b",
+        parallel_sections: bool = False,
+        pipeline_code: bool = False,
+        max_code_sections: int = 4,
+        checkpoints: Optional[CheckpointStore] = None,
+        llm_retries: int = 0,
+        timeouts: Optional[Dict[str, float]] = None,
+    ):
+        """
+        Args:
+            model_name (str): Model used for topic analysis and content.
+            code_model_name (str): Model used for code examples.
+            parallel_sections (bool): Generate the article one section per
+                request, concurrently. Needs Ollama configured for parallel
+                requests (OLLAMA_NUM_PARALLEL) to pay off.
+            pipeline_code (bool): Start a code example for each section as soon
+                as that section is written, instead of waiting for the whole
+                article, and attach it to that section.
+            max_code_sections (int): Maximum number of sections that get a code
+                example in pipelined mode.
+            checkpoints (CheckpointStore): Where to persist each stage's output.
+                When set, a rerun with the same inputs (or run ID) resumes from
+                the first stage that is missing or stale.
+            llm_retries (int): Extra attempts for a failed analysis, content or
+                code stage.
+            timeouts (Dict[str, float]): Seconds one attempt of a pipeline
+                graph node may take, by node name (see graph()).
+        """
+        self.parallel_sections = parallel_sections
+        self.pipeline_code = pipeline_code
+        self.max_code_sections = max_code_sections
+        self.checkpoints = checkpoints
+        self.llm_retries = llm_retries
+        self.timeouts = dict(timeouts or {})
+        # Fail fast on a missing LangGraph or a bad PIPELINE_GRAPH_ENGINE
+        select_engine()
+        self._graphs: Dict[bool, PipelineGraph] = {}
         self.topic_analyzer = TopicAnalyzerAgent(model_name)
         self.content_generator = ContentGeneratorAgent(model_name)
         self.code_snippet_agent = CodeSnippetAgent(code_model_name)
         self.formatter = FormatterAgent()
         self.exporter = ExporterAgent()
 
-    def run(self, topic: str, include_code: bool = True) -> Tuple[str, str, str]:
+    def run(
+        self,
+        topic: str,
+        include_code: bool = True,
+        run_id: Optional[str] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> Tuple[str, str, str]:
         """
         Run the complete workflow to generate and export an article.
+
+        A run identical to one already in progress (same topic, options and
+        models) waits for that run and returns its result.
         
         Args:
             topic (str): The topic to generate an article about.
             include_code (bool): Whether to include code examples.
+            run_id (str): Checkpoint run ID to resume. Defaults to one derived
+                from the topic, options and models.
+            cancel_token (CancellationToken): Cancelling it stops the run at
+                the next check (a stage boundary, a streamed chunk or a wait
+                for a model) with RunCancelled. A run shared with identical
+                requests keeps going until all of them have cancelled.
             
         Returns:
             Tuple[str, str, str]: The final content, PDF path, and DOCX path.
         """
-        print("Step 1: Analyzing topic...")
-        topic_analysis = self.topic_analyzer.run(topic)
-        print("Topic analysis completed.")
-        
-        print("Step 2: Generating content...")
-        article_content = self.content_generator.run(topic_analysis)
-        print("Content generation completed.")
-        
-        code_snippets = ""
-        if include_code:
-            print("Step 3: Generating code snippets...")
-            code_snippets = self.code_snippet_agent.run(article_content)
-            print("Code snippet generation completed.")
-        
-        print("Step 4: Formatting content...")
-        formatted_content = self.formatter.run(article_content, code_snippets)
-        title = self.formatter.extract_title(formatted_content)
-        print("Formatting completed.")
-        
-        print("Step 5: Exporting to PDF and DOCX...")
-        pdf_path, docx_path = self.exporter.run(formatted_content, title)
-        print("Export completed.")
-        
-        return formatted_content, pdf_path, docx_path
\ No newline at end of file
+        run_id = self._run_id(topic, include_code, run_id)
+
+        def execute() -> Tuple[str, str, str]:
+            # Stages on the same model continue each other's context
+            with track_run(run_id), conversation():
+                return self._run(topic, include_code, run_id)
+
+        with cancellation(cancel_token):
+            return _pipelines.do(self._flight_key("run", topic, include_code, run_id), execute)[0]
+
+    def _run(self, topic: str, include_code: bool, run_id: Optional[str]) -> Tuple[str, str, str]:
+        """Body of run(), executed inside the run's metrics context."""
+        graph = self.graph(include_code and self.pipeline_code)
+        return self._result(graph.run(self._inputs(topic, include_code, run_id), cache=_StageCheckpoints(self, run_id)))
+
+    async def arun(
+        self,
+        topic: str,
+        include_code: bool = True,
+        run_id: Optional[str] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> Tuple[str, str, str]:
+        """
+        Async variant of run() for driving many pipelines on one event loop.
+
+        LLM calls are awaited on the shared async client; formatting and export
+        are blocking and run in a worker thread.
+
+        Args:
+            topic (str): The topic to generate an article about.
+            include_code (bool): Whether to include code examples.
+            run_id (str): Checkpoint run ID to resume.
+            cancel_token (CancellationToken): As in run().
+
+        Returns:
+            Tuple[str, str, str]: The final content, PDF path, and DOCX path.
+        """
+        run_id = self._run_id(topic, include_code, run_id)
+
+        async def execute() -> Tuple[str, str, str]:
+            with track_run(run_id), conversation():
+                return await self._arun(topic, include_code, run_id)
+
+        # Shares in-flight runs with run()
+        with cancellation(cancel_token):
+            return (await _pipelines.ado(self._flight_key("run", topic, include_code, run_id), execute))[0]
+
+    async def _arun(self, topic: str, include_code: bool, run_id: Optional[str]) -> Tuple[str, str, str]:
+        """Body of arun(), executed inside the run's metrics context."""
+        graph = self.graph(include_code and self.pipeline_code)
+        return self._result(await graph.arun(self._inputs(topic, include_code, run_id), cache=_StageCheckpoints(self, run_id)))
+
+    async def arun_grouped(
+        self,
+        requests: List[Tuple[str, bool]],
+        concurrency: int = 4,
+        on_done: Optional[Callable[[int, Optional[Tuple[str, str, str]], Optional[Exception]], Awaitable[None]]] = None,
+    ) -> List[Union[Tuple[str, str, str], Exception]]:
+        """
+        Run many articles stage by stage, so each model is used in one stretch.
+
+        Every topic analysis and article (content model) is generated before
+        any code example (code model), so a GPU that holds one model at a time
+        loads each model once per batch instead of switching twice per article.
+        An article is formatted and exported as soon as its code is done. In
+        this mode code examples are generated after the whole article even
+        when pipeline_code is set (still one per section). As in arun(), each
+        article is tracked as one run and shares an identical run already in
+        flight.
+
+        Args:
+            requests (List[Tuple[str, bool]]): (topic, include_code) per article.
+            concurrency (int): Maximum articles in flight within a stage.
+            on_done: Awaited with (index, result, None) or (index, None, error)
+                as each article finishes.
+
+        Returns:
+            List[Union[Tuple[str, str, str], Exception]]: (content, PDF path,
+            DOCX path) or the exception, per request.
+        """
+        results: List[Any] = [None] * len(requests)
+        run_ids = [self._run_id(topic, include_code, None) for topic, include_code in requests]
+        keys = [self._flight_key("run", topic, include_code, run_ids[index]) for index, (topic, include_code) in enumerate(requests)]
+        semaphore = asyncio.Semaphore(concurrency)
+        graph = self.graph(pipelined=False)
+
+        # The code phase starts once every distinct article is past its content stages
+        content_settled: set = set()
+        content_done = asyncio.Event()
+
+        def settle(key: str) -> None:
+            content_settled.add(key)
+            if len(content_settled) == len(set(keys)):
+                content_done.set()
+
+        if self.content_generator.llm.model == self.code_snippet_agent.llm.model:
+            # One model: no switch to avoid, so let each article run straight through
+            content_done.set()
+
+        async def execute(index: int) -> Tuple[str, str, str]:
+            topic, include_code = requests[index]
+            cache = _StageCheckpoints(self, run_ids[index])
+            with track_run(run_ids[index]), conversation():
+                try:
+                    async with semaphore:
+                        values = await graph.arun(self._inputs(topic, include_code, run_ids[index]), targets=("content",), cache=cache)
+                finally:
+                    settle(keys[index])
+                await await_or_cancel(content_done.wait(), current_token(), "stage")
+                async with semaphore:
+                    return self._result(await graph.arun(values, cache=cache))
+
+        async def step(index: int) -> None:
+            try:
+                results[index] = (await _pipelines.ado(keys[index], lambda: execute(index)))[0]
+            except Exception as e:
+                results[index] = e
+            finally:
+                # An article shared with another caller's run settles when that run ends
+                settle(keys[index])
+            # Reported once the article's outcome is settled, so a failing
+            # callback cannot be mistaken for a failed article
+            if on_done is None:
+                return
+            if isinstance(results[index], Exception):
+                await on_done(index, None, results[index])
+            else:
+                await on_done(index, results[index], None)
+
+        await asyncio.gather(*(step(index) for index in range(len(requests))))
+        return results
+
+    def stream(
+        self,
+        topic: str,
+        include_code: bool = True,
+        run_id: Optional[str] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> Iterator[dict]:
+        """
+        Run the complete workflow, yielding progress events as tokens are generated.
+
+        The run is the same pipeline graph as run(), with its LLM nodes
+        streaming. Events are dicts with a "type" key:
+            - {"type": "stage", "stage": ...} when a graph node starts (analysis,
+              content, code, format, export_pdf, export_docx); with "retry": <n>
+              when it starts over, replacing the tokens it streamed so far
+            - {"type": "token", "stage": ..., "text": ...} for each generated chunk
+            - {"type": "result", "content": ..., "pdf_path": ..., "docx_path": ..., "metrics": ...} at the end
+
+        Stages restored from a checkpoint are replayed as a single token event.
+        A stream identical to one already in progress replays that stream's
+        events instead of running the pipeline again.
+
+        Args:
+            topic (str): The topic to generate an article about.
+            include_code (bool): Whether to include code examples.
+            run_id (str): Checkpoint run ID to resume.
+            cancel_token (CancellationToken): As in run(). Closing the
+                iterator early also stops the run, unless it is shared.
+
+        Yields:
+            dict: Progress events.
+        """
+        run_id = self._run_id(topic, include_code, run_id)
+
+        def events() -> Iterator[dict]:
+            with track_run(run_id) as run_metrics, conversation():
+                for event in self._stream(topic, include_code, run_id):
+                    if event["type"] == "result":
+                        event["metrics"] = run_metrics.summary()
+                    yield event
+
+        yield from iterate_with(cancel_token, _pipelines.stream(self._flight_key("stream", topic, include_code, run_id), events))
+
+    def _stream(self, topic: str, include_code: bool, run_id: Optional[str]) -> Iterator[dict]:
+        """Body of stream(), executed inside the run's metrics context."""
+        graph = self.graph(include_code and self.pipeline_code)
+        values = yield from graph.stream(self._inputs(topic, include_code, run_id), cache=_StageCheckpoints(self, run_id))
+        formatted_content, pdf_path, docx_path = self._result(values)
+        yield {"type": "result", "content": formatted_content, "pdf_path": pdf_path, "docx_path": docx_path}
+
+    @staticmethod
+    def _emit_tokens(stage: str, tokens: Iterator[str]) -> str:
+        """Emit generated tokens as events of the graph run and return the joined text."""
+        parts = []
+        for token in tokens:
+            parts.append(token)
+            emit({"type": "token", "stage": stage, "text": token})
+        return "".join(parts)
+
+    @staticmethod
+    def _emit_code(code_snippets: Union[str, Dict[str, str]]) -> None:
+        """Emit finished code examples as token events, one per example."""
+        snippets = code_snippets.values() if isinstance(code_snippets, dict) else [code_snippets]
+        for snippet in snippets:
+            emit({"type": "token", "stage": "code", "text": snippet + "\n\n"})
+
+    def _analyze(self, topic: str) -> str:
+        """Analyze the topic, streaming the analysis when the graph run is streamed."""
+        if listening():
+            return self._emit_tokens("analysis", self.topic_analyzer.stream(topic))
+        return self.topic_analyzer.run(topic)
+
+    def _generate_content(self, topic_analysis: str) -> str:
+        """Generate the article in the configured mode, streaming it when the graph run is streamed."""
+        if self.parallel_sections:
+            # Sections finish out of order, so the article arrives in one piece
+            article_content = self.content_generator.run_sections(topic_analysis)
+            emit({"type": "token", "stage": "content", "text": article_content})
+            return article_content
+        if listening():
+            return self._emit_tokens("content", self.content_generator.stream(topic_analysis))
+        return self.content_generator.run(topic_analysis)
+
+    async def _agenerate_content(self, topic_analysis: str) -> str:
+        """Async variant of _generate_content()."""
+        if self.parallel_sections:
+            return await self.content_generator.arun_sections(topic_analysis)
+        return await self.content_generator.arun(topic_analysis)
+
+    def _code_sections(self, article_content: str) -> List[Tuple[str, str]]:
+        """Pick the sections that get their own code example in pipelined mode."""
+        chosen = {}
+        for title, body in split_sections(article_content):
+            if self._wants_code(title, body, chosen):
+                chosen[title] = body
+        return list(chosen.items())
+
+    def _generate_code(self, article_content: str) -> Union[str, Dict[str, str]]:
+        """
+        Generate code examples for a finished article.
+
+        In pipelined mode this only happens when the content came from a
+        checkpoint, so the per-section examples are generated concurrently.
+        """
+        if not self.pipeline_code:
+            if listening():
+                return self._emit_tokens("code", self.code_snippet_agent.stream(article_content))
+            return self.code_snippet_agent.run(article_content)
+        sections = self._code_sections(article_content)
+        if not sections:
+            return {}
+        with ThreadPoolExecutor(max_workers=len(sections)) as pool:
+            futures = {
+                title: pool.submit(contextvars.copy_context().run, self.code_snippet_agent.run_for_section, title, body)
+                for title, body in sections
+            }
+            code_snippets = {title: future.result() for title, future in futures.items()}
+        self._emit_code(code_snippets)
+        return code_snippets
+
+    async def _agenerate_code(self, article_content: str) -> Union[str, Dict[str, str]]:
+        """Async variant of _generate_code()."""
+        if not self.pipeline_code:
+            return await self.code_snippet_agent.arun(article_content)
+        sections = self._code_sections(article_content)
+        results = await asyncio.gather(
+            *(self.code_snippet_agent.arun_for_section(title, body) for title, body in sections)
+        )
+        return {title: result for (title, _), result in zip(sections, results)}
+
+    def _wants_code(self, title: str, body: str, started: dict) -> bool:
+        """Whether a finished section should get its own code example in pipelined mode."""
+        return (
+            title.strip().lower() not in NON_CODE_SECTIONS
+            and bool(body.strip())
+            and title not in started
+            and len(started) < self.max_code_sections
+        )
+
+    def _pipelined_events(self, topic_analysis: str) -> Generator[dict, None, Tuple[str, Dict[str, str]]]:
+        """
+        Generate content and per-section code examples with the two stages overlapped.
+
+        Each finished body section is handed to the code agent immediately, so
+        code generation runs while the rest of the article is still being written.
+
+        Args:
+            topic_analysis (str): Analysis from the topic analyzer agent.
+
+        Yields:
+            dict: Token and stage events, as in stream(); _pipelined() emits them.
+
+        Returns:
+            Tuple[str, Dict[str, str]]: The article and the code examples keyed by section title.
+        """
+        futures = {}
+        with ThreadPoolExecutor(max_workers=self.max_code_sections) as pool:
+
+            def start_code(title: str, body: str) -> None:
+                if self._wants_code(title, body, futures):
+                    futures[title] = pool.submit(
+                        contextvars.copy_context().run, self.code_snippet_agent.run_for_section, title, body
+                    )
+
+            if self.parallel_sections:
+                article_content = self.content_generator.run_sections(topic_analysis, on_section=start_code)
+                yield {"type": "token", "stage": "content", "text": article_content}
+            else:
+                splitter = SectionStreamSplitter()
+                parts = []
+                for token in self.content_generator.stream(topic_analysis):
+                    parts.append(token)
+                    yield {"type": "token", "stage": "content", "text": token}
+                    for title, body in splitter.feed(token):
+                        start_code(title, body)
+                article_content = "".join(parts)
+
+            # Pick up sections the content stage did not report, e.g. the last one
+            for title, body in split_sections(article_content):
+                start_code(title, body)
+
+            yield {"type": "stage", "stage": "code"}
+            titles = {future: title for title, future in futures.items()}
+            for future in as_completed(titles):
+                yield {"type": "token", "stage": "code", "text": future.result() + "\n\n"}
+
+        return article_content, {title: future.result() for title, future in futures.items()}
+
+    async def _arun_pipelined(self, topic_analysis: str) -> Tuple[str, Dict[str, str]]:
+        """
+        Async variant of _pipelined_events().
+
+        Args:
+            topic_analysis (str): Analysis from the topic analyzer agent.
+
+        Returns:
+            Tuple[str, Dict[str, str]]: The article and the code examples keyed by section title.
+        """
+        tasks = {}
+
+        def start_code(title: str, body: str) -> None:
+            if self._wants_code(title, body, tasks):
+                tasks[title] = asyncio.ensure_future(self.code_snippet_agent.arun_for_section(title, body))
+
+        try:
+            if self.parallel_sections:
+                article_content = await self.content_generator.arun_sections(topic_analysis, on_section=start_code)
+            else:
+                splitter = SectionStreamSplitter()
+                parts = []
+                async for token in self.content_generator.astream(topic_analysis):
+                    parts.append(token)
+                    for title, body in splitter.feed(token):
+                        start_code(title, body)
+                article_content = "".join(parts)
+
+            for title, body in split_sections(article_content):
+                start_code(title, body)
+
+            results = await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        return article_content, dict(zip(tasks.keys(), results))
+
+    def _pipelined(self, topic_analysis: str, run_id: Optional[str]) -> Tuple[str, Union[str, Dict[str, str]]]:
+        """
+        Write the article with pipelined code examples, resuming from their checkpoints.
+
+        An article checkpointed without its code gets its examples generated
+        for the finished sections instead.
+        """
+        content_inputs = self._content_inputs(topic_analysis)
+        article_content = self._load_stage(run_id, "content", content_inputs)
+        if article_content is not None:
+            emit({"type": "stage", "stage": "code"})
+            return article_content, self._checkpointed(
+                run_id, "code", self._code_inputs(article_content), lambda: self._generate_code(article_content)
+            )
+        article_content, code_snippets = self._drain(self._pipelined_events(topic_analysis))
+        self._save_stage(run_id, "content", content_inputs, article_content)
+        self._save_stage(run_id, "code", self._code_inputs(article_content), code_snippets)
+        return article_content, code_snippets
+
+    async def _apipelined(self, topic_analysis: str, run_id: Optional[str]) -> Tuple[str, Union[str, Dict[str, str]]]:
+        """Async variant of _pipelined()."""
+        content_inputs = self._content_inputs(topic_analysis)
+        article_content = self._load_stage(run_id, "content", content_inputs)
+        if article_content is not None:
+            return article_content, await self._acheckpointed(
+                run_id, "code", self._code_inputs(article_content), lambda: self._agenerate_code(article_content)
+            )
+        article_content, code_snippets = await self._arun_pipelined(topic_analysis)
+        self._save_stage(run_id, "content", content_inputs, article_content)
+        self._save_stage(run_id, "code", self._code_inputs(article_content), code_snippets)
+        return article_content, code_snippets
+
+    @staticmethod
+    def _drain(events: Generator[dict, None, tuple]) -> tuple:
+        """Emit an event generator's events to the graph run and return its return value."""
+        while True:
+            try:
+                emit(next(events))
+            except StopIteration as stop:
+                return stop.value
+
+    # ---------------------------
+    # Pipeline graph
+    # ---------------------------
+    def graph(self, pipelined: bool = False) -> PipelineGraph:
+        """
+        Return the pipeline as a dependency graph of nodes, built once per shape.
+
+        Nodes: analysis -> content -> code -> format -> title, then
+        export_pdf and export_docx, which both need only the formatted article
+        and its title and so run side by side. In pipelined mode the content
+        node writes the article and its per-section code together. Inputs are
+        "topic" and "run_id"; a run without code examples passes code="" so
+        the code node is skipped. Node outputs are checkpointed under the
+        node name.
+
+        Args:
+            pipelined (bool): Overlap content and code as with pipeline_code.
+
+        Returns:
+            PipelineGraph: The graph; run it with run() or arun().
+        """
+        if pipelined in self._graphs:
+            return self._graphs[pipelined]
+
+        def llm_node(name: str, run: Callable, arun: Callable, **kwargs) -> Node:
+            return Node(name, run, arun=arun, retries=self.llm_retries, timeout=self.timeouts.get(name), **kwargs)
+
+        def export_node(fmt: str) -> Node:
+            return Node(
+                f"export_{fmt}",
+                lambda content, title: self.exporter.export(fmt, content, title),
+                after=("formatted", "title"),
+                provides=(f"{fmt}_path",),
+                label=f"Step 5: Exporting to {fmt.upper()}",
+                cache_inputs=lambda content, title: {"content": content, "title": title},
+                validate=os.path.exists,
+                timeout=self.timeouts.get(f"export_{fmt}"),
+            )
+
+        nodes = [
+            llm_node(
+                "analysis", self._analyze, self.topic_analyzer.arun,
+                after=("topic",), label="Step 1: Analyzing topic", cache_inputs=self._analysis_inputs,
+            ),
+        ]
+        if pipelined:
+            nodes.append(llm_node(
+                "content", self._pipelined, self._apipelined,
+                after=("analysis", "run_id"), provides=("content", "code"),
+                label="Step 2-3: Generating content with pipelined code snippets",
+            ))
+        else:
+            nodes.append(llm_node(
+                "content", self._generate_content, self._agenerate_content,
+                after=("analysis",), label="Step 2: Generating content", cache_inputs=self._content_inputs,
+            ))
+            nodes.append(llm_node(
+                "code", self._generate_code, self._agenerate_code,
+                after=("content",), label="Step 3: Generating code snippets", cache_inputs=self._code_inputs,
+            ))
+        nodes += [
+            Node(
+                "format", self.formatter.run,
+                after=("content", "code"), provides=("formatted",), label="Step 4: Formatting content",
+                cache_inputs=lambda content, code: {"content": content, "code": code},
+                validate=lambda formatted: isinstance(formatted, str),
+                timeout=self.timeouts.get("format"),
+            ),
+            Node("title", self.formatter.extract_title, after=("formatted",)),
+            export_node("pdf"),
+            export_node("docx"),
+        ]
+        return self._graphs.setdefault(pipelined, PipelineGraph(nodes, inputs=("topic", "run_id")))
+
+    @staticmethod
+    def _inputs(topic: str, include_code: bool, run_id: Optional[str]) -> Dict[str, Any]:
+        """The graph inputs of a run."""
+        values = {"topic": topic, "run_id": run_id}
+        if not include_code:
+            values["code"] = ""
+        return values
+
+    @staticmethod
+    def _result(values: Dict[str, Any]) -> Tuple[str, str, str]:
+        """The final content, PDF path and DOCX path from a finished graph run."""
+        return values["formatted"], values["pdf_path"], values["docx_path"]
+
+    # ---------------------------
+    # Checkpointing
+    # ---------------------------
+    def _run_id(self, topic: str, include_code: bool, run_id: Optional[str]) -> Optional[str]:
+        """Resolve the checkpoint run ID, or None when checkpointing is disabled."""
+        if self.checkpoints is None:
+            return None
+        return run_id or self.checkpoints.run_id_for({
+            "topic": topic,
+            "include_code": include_code,
+            "model": self.topic_analyzer.llm.model,
+            "code_model": self.code_snippet_agent.llm.model,
+            "parallel_sections": self.parallel_sections,
+            "pipeline_code": self.pipeline_code,
+        })
+
+    def _flight_key(self, mode: str, topic: str, include_code: bool, run_id: Optional[str]) -> str:
+        """Key under which identical in-flight requests are coalesced."""
+        return hash_inputs({
+            "mode": mode,
+            "topic": topic,
+            "include_code": include_code,
+            "run_id": run_id,
+            "model": self.topic_analyzer.llm.model,
+            "code_model": self.code_snippet_agent.llm.model,
+            "parallel_sections": self.parallel_sections,
+            "pipeline_code": self.pipeline_code,
+            "max_code_sections": self.max_code_sections,
+            "output_dir": self.exporter.output_dir,
+        })
+
+    def _analysis_inputs(self, topic: str) -> dict:
+        return {"topic": topic, "model": self.topic_analyzer.llm.model}
+
+    def _content_inputs(self, topic_analysis: str) -> dict:
+        return {
+            "analysis": topic_analysis,
+            "model": self.content_generator.llm.model,
+            "parallel_sections": self.parallel_sections,
+        }
+
+    def _code_inputs(self, article_content: str) -> dict:
+        return {
+            "content": article_content,
+            "model": self.code_snippet_agent.llm.model,
+            "pipeline_code": self.pipeline_code,
+            "max_code_sections": self.max_code_sections,
+        }
+
+    def _load_stage(
+        self,
+        run_id: Optional[str],
+        stage: str,
+        inputs: dict,
+        validate: Optional[Callable[[Any], bool]] = None,
+    ) -> Optional[Any]:
+        """Return a stage's checkpointed output if it exists and is still valid."""
+        if run_id is None:
+            return None
+        output = self.checkpoints.load(run_id, stage, hash_inputs(inputs))
+        if output is None or (isinstance(output, str) and not output.strip()):
+            return None
+        if validate is not None and not validate(output):
+            return None
+        print(f"Resuming {stage} from checkpoint {run_id}.")
+        if stage == "code":
+            self._emit_code(output)
+        elif stage in ("analysis", "content"):
+            emit({"type": "token", "stage": stage, "text": output})
+        return output
+
+    def _save_stage(self, run_id: Optional[str], stage: str, inputs: dict, output: Any) -> Any:
+        """Persist a stage's output (when checkpointing is enabled) and return it."""
+        if run_id is not None:
+            self.checkpoints.save(run_id, stage, hash_inputs(inputs), output)
+        return output
+
+    def _checkpointed(
+        self,
+        run_id: Optional[str],
+        stage: str,
+        inputs: dict,
+        compute: Callable[[], Any],
+        validate: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """Load a stage from its checkpoint, or compute and checkpoint it."""
+        output = self._load_stage(run_id, stage, inputs, validate)
+        if output is None:
+            output = self._save_stage(run_id, stage, inputs, compute())
+        return output
+
+    async def _acheckpointed(
+        self,
+        run_id: Optional[str],
+        stage: str,
+        inputs: dict,
+        compute: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """Async variant of _checkpointed() for LLM stages."""
+        output = self._load_stage(run_id, stage, inputs)
+        if output is None:
+            output = self._save_stage(run_id, stage, inputs, await compute())
+        return output
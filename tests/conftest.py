@@ -0,0 +1,23 @@
+# tests/conftest.py
+import pytest
+
+from benchmarks.fake_ollama import FakeOllamaServer
+from orchestrator.graph import ENGINES, select_engine
+
+
+@pytest.fixture
+def fake_ollama():
+    """A fake Ollama server streaming a small article at 200 tokens per second."""
+    with FakeOllamaServer(latency=0.0, tokens_per_second=200.0, article_size="small") as server:
+        yield server
+
+
+@pytest.fixture(params=ENGINES)
+def engine(request, monkeypatch):
+    """Run the test once per pipeline graph engine available here."""
+    monkeypatch.setenv("PIPELINE_GRAPH_ENGINE", request.param)
+    try:
+        select_engine()
+    except RuntimeError as e:
+        pytest.skip(str(e))
+    return request.param
@@ -0,0 +1,175 @@
+# tests/test_graph.py
+import asyncio
+import threading
+import time
+
+import pytest
+
+from orchestrator.graph import Node, NodeTimeout, PipelineGraph
+from utils.cancellation import CancellationToken, RunCancelled, cancellation, check_cancelled
+
+
+def _spin(seconds: float = 10.0) -> str:
+    """Work that checks for cancellation every few milliseconds."""
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        check_cancelled()
+        time.sleep(0.005)
+    return "finished"
+
+
+def test_failing_node_cancels_the_nodes_beside_it(engine):
+    sibling = {}
+
+    def fail(x):
+        time.sleep(0.05)
+        raise ValueError("boom")
+
+    def slow(x):
+        try:
+            return _spin()
+        except RunCancelled:
+            sibling["cancelled"] = True
+            raise
+
+    graph = PipelineGraph([Node("fails", fail, after=("x",)), Node("slow", slow, after=("x",))], inputs=("x",))
+    started = time.monotonic()
+    with pytest.raises(ValueError, match="boom"):
+        graph.run({"x": 1})
+    assert sibling.get("cancelled")
+    assert time.monotonic() - started < 5
+
+
+def test_failing_async_node_cancels_the_nodes_beside_it(engine):
+    async def fail(x):
+        await asyncio.sleep(0.05)
+        raise ValueError("boom")
+
+    graph = PipelineGraph(
+        [Node("fails", None, after=("x",), arun=fail), Node("slow", lambda x: _spin(), after=("x",))],
+        inputs=("x",),
+    )
+    started = time.monotonic()
+    with pytest.raises(ValueError, match="boom"):
+        asyncio.run(graph.arun({"x": 1}))
+    assert time.monotonic() - started < 5
+
+
+def test_node_is_retried_and_listeners_told_it_starts_over(engine):
+    attempts = []
+
+    def flaky(x):
+        attempts.append(x)
+        if len(attempts) < 3:
+            raise ConnectionError("try again")
+        return x + 1
+
+    graph = PipelineGraph(
+        [Node("flaky", flaky, after=("x",), label="Flaky", retries=2, retry_delay=0.01)], inputs=("x",)
+    )
+    events = []
+    values = graph.run({"x": 1}, on_event=events.append)
+    assert values["flaky"] == 2
+    assert len(attempts) == 3
+    assert events == [
+        {"type": "stage", "stage": "flaky"},
+        {"type": "stage", "stage": "flaky", "retry": 1},
+        {"type": "stage", "stage": "flaky", "retry": 2},
+    ]
+
+
+def test_node_fails_once_its_retries_are_used_up(engine):
+    attempts = []
+
+    def broken(x):
+        attempts.append(x)
+        raise ConnectionError("down")
+
+    graph = PipelineGraph([Node("broken", broken, after=("x",), retries=1, retry_delay=0.01)], inputs=("x",))
+    with pytest.raises(ConnectionError):
+        graph.run({"x": 1})
+    assert len(attempts) == 2
+
+
+def test_cancellation_is_not_retried(engine):
+    attempts = []
+    token = CancellationToken()
+
+    def cancelled(x):
+        attempts.append(x)
+        token.cancel("user")
+        check_cancelled()
+
+    graph = PipelineGraph([Node("cancelled", cancelled, after=("x",), retries=3, retry_delay=0.01)], inputs=("x",))
+    with cancellation(token), pytest.raises(RunCancelled):
+        graph.run({"x": 1})
+    assert len(attempts) == 1
+
+
+def test_node_attempts_time_out(engine):
+    attempts = []
+
+    def hangs(x):
+        attempts.append(x)
+        return _spin()
+
+    graph = PipelineGraph(
+        [Node("hangs", hangs, after=("x",), retries=1, retry_delay=0.01, timeout=0.1)], inputs=("x",)
+    )
+    started = time.monotonic()
+    with pytest.raises(NodeTimeout):
+        graph.run({"x": 1})
+    assert len(attempts) == 2
+    assert time.monotonic() - started < 5
+
+
+def test_async_node_attempts_time_out(engine):
+    async def hangs(x):
+        await asyncio.sleep(10)
+
+    graph = PipelineGraph([Node("hangs", None, after=("x",), arun=hangs, timeout=0.1)], inputs=("x",))
+    started = time.monotonic()
+    with pytest.raises(NodeTimeout):
+        asyncio.run(graph.arun({"x": 1}))
+    assert time.monotonic() - started < 5
+
+
+def test_timeout_does_not_cancel_the_rest_of_the_run(engine):
+    attempts = []
+
+    def slow_once(x):
+        attempts.append(x)
+        if len(attempts) == 1:
+            return _spin()
+        return "second attempt"
+
+    graph = PipelineGraph(
+        [
+            Node("slow_once", slow_once, after=("x",), retries=1, retry_delay=0.01, timeout=0.1),
+            Node("after", lambda value: value.upper(), after=("slow_once",)),
+        ],
+        inputs=("x",),
+    )
+    assert graph.run({"x": 1})["after"] == "SECOND ATTEMPT"
+
+
+@pytest.mark.parametrize("run", ["sync", "async"])
+def test_cancel_during_retry_delay_stops_at_once(engine, run):
+    async def fail_async(x):
+        raise ConnectionError("down")
+
+    def fail(x):
+        raise ConnectionError("down")
+
+    graph = PipelineGraph(
+        [Node("fails", fail, after=("x",), arun=fail_async, retries=3, retry_delay=5.0)], inputs=("x",)
+    )
+    token = CancellationToken()
+    threading.Timer(0.2, token.cancel, args=("user",)).start()
+    started = time.monotonic()
+    with cancellation(token), pytest.raises(RunCancelled):
+        if run == "sync":
+            graph.run({"x": 1})
+        else:
+            asyncio.run(graph.arun({"x": 1}))
+    assert time.monotonic() - started < 3
@@ -0,0 +1,97 @@
+# tests/test_llm_scheduler.py
+import threading
+import time
+
+import pytest
+
+from utils.cancellation import CancellationToken, RunCancelled, cancellation
+from utils.llm_scheduler import BATCH, INTERACTIVE, LLMScheduler
+
+
+def _wait_for_queue(scheduler: LLMScheduler, depth: int) -> None:
+    deadline = time.monotonic() + 10
+    while sum(scheduler.stats()["queued"].values()) < depth:
+        assert time.monotonic() < deadline, "requests never queued"
+        time.sleep(0.005)
+
+
+def _queue_behind(scheduler: LLMScheduler, holder: str, requests: list) -> list:
+    """
+    Queue (name, model, priority) requests one by one behind a held slot,
+    then free the slot and return the names in the order they were granted.
+    """
+    granted = []
+    threads = []
+
+    def take(name: str, model: str, priority: str) -> None:
+        with scheduler.slot(model, priority):
+            granted.append(name)
+
+    with scheduler.slot(holder, INTERACTIVE):
+        for depth, request in enumerate(requests, start=1):
+            thread = threading.Thread(target=take, args=request)
+            thread.start()
+            threads.append(thread)
+            _wait_for_queue(scheduler, depth)
+    for thread in threads:
+        thread.join(10)
+    return granted
+
+
+def test_interactive_requests_are_granted_before_earlier_batch_requests():
+    scheduler = LLMScheduler(max_concurrency=1)
+    granted = _queue_behind(scheduler, "mistral:latest", [
+        ("batch 1", "mistral:latest", BATCH),
+        ("batch 2", "mistral:latest", BATCH),
+        ("interactive", "mistral:latest", INTERACTIVE),
+    ])
+    assert granted == ["interactive", "batch 1", "batch 2"]
+
+
+def test_requests_for_the_running_model_are_granted_first():
+    scheduler = LLMScheduler(max_concurrency=1)
+    granted = _queue_behind(scheduler, "mistral:latest", [
+        ("code", "codellama:7b", BATCH),
+        ("content", "mistral:latest", BATCH),
+    ])
+    assert granted == ["content", "code"]
+
+
+def test_max_batch_lets_a_waiting_model_take_a_turn():
+    scheduler = LLMScheduler(max_concurrency=1, max_batch=2)
+    granted = _queue_behind(scheduler, "mistral:latest", [
+        ("code", "codellama:7b", BATCH),
+        ("content 1", "mistral:latest", BATCH),
+        ("content 2", "mistral:latest", BATCH),
+    ])
+    assert granted == ["content 1", "code", "content 2"]
+
+
+def test_cancelled_request_leaves_the_queue():
+    scheduler = LLMScheduler(max_concurrency=1)
+    token = CancellationToken()
+    errors = []
+
+    def wait() -> None:
+        with cancellation(token):
+            try:
+                with scheduler.slot("mistral:latest"):
+                    pass
+            except RunCancelled as e:
+                errors.append(e)
+
+    with scheduler.slot("mistral:latest"):
+        waiter = threading.Thread(target=wait)
+        waiter.start()
+        _wait_for_queue(scheduler, 1)
+        token.cancel("user")
+        waiter.join(10)
+        assert errors and not waiter.is_alive()
+        assert scheduler.stats()["queued"] == {INTERACTIVE: 0, BATCH: 0}
+    assert scheduler.stats()["running"] == {}
+
+
+def test_unknown_priority_is_rejected():
+    with pytest.raises(ValueError):
+        with LLMScheduler().slot("mistral:latest", "urgent"):
+            pass
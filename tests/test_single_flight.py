@@ -0,0 +1,83 @@
+# tests/test_single_flight.py
+import threading
+
+import pytest
+
+from utils.cancellation import CancellationToken, RunCancelled, cancellation
+from utils.llm_loader import load_llm
+from utils.ollama_client import OllamaClient
+from utils.single_flight import SingleFlight
+
+PROMPT = "You are a technical writer creating a detailed article based on topic analysis."
+
+
+def test_coalesced_stream_keeps_going_when_one_joiner_cancels(fake_ollama):
+    llm = load_llm("mistral", cache=None, client=OllamaClient(base_url=fake_ollama.url))
+    leader_started = threading.Event()
+    leader_tokens, joiner_tokens = [], []
+    leader_error = []
+
+    def lead() -> None:
+        try:
+            for token in llm.stream(PROMPT):
+                leader_tokens.append(token)
+                leader_started.set()
+        except BaseException as e:
+            leader_error.append(e)
+            leader_started.set()
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    assert leader_started.wait(10)
+
+    token = CancellationToken()
+    with cancellation(token), pytest.raises(RunCancelled):
+        for chunk in llm.stream(PROMPT):
+            joiner_tokens.append(chunk)
+            if len(joiner_tokens) == 3:
+                token.cancel("joiner gave up")
+    leader.join(30)
+
+    assert not leader_error
+    # The joiner replayed the leader's stream from the start; one generation served both
+    assert "".join(leader_tokens).startswith("".join(joiner_tokens))
+    assert len(leader_tokens) > len(joiner_tokens)
+    assert fake_ollama.requests == 1
+    assert fake_ollama.aborted_streams == 0
+
+
+def test_shared_stream_is_closed_once_every_reader_cancels():
+    flights = SingleFlight("test")
+    closed = threading.Event()
+    release = threading.Event()
+
+    def source():
+        try:
+            yield "first"
+            release.wait(10)
+            yield "second"
+        finally:
+            closed.set()
+
+    tokens = [CancellationToken(), CancellationToken()]
+    reading = threading.Barrier(len(tokens))
+    outcomes = []
+
+    def read(token: CancellationToken) -> None:
+        with cancellation(token):
+            try:
+                for _ in flights.stream("key", source):
+                    reading.wait(10)
+                    token.cancel("reader gave up")
+            except RunCancelled:
+                outcomes.append("cancelled")
+
+    readers = [threading.Thread(target=read, args=(token,)) for token in tokens]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join(10)
+    release.set()
+
+    assert outcomes == ["cancelled", "cancelled"]
+    assert closed.wait(10)
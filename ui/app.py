@@ -4,8 +4,13 @@ import os
 # Add the parent directory to Python path to enable module imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import time
+
 import streamlit as st
-from orchestrator.workflow import OrchestratorAgent
+from agents.exporter import renderer_config
+from orchestrator.jobs import CANCELLED, FAILED, QUEUED, RUNNING, SUCCEEDED, get_job_manager
+from utils.metrics import start_metrics_server
+from utils.model_residency import get_residency
 
 # ---------------------------
 # Page Config
@@ -17,6 +22,22 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+@st.cache_resource
+def metrics_server(port: int):
+    """Start the Prometheus endpoint once per Streamlit process."""
+    return start_metrics_server(port)
+
+if os.environ.get("METRICS_PORT"):
+    metrics_server(int(os.environ["METRICS_PORT"]))
+
+@st.cache_resource
+def warm_up_models():
+    """Preload the models in LLM_WARMUP_MODELS once per Streamlit process."""
+    get_residency().warm_up(background=True)
+    return True
+
+warm_up_models()
+
 # ---------------------------
 # Sidebar
 # ---------------------------
@@ -33,6 +54,18 @@ include_code = st.sidebar.toggle(
     "Include Code Examples", value=True
 )
 
+# Section-parallel generation (needs OLLAMA_NUM_PARALLEL > 1 on the server)
+parallel_sections = st.sidebar.toggle(
+    "Generate Sections in Parallel", value=False,
+    help="Writes the introduction, each section and the conclusion as concurrent requests."
+)
+
+# Pipelined code generation
+pipeline_code = st.sidebar.toggle(
+    "Pipeline Code Generation", value=False,
+    help="Starts a code example for each section as soon as it is written, and places it in that section."
+)
+
 # Model selection
 st.sidebar.subheader("🧠 Model Selection")
 
@@ -51,6 +84,16 @@ code_model = st.sidebar.selectbox(
 # Generate button in sidebar
 generate_btn = st.sidebar.button("🚀 Generate Article", use_container_width=True)
 
+# Generation runs as a background job; the job ID in the URL survives page reloads
+jobs = get_job_manager()
+
+# Only this session's jobs: the job store is shared with other users and the API
+st.session_state.setdefault("my_jobs", [])
+with st.sidebar.expander("🗂️ Recent Jobs", expanded=False):
+    for recent in filter(None, (jobs.status(recent_id) for recent_id in reversed(st.session_state.my_jobs[-5:]))):
+        if st.button(f"{recent['topic']} ({recent['status']})", key=f"job-{recent['id']}", use_container_width=True):
+            st.query_params["job"] = recent["id"]
+
 # ---------------------------
 # Custom Styling
 # ---------------------------
@@ -96,6 +139,7 @@ if "generated" not in st.session_state:
     st.session_state.content = ""
     st.session_state.pdf_path = ""
     st.session_state.docx_path = ""
+    st.session_state.metrics = {}
 
 # ---------------------------
 # Main Title
@@ -106,40 +150,94 @@ st.write("Automatically generate structured technical articles with optional cod
 # ---------------------------
 # Content Area
 # ---------------------------
+status_area = st.container()
+
+# Create tabs for preview and downloads
+tab1, tab2 = st.tabs(["📄 Article Preview", "📥 Export & Downloads"])
+
+with tab1:
+    preview = st.empty()
+
+STAGE_LABELS = {
+    "analysis": "🔍 Analyzing topic...",
+    "content": "✍️ Writing article...",
+    "code": "💻 Generating code examples...",
+    "format": "📦 Formatting article...",
+    "export_pdf": "📦 Exporting...",
+    "export_docx": "📦 Exporting...",
+}
+
+# A job started from this page is cancelled when the user starts another one,
+# changes a setting, or stops polling (closes the tab) for UI_ABANDON_SECONDS
+settings = {
+    "topic": topic,
+    "include_code": include_code,
+    "model": content_model,
+    "code_model": code_model,
+    "parallel_sections": parallel_sections,
+    "pipeline_code": pipeline_code,
+}
+owned_job = st.session_state.get("job_id")
+
 if generate_btn:
     if not topic:
-        st.warning("⚠️ Please enter a topic first.")
+        status_area.warning("⚠️ Please enter a topic first.")
     else:
-        try:
-            with st.spinner("🔄 Initializing multi-agent system..."):
-                orchestrator = OrchestratorAgent(
-                    model_name=content_model,
-                    code_model_name=code_model
-                )
-
-            with st.spinner("✍️ Generating article... (this may take ~1-2 minutes)"):
-                content, pdf_path, docx_path = orchestrator.run(topic, include_code)
+        if owned_job:
+            jobs.cancel(owned_job, "superseded by a new request")
+        st.query_params["job"] = st.session_state.job_id = jobs.submit(
+            **settings,
+            abandon_after=float(os.environ.get("UI_ABANDON_SECONDS", 30)),
+        )
+        st.session_state.job_settings = settings
+        st.session_state.my_jobs.append(st.session_state.job_id)
+elif owned_job and st.session_state.get("job_settings") != settings:
+    if jobs.cancel(owned_job, "settings changed"):
+        status_area.info("Settings changed, so the article in progress was cancelled.")
+    st.session_state.job_id = None
 
-            st.session_state.generated = True
-            st.session_state.content = content
-            st.session_state.pdf_path = pdf_path
-            st.session_state.docx_path = docx_path
+job_id = st.query_params.get("job")
+if job_id:
+    # Each poll tells the job manager the page is still open
+    jobs.touch(job_id)
+job = jobs.status(job_id) if job_id else None
+st.session_state.generated = False
 
-            st.success("✅ Article generated successfully!")
+if job_id and job is None:
+    status_area.warning("⚠️ This job no longer exists.")
+elif job and job["status"] in (QUEUED, RUNNING):
+    with status_area:
+        if job["status"] == QUEUED:
+            st.info(f"⏳ Waiting for a free worker... ({jobs.queue_depth()} jobs in progress)")
+        else:
+            st.info(STAGE_LABELS.get(job["stage"], "🔄 Initializing multi-agent system..."))
+        if st.button("✖️ Cancel"):
+            jobs.cancel(job_id)
+            st.rerun()
 
-        except Exception as e:
-            st.error(f"❌ Error: {str(e)}")
-            st.info("Make sure Ollama is running and the selected models are available.")
-
-# Create tabs for preview and downloads
-tab1, tab2 = st.tabs(["📄 Article Preview", "📥 Export & Downloads"])
+    # Render the tokens generated so far in the preview tab
+    streamed = jobs.progress(job_id)
+    preview.markdown(streamed.get("content", "") + "\n\n" + streamed.get("code", ""))
+elif job and job["status"] == SUCCEEDED:
+    result = job["result"]
+    st.session_state.generated = True
+    st.session_state.content = result["content"]
+    st.session_state.pdf_path = result["pdf_path"]
+    st.session_state.docx_path = result["docx_path"]
+    st.session_state.metrics = result.get("metrics", {})
+    status_area.success(f"✅ Article generated successfully: {job['topic']}")
+elif job and job["status"] == FAILED:
+    status_area.error(f"❌ Error: {job['error']}")
+    status_area.info("Make sure Ollama is running and the selected models are available.")
+elif job and job["status"] == CANCELLED:
+    status_area.warning("✖️ Generation was cancelled.")
 
 with tab1:
     if st.session_state.generated:
-        with st.container():
+        with preview.container():
             st.markdown(f"<div class='stCard'>{st.session_state.content}</div>", unsafe_allow_html=True)
-    else:
-        st.info("Click 'Generate Article' in the sidebar to create an article.")
+    elif not (job and job["status"] in (QUEUED, RUNNING)):
+        preview.info("Click 'Generate Article' in the sidebar to create an article.")
 
 with tab2:
     if st.session_state.generated:
@@ -164,6 +262,10 @@ with tab2:
                 )
 
         st.info(f"Files saved at:\n- {st.session_state.pdf_path}\n- {st.session_state.docx_path}")
+
+        if st.session_state.metrics:
+            with st.expander("⏱️ Run Metrics", expanded=False):
+                st.json(st.session_state.metrics)
     else:
         st.info("Generate an article to enable downloads.")
 
@@ -191,6 +293,19 @@ with st.expander("ℹ️ System Information", expanded=False):
     - 📦 Exporter
     """)
 
+    try:
+        renderers = renderer_config()
+        st.markdown(f"**Export renderers:** PDF via `{renderers['pdf']}`, DOCX via `{renderers['docx']}`")
+        for name, reason in renderers["unavailable"].items():
+            st.caption(f"{name} unavailable: {reason}")
+    except (ValueError, RuntimeError) as e:
+        st.warning(f"Export renderer configuration error: {e}")
+
 # Footer
 st.markdown("---")
 st.caption("Multi-Agent Technical Article Generator | Built with Streamlit, LangGraph, and Ollama 🚀")
+
+# Poll a job in progress; the page stays responsive between polls
+if job and job["status"] in (QUEUED, RUNNING):
+    time.sleep(1)
+    st.rerun()
@@ -0,0 +1,244 @@
+# utils/artifact_store.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+
+def content_hash(content: str, title: str) -> str:
+    """
+    Hash the inputs of an export.
+
+    Args:
+        content (str): The formatted article content in Markdown format.
+        title (str): The title of the article, which is rendered too.
+
+    Returns:
+        str: A SHA-256 hex digest.
+    """
+    return hashlib.sha256(f"{title}\0{content}".encode("utf-8")).hexdigest()
+
+
+class ArtifactStore:
+    """
+    Content-addressed store for exported files, with a size-capped LRU garbage collector.
+
+    Files live in <root>/objects/<hash[:2]>/<hash>/, keeping their
+    human-readable names, so articles that share a title no longer overwrite
+    each other. An SQLite index at <root>/artifacts.sqlite3 maps
+    (content hash, format, renderer version) to a file path.
+    """
+
+    def __init__(self, root: str = "output", max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(root, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(root, "artifacts.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS artifacts (
+                content_hash TEXT NOT NULL,
+                format TEXT NOT NULL,
+                renderer_version TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (content_hash, format, renderer_version)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_last_access ON artifacts(last_access)")
+        self._conn.commit()
+
+    def directory_for(self, digest: str) -> str:
+        """
+        Return the directory that holds the files of one content hash.
+
+        It is not created here: the exporter creates it as it writes each
+        file, so gc() removing it while empty cannot break a render.
+
+        Args:
+            digest (str): The content hash from content_hash().
+
+        Returns:
+            str: The sharded object directory.
+        """
+        return os.path.join(self.root, "objects", digest[:2], digest)
+
+    def lookup(self, digest: str, fmt: str, *renderer_versions: str) -> Optional[str]:
+        """
+        Find a stored artifact and refresh its LRU position.
+
+        Args:
+            digest (str): The content hash.
+            fmt (str): The format, e.g. "pdf" or "docx".
+            renderer_versions (str): Renderer names and versions that may have
+                produced it, best first; the first one stored is returned.
+                Without any, the newest artifact by any renderer is returned.
+
+        Returns:
+            Optional[str]: The file path, or None if missing or deleted from disk.
+        """
+        with self._lock:
+            if renderer_versions:
+                rows = []
+                for renderer_version in renderer_versions:
+                    rows += self._conn.execute(
+                        "SELECT renderer_version, path FROM artifacts "
+                        "WHERE content_hash = ? AND format = ? AND renderer_version = ?",
+                        (digest, fmt, renderer_version),
+                    ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT renderer_version, path FROM artifacts WHERE content_hash = ? AND format = ? "
+                    "ORDER BY created_at DESC",
+                    (digest, fmt),
+                ).fetchall()
+            for renderer_version, path in rows:
+                if not os.path.exists(path):
+                    self._conn.execute(
+                        "DELETE FROM artifacts WHERE content_hash = ? AND format = ? AND renderer_version = ?",
+                        (digest, fmt, renderer_version),
+                    )
+                    self._conn.commit()
+                    continue
+                self._conn.execute(
+                    "UPDATE artifacts SET last_access = ? WHERE content_hash = ? AND format = ? AND renderer_version = ?",
+                    (time.time(), digest, fmt, renderer_version),
+                )
+                self._conn.commit()
+                self.hits += 1
+                return path
+            self.misses += 1
+            return None
+
+    def register(self, digest: str, fmt: str, renderer_version: str, path: str) -> None:
+        """
+        Record a freshly rendered artifact, then collect garbage if over the size cap.
+
+        Args:
+            digest (str): The content hash.
+            fmt (str): The format, e.g. "pdf" or "docx".
+            renderer_version (str): Renderer name and version that produced it.
+            path (str): Where the file was written.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO artifacts "
+                "(content_hash, format, renderer_version, path, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (digest, fmt, renderer_version, path, os.path.getsize(path), now, now),
+            )
+            self._conn.commit()
+        # The caller is about to hand out this content's files, so they are never victims
+        self.gc(keep=digest)
+
+    def gc(self, max_bytes: Optional[int] = None, keep: Optional[str] = None) -> int:
+        """
+        Delete least recently used artifacts until the store fits its size cap.
+
+        Args:
+            max_bytes (int): Size cap to enforce. Defaults to the store's cap.
+            keep (str): Content hash whose artifacts must not be deleted,
+                even if they alone are over the cap.
+
+        Returns:
+            int: The number of artifacts deleted.
+        """
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        with self._lock:
+            (total,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()
+            if total <= limit:
+                return 0
+
+            victims = []
+            for digest, fmt, version, path, size in self._conn.execute(
+                "SELECT content_hash, format, renderer_version, path, size FROM artifacts ORDER BY last_access ASC"
+            ):
+                if total <= limit:
+                    break
+                if digest == keep:
+                    continue
+                victims.append((digest, fmt, version, path))
+                total -= size
+
+            for digest, fmt, version, path in victims:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                # Drop the object directory, then its shard, once they are empty;
+                # rmdir fails on a directory another export has just written to
+                directory = os.path.dirname(path)
+                for _ in range(2):
+                    try:
+                        os.rmdir(directory)
+                    except OSError:
+                        break
+                    directory = os.path.dirname(directory)
+            self._conn.executemany(
+                "DELETE FROM artifacts WHERE content_hash = ? AND format = ? AND renderer_version = ?",
+                [victim[:3] for victim in victims],
+            )
+            self._conn.commit()
+            self.evictions += len(victims)
+            return len(victims)
+
+    def stats(self) -> dict:
+        """
+        Report store usage.
+
+        Returns:
+            dict: Hit/miss/eviction counters plus current artifact count and size.
+        """
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "artifacts": count,
+            "bytes": total,
+        }
+
+
+_stores: Dict[str, ArtifactStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_artifact_store(root: str = "output") -> Optional[ArtifactStore]:
+    """
+    Return the process-wide artifact store for an output directory.
+
+    The store is disabled when ARTIFACT_STORE_DISABLED is set to a truthy
+    value; its size cap can be changed with ARTIFACT_STORE_MAX_BYTES.
+
+    Args:
+        root (str): The output directory.
+
+    Returns:
+        Optional[ArtifactStore]: The shared store, or None if disabled.
+    """
+    if os.environ.get("ARTIFACT_STORE_DISABLED", "").lower() in ("1", "true", "yes"):
+        return None
+
+    key = os.path.abspath(root)
+    with _stores_lock:
+        if key not in _stores:
+            max_bytes = int(os.environ.get("ARTIFACT_STORE_MAX_BYTES", DEFAULT_MAX_BYTES))
+            _stores[key] = ArtifactStore(root, max_bytes=max_bytes)
+        return _stores[key]
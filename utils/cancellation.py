@@ -0,0 +1,299 @@
+# utils/cancellation.py
+import asyncio
+import contextvars
+import threading
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Iterator, List, Optional, TypeVar
+
+from utils.metrics import REGISTRY
+
+REGISTRY.describe("article_cancellations_total", "Operations abandoned because their cancellation token fired, by where it was noticed.")
+
+T = TypeVar("T")
+
+
+class RunCancelled(Exception):
+    """Raised where a cancelled operation notices that it should stop."""
+
+
+class CancellationToken:
+    """
+    A flag that tells a run and everything it started to stop.
+
+    Long-running code checks it at stage boundaries and between streamed
+    chunks; code that blocks (waiting for a slot, a future or a stream)
+    registers a callback with on_cancel() to be woken up.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self.reason: Optional[str] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """Cancel the token and run its callbacks; later calls do nothing."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Cancellation callback failed: {e}")
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        Call callback when the token is cancelled (at once if it already is).
+
+        Args:
+            callback (Callable[[], None]): Called from the cancelling thread.
+
+        Returns:
+            Callable[[], None]: Unregisters the callback.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._discard(callback)
+        callback()
+        return lambda: None
+
+    def _discard(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the token is cancelled or timeout passes; True if cancelled."""
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self, where: str = "stage") -> None:
+        """
+        Raise RunCancelled if the token has been cancelled.
+
+        Args:
+            where (str): Label for the cancellations metric.
+        """
+        if self.cancelled:
+            REGISTRY.inc("article_cancellations_total", labels={"where": where})
+            raise RunCancelled(self.reason)
+
+
+class CancellationGroup:
+    """
+    Cancels one shared token once every caller sharing the work has gone.
+
+    Used for coalesced work: a caller that cancels stops waiting for the
+    shared result, but the work itself carries on while any caller still
+    wants it. A caller without a token can never cancel, so it keeps the
+    shared work alive.
+    """
+
+    def __init__(self):
+        self.token = CancellationToken()
+        self._callers = 0
+        self._lock = threading.Lock()
+
+    def join(self, token: Optional[CancellationToken]) -> Callable[[], None]:
+        """
+        Add a caller.
+
+        Args:
+            token (CancellationToken): The caller's own token, if any.
+
+        Returns:
+            Callable[[], None]: Call when the caller stops waiting; the caller
+            leaves by itself when its token is cancelled.
+        """
+        with self._lock:
+            self._callers += 1
+        left = threading.Event()
+        unregister = lambda: None
+
+        def leave() -> None:
+            with self._lock:
+                if left.is_set():
+                    return
+                left.set()
+                self._callers -= 1
+                abandoned = self._callers == 0
+            unregister()
+            if abandoned:
+                self.token.cancel("every caller cancelled")
+
+        if token is not None:
+            unregister = token.on_cancel(leave)
+        return leave
+
+
+_current: contextvars.ContextVar[Optional[CancellationToken]] = contextvars.ContextVar("cancellation", default=None)
+
+
+@contextmanager
+def cancellation(token: Optional[CancellationToken]) -> Iterator[Optional[CancellationToken]]:
+    """
+    Make token the current cancellation token for code run in this context
+    (and threads/tasks started from it with a copy of the context).
+
+    Args:
+        token (CancellationToken): The token; None keeps the current one.
+    """
+    if token is None:
+        yield current_token()
+        return
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        try:
+            _current.reset(reset)
+        except ValueError:
+            # Exited from another context, e.g. a generator finished by another thread
+            pass
+
+
+def current_token() -> Optional[CancellationToken]:
+    """The cancellation token of the current context, if any."""
+    return _current.get()
+
+
+@contextmanager
+def child_token() -> Iterator[CancellationToken]:
+    """
+    Make a new token current for the block, cancelled along with the current one.
+
+    Lets code cancel the work it started (on a timeout, or when a sibling
+    fails) without cancelling its caller.
+
+    Yields:
+        CancellationToken: The child token.
+    """
+    parent = current_token()
+    token = CancellationToken()
+    unregister = parent.on_cancel(lambda: token.cancel(parent.reason)) if parent is not None else (lambda: None)
+    try:
+        with cancellation(token):
+            yield token
+    finally:
+        unregister()
+
+
+def context_with(token: Optional[CancellationToken]) -> contextvars.Context:
+    """
+    Copy the current context with token as its cancellation token.
+
+    Args:
+        token (CancellationToken): The token for code run in the copy.
+
+    Returns:
+        contextvars.Context: Run code in it with Context.run().
+    """
+    context = contextvars.copy_context()
+    context.run(_current.set, token)
+    return context
+
+
+def iterate_with(token: Optional[CancellationToken], iterator: Iterator[T]) -> Iterator[T]:
+    """
+    Iterate over a generator, running each step with token as the current
+    cancellation token without setting it for the consumer in between.
+
+    Args:
+        token (CancellationToken): The token; None iterates in the current context.
+        iterator (Iterator): The generator to drive.
+
+    Yields:
+        The generator's items.
+    """
+    if token is None:
+        yield from iterator
+        return
+    context = context_with(token)
+    try:
+        while True:
+            try:
+                item = context.run(next, iterator)
+            except StopIteration:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            context.run(close)
+
+
+def check_cancelled(where: str = "stage") -> None:
+    """
+    Raise RunCancelled if the current context's token has been cancelled.
+
+    Args:
+        where (str): Label for the cancellations metric.
+    """
+    token = current_token()
+    if token is not None:
+        token.raise_if_cancelled(where)
+
+
+def wait_event(event: threading.Event, token: Optional[CancellationToken], where: str) -> None:
+    """
+    Wait for event, waking up early if token is cancelled.
+
+    Args:
+        event (threading.Event): Set when the awaited work is done.
+        token (CancellationToken): Token to watch; None just waits.
+        where (str): Label for the cancellations metric.
+
+    Raises:
+        RunCancelled: If the token was cancelled.
+    """
+    if token is None:
+        event.wait()
+        return
+    unregister = token.on_cancel(event.set)
+    try:
+        event.wait()
+    finally:
+        unregister()
+    token.raise_if_cancelled(where)
+
+
+async def await_or_cancel(awaitable: Awaitable[T], token: Optional[CancellationToken], where: str) -> T:
+    """
+    Await awaitable, giving up as soon as token is cancelled.
+
+    Args:
+        awaitable: What to wait for; it is cancelled if the token fires first.
+        token (CancellationToken): Token to watch; None just awaits.
+        where (str): Label for the cancellations metric.
+
+    Raises:
+        RunCancelled: If the token was cancelled first.
+    """
+    if token is None:
+        return await awaitable
+    loop = asyncio.get_running_loop()
+    cancelled = loop.create_future()
+    unregister = token.on_cancel(
+        lambda: loop.call_soon_threadsafe(lambda: cancelled.done() or cancelled.set_result(None))
+    )
+    task = asyncio.ensure_future(awaitable)
+    try:
+        await asyncio.wait([task, cancelled], return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        unregister()
+        cancelled.cancel()
+    if not task.done():
+        task.cancel()
+        token.raise_if_cancelled(where)
+    return task.result()
@@ -0,0 +1,235 @@
+# utils/context_budget.py
+import math
+import os
+import re
+import threading
+from typing import Dict, Optional, Tuple
+
+from utils.markdown_utils import split_sections
+from utils.metrics import REGISTRY
+
+REGISTRY.describe("article_prompt_tokens", "Estimated prompt tokens per LLM request.")
+REGISTRY.describe("article_prompt_overflow_total", "Requests whose prompt plus output reserve exceeded the largest context window.")
+REGISTRY.describe("article_prompt_truncated_total", "Prompt inputs shortened to fit a token budget, by agent and part.")
+REGISTRY.describe("article_prompt_truncated_tokens_total", "Estimated tokens removed from prompt inputs, by agent and part.")
+
+# Llama-family tokenizers average about four characters per English token;
+# a lower figure overestimates slightly, which is the safe direction here
+CHARS_PER_TOKEN = 3.5
+
+_CODE_BLOCK = re.compile(r"^```.*?^```[ \t]*$", re.MULTILINE | re.DOTALL)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate how many tokens a model will see for text, without a tokenizer.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The estimated token count.
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def clip_text(text: str, max_tokens: int) -> Tuple[str, int]:
+    """
+    Shorten text to about max_tokens, ending at a paragraph or sentence when one is close.
+
+    Args:
+        text (str): The text to shorten.
+        max_tokens (int): The token budget.
+
+    Returns:
+        Tuple[str, int]: The text, marked with "[...]" if shortened, and the
+        estimated number of tokens removed.
+    """
+    total = estimate_tokens(text)
+    if total <= max_tokens:
+        return text, 0
+    limit = max(int(max_tokens * CHARS_PER_TOKEN), 0)
+    clipped = text[:limit]
+    boundary = max(clipped.rfind("\n\n"), clipped.rfind(". "), clipped.rfind(".\n"))
+    if boundary > limit // 2:
+        clipped = clipped[:boundary + 1]
+    clipped = clipped.rstrip() + " [...]"
+    return clipped, max(total - estimate_tokens(clipped), 0)
+
+
+def section_digest(markdown_text: str, max_tokens: int) -> Tuple[str, int]:
+    """
+    Condense an article to its structure and the opening of each section.
+
+    Code blocks are left out and every "## " section keeps its title; when
+    the article is still over budget, each section body is cut to a share of
+    the budget. Sections shorter than their share pass the rest on to the
+    longer ones, so short articles come through whole.
+
+    Args:
+        markdown_text (str): The article in Markdown format.
+        max_tokens (int): The token budget for the digest.
+
+    Returns:
+        Tuple[str, int]: The digest and the estimated number of tokens removed
+        from the article.
+    """
+    total = estimate_tokens(markdown_text)
+    text = _CODE_BLOCK.sub("(code example omitted)", markdown_text)
+    sections = split_sections(text, 2)
+    headers = [f"## {heading}\n\n" if heading else "" for heading, _ in sections]
+
+    # Share the budget left after the headers and "[...]" markers, smallest sections first
+    remaining = max_tokens - sum(estimate_tokens(header + "\n\n [...]") for header in headers)
+    shares = {}
+    order = sorted(range(len(sections)), key=lambda index: estimate_tokens(sections[index][1]))
+    for position, index in enumerate(order):
+        share = max(remaining // (len(order) - position), 0)
+        shares[index] = min(estimate_tokens(sections[index][1]), share)
+        remaining -= shares[index]
+
+    parts = []
+    for index, (header, (_, body)) in enumerate(zip(headers, sections)):
+        body, _ = clip_text(body, shares[index]) if shares[index] else ("[...]", 0)
+        parts.append(header + body)
+    digest = "\n\n".join(parts)
+    return digest, max(total - estimate_tokens(digest), 0)
+
+
+def record_truncation(agent: str, part: str, dropped_tokens: int) -> None:
+    """
+    Count a prompt input that was shortened to fit its budget.
+
+    Args:
+        agent (str): The agent that built the prompt.
+        part (str): Which input was shortened, e.g. "article".
+        dropped_tokens (int): Estimated tokens removed; nothing is recorded for 0.
+    """
+    if dropped_tokens <= 0:
+        return
+    labels = {"agent": agent, "part": part}
+    REGISTRY.inc("article_prompt_truncated_total", labels=labels)
+    REGISTRY.inc("article_prompt_truncated_tokens_total", dropped_tokens, labels=labels)
+
+
+def tagged_model_name(model: str) -> str:
+    """Add the ":latest" tag to untagged model names, as load_llm does."""
+    return model if ":" in model else f"{model}:latest"
+
+
+class ContextBudget:
+    """
+    Chooses Ollama's context window (num_ctx) for each model.
+
+    A request needs room for its prompt and for the tokens it generates.
+    Ollama reloads a model whenever num_ctx changes, which also drops the KV
+    cache that continued generations reuse, so every request for a model
+    gets the same window: the model's own setting, or max_ctx. Prompts that
+    do not fit it are reported, never given a bigger window.
+    """
+
+    def __init__(
+        self,
+        max_ctx: int = 8192,
+        output_tokens: int = 2048,
+        digest_tokens: int = 1536,
+        model_ctx: Optional[Dict[str, int]] = None,
+    ):
+        """
+        Args:
+            max_ctx (int): The window for models without their own setting; 0
+                leaves num_ctx to the server.
+            output_tokens (int): Room reserved for the response when the
+                request does not set num_predict.
+            digest_tokens (int): Budget for long inputs that agents condense
+                before prompting, such as the article handed to the code agent.
+            model_ctx (Dict[str, int]): The window per model, sized for the
+                largest request any stage sends to it.
+        """
+        self.max_ctx = max_ctx
+        self.output_tokens = output_tokens
+        self.digest_tokens = digest_tokens
+        self.model_ctx = {tagged_model_name(model): size for model, size in (model_ctx or {}).items()}
+
+    def num_ctx_for(self, model: str) -> int:
+        """
+        Return the context window for every request to a model.
+
+        Args:
+            model (str): The model name.
+
+        Returns:
+            int: The window size; 0 leaves num_ctx to the server.
+        """
+        return self.model_ctx.get(tagged_model_name(model), self.max_ctx)
+
+    def options_for(self, prompt: str, options: dict, agent: str, model: str, context_tokens: int = 0) -> dict:
+        """
+        Return request options with the model's num_ctx, recording prompt metrics.
+
+        An explicit num_ctx in options is kept as is.
+
+        Args:
+            prompt (str): The prompt to send.
+            options (dict): The model's configured options.
+            agent (str): The calling agent, for metrics.
+            model (str): The model name, for metrics.
+            context_tokens (int): Tokens of an earlier generation's context
+                sent along with the prompt.
+
+        Returns:
+            dict: The options to send; the input dict is not modified.
+        """
+        labels = {"agent": agent, "model": model}
+        prompt_tokens = estimate_tokens(prompt) + context_tokens
+        REGISTRY.observe("article_prompt_tokens", prompt_tokens, labels=labels)
+        num_ctx = options.get("num_ctx") or self.num_ctx_for(model)
+        if not num_ctx:
+            return options
+
+        output_tokens = options.get("num_predict")
+        reserve = output_tokens if output_tokens and output_tokens > 0 else self.output_tokens
+        if prompt_tokens + reserve > num_ctx:
+            # Ollama would drop the start of the prompt without saying so
+            REGISTRY.inc("article_prompt_overflow_total", labels=labels)
+            print(f"Prompt for {agent} (~{prompt_tokens} tokens) does not fit num_ctx={num_ctx} on {model}")
+        if "num_ctx" in options:
+            return options
+        return dict(options, num_ctx=num_ctx)
+
+
+_budget: Optional[ContextBudget] = None
+_budget_lock = threading.Lock()
+
+
+def get_context_budget() -> ContextBudget:
+    """
+    Return the process-wide context budget.
+
+    Configured from the environment on first use:
+    LLM_NUM_CTX_MAX (window for models without their own, default 8192; 0
+    leaves num_ctx to the server), LLM_NUM_CTX ("mistral=8192,codellama:7b=4096"
+    per model, with an optional bare size as the default for other models),
+    LLM_OUTPUT_TOKENS (output reserve, default 2048) and
+    LLM_DIGEST_TOKENS (default 1536).
+
+    Returns:
+        ContextBudget: The shared budget.
+    """
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            model_ctx, default = {}, int(os.environ.get("LLM_NUM_CTX_MAX", 8192))
+            for entry in filter(None, (part.strip() for part in os.environ.get("LLM_NUM_CTX", "").split(","))):
+                model, _, size = entry.rpartition("=")
+                if model:
+                    model_ctx[model.strip()] = int(size)
+                else:
+                    default = int(size)
+            _budget = ContextBudget(
+                max_ctx=default,
+                output_tokens=int(os.environ.get("LLM_OUTPUT_TOKENS", 2048)),
+                digest_tokens=int(os.environ.get("LLM_DIGEST_TOKENS", 1536)),
+                model_ctx=model_ctx,
+            )
+        return _budget
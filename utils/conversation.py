@@ -0,0 +1,157 @@
+# utils/conversation.py
+import contextvars
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from utils.context_budget import estimate_tokens, get_context_budget
+from utils.metrics import REGISTRY
+
+REGISTRY.describe("article_context_reuse_total", "Requests that continued an earlier generation's KV context instead of resending its text.")
+REGISTRY.describe("article_context_reused_tokens", "Context tokens carried over per continued request.")
+
+
+def reuse_enabled() -> bool:
+    """Context reuse applies unless LLM_CONTEXT_REUSE_DISABLED is set."""
+    return os.environ.get("LLM_CONTEXT_REUSE_DISABLED", "").lower() not in ("1", "true", "yes")
+
+
+class Turn:
+    """
+    A finished generation that a later request can continue.
+
+    context is the token state Ollama returned with the response: the
+    prompt and the response as the model saw them. Sending it back with the
+    next prompt lets the server reuse the KV cache it still holds for those
+    tokens, instead of evaluating the same text again inside a new prompt.
+    """
+
+    def __init__(self, model: str, response: str, context: List[int]):
+        self.model = model
+        self.response = response
+        self.context = context
+        self._key: Optional[str] = None
+
+    @property
+    def key(self) -> str:
+        """Digest of the context, for cache and coalescing keys."""
+        if self._key is None:
+            self._key = hashlib.sha256(json.dumps(self.context).encode("utf-8")).hexdigest()
+        return self._key
+
+
+class Conversation:
+    """
+    Generations of one pipeline run that later stages may continue, by label.
+
+    A stage continues an earlier one only if the text it was handed is
+    exactly what that generation returned on the same model; a stage loaded
+    from a checkpoint or the response cache has no context and falls back to
+    a self-contained prompt.
+    """
+
+    def __init__(self):
+        self._turns: Dict[str, Turn] = {}
+        self._lock = threading.Lock()
+
+    def remember(self, label: str, model: str, response: str, context: Optional[List[int]]) -> None:
+        """
+        Keep a finished generation for later stages.
+
+        Args:
+            label (str): The stage that produced it, e.g. "analysis".
+            model (str): The model that generated it.
+            response (str): The text returned to the caller.
+            context (List[int]): Ollama's context for it; nothing is kept without one.
+        """
+        if not context:
+            return
+        with self._lock:
+            self._turns[label] = Turn(model, response, context)
+
+    def get(self, label: str, model: str, response: str) -> Optional[Turn]:
+        """
+        Return the generation under label if it was made by model and returned response.
+
+        Args:
+            label (str): The stage to continue.
+            model (str): The model of the continuing request.
+            response (str): The text the continuing stage was handed.
+
+        Returns:
+            Optional[Turn]: The turn, or None if it cannot be continued.
+        """
+        with self._lock:
+            turn = self._turns.get(label)
+        if turn is None or turn.model != model or turn.response != response:
+            return None
+        return turn
+
+
+_current: contextvars.ContextVar[Optional[Conversation]] = contextvars.ContextVar("conversation", default=None)
+
+
+@contextmanager
+def conversation() -> Iterator[Conversation]:
+    """
+    Start a conversation for the code run in this context, e.g. one pipeline run.
+
+    Yields:
+        Conversation: The new conversation.
+    """
+    current = Conversation()
+    reset = _current.set(current)
+    try:
+        yield current
+    finally:
+        try:
+            _current.reset(reset)
+        except ValueError:
+            # Exited from another context, e.g. a generator finished by another thread
+            pass
+
+
+def current_conversation() -> Optional[Conversation]:
+    """The conversation of the current context, if any."""
+    return _current.get()
+
+
+def continuation(label: str, model: str, response: str, prompt: str, output_tokens: Optional[int] = None) -> Optional[Turn]:
+    """
+    Find the earlier generation a request can continue.
+
+    Args:
+        label (str): The stage to continue, e.g. "analysis".
+        model (str): The model of the continuing request.
+        response (str): The text the continuing stage was handed.
+        prompt (str): The follow-up prompt that would be sent with the context.
+        output_tokens (int): Tokens the follow-up may generate; defaults to
+            the context budget's output reserve.
+
+    Returns:
+        Optional[Turn]: The turn to continue, or None when reuse is disabled,
+        there is no matching generation, or the context and prompt would not
+        fit the model's context window.
+    """
+    current = current_conversation()
+    if current is None or not reuse_enabled():
+        return None
+    turn = current.get(label, model, response)
+    if turn is None:
+        return None
+    budget = get_context_budget()
+    num_ctx = budget.num_ctx_for(model)
+    needed = len(turn.context) + estimate_tokens(prompt) + (output_tokens or budget.output_tokens)
+    if num_ctx and needed > num_ctx:
+        return None
+    return turn
+
+
+def record_reuse(agent: str, model: str, turn: Turn) -> None:
+    """Count a request that continues turn's context."""
+    labels = {"agent": agent, "model": model}
+    REGISTRY.inc("article_context_reuse_total", labels=labels)
+    REGISTRY.observe("article_context_reused_tokens", len(turn.context), labels=labels)
@@ -1,6 +1,7 @@
 # utils/file_utils.py
 import os
-from typing import Tuple
+from typing import Optional, Tuple
+from utils.artifact_store import content_hash, get_artifact_store
 
 def create_output_directory(directory: str = "output") -> str:
     """
@@ -16,17 +17,35 @@ def create_output_directory(directory: str = "output") -> str:
         os.makedirs(directory)
     return directory
 
-def get_file_paths(title: str, output_dir: str = "output") -> Tuple[str, str]:
+def get_file_paths(title: str, output_dir: str = "output", content: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
     """
-    Generate file paths for PDF and DOCX files based on the title.
+    Return the paths of the PDF and DOCX files exported for an article.
+    
+    With the artifact store enabled, exports live in the store's object
+    directories, so the files are looked up by content and title; a format
+    not exported yet is None. Without the store, the files are
+    <output_dir>/<title>.pdf and .docx.
     
     Args:
         title (str): The title of the document.
         output_dir (str): The output directory.
+        content (str): The formatted article content the files were rendered
+            from; required when the artifact store is enabled.
         
     Returns:
-        Tuple[str, str]: The paths to the PDF and DOCX files.
+        Tuple[Optional[str], Optional[str]]: The paths to the PDF (or its HTML
+        fallback) and DOCX files.
+        
+    Raises:
+        ValueError: If the artifact store is enabled and content is missing.
     """
+    store = get_artifact_store(output_dir)
+    if store is not None:
+        if content is None:
+            raise ValueError("content is required to find exports in the artifact store")
+        digest = content_hash(content, title)
+        return store.lookup(digest, "pdf"), store.lookup(digest, "docx")
+    
     # Sanitize title for filename
     filename = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()
     filename = filename.replace(' ', '_')
@@ -1,41 +1,458 @@
-import requests
-import json
+import asyncio
+import time
+from typing import AsyncIterator, Callable, Iterator, List, Optional
+
+from utils.cancellation import check_cancelled, current_token
+from utils.context_budget import get_context_budget
+from utils.conversation import Turn, current_conversation, record_reuse, reuse_enabled
+from utils.llm_cache import LLMCache, get_default_cache, make_cache_key
+from utils.llm_scheduler import get_scheduler
+from utils.metrics import record_llm_call
+from utils.output_limits import OutputLimit, StructuralStopper, limits_enabled, record_early_stop
+from utils.model_residency import get_residency
+from utils.single_flight import SingleFlight
+from utils.ollama_client import (
+    AsyncOllamaClient,
+    OllamaClient,
+    OllamaResponseError,
+    get_shared_async_client,
+    get_shared_client,
+)
+from utils.ollama_pool import get_shared_pool, hosts_from_env
+
+_DEFAULT = object()
+
+# Identical requests in flight at the same time share one generation
+_in_flight = SingleFlight("llm")
 
 class OllamaLLM:
-    def __init__(self, model="mistral:latest", url="http://localhost:11434/api/generate"):
+    def __init__(
+        self,
+        model="mistral:latest",
+        url: Optional[str] = None,
+        options: Optional[dict] = None,
+        cache: Optional[LLMCache] = None,
+        client: Optional[OllamaClient] = None,
+        async_client: Optional[AsyncOllamaClient] = None,
+        agent: str = "default",
+    ):
         self.model = model
-        self.url = url
+        # Label under which this instance's calls are reported in metrics
+        self.agent = agent
+        self.options = options or {}
+        self.cache = cache
+        if client is None:
+            # Accept the legacy ".../api/generate" URL as well as a bare host
+            client = OllamaClient(base_url=url.split("/api/")[0]) if url else get_shared_client()
+        self.client = client
+        # Resolved per call when unset, since async clients are bound to an event loop
+        self.async_client = async_client
 
-    def invoke(self, prompt):
-        """
-        Send prompt to Ollama and return the generated response.
-        """
+    def _payload(self, prompt, limit: Optional[OutputLimit] = None, continues: Optional[Turn] = None) -> dict:
+        """Build the /api/generate request body for a prompt, with num_ctx sized to fit it."""
         payload = {
             "model": self.model,
             "prompt": prompt,
-            "stream": False
         }
-        try:
-            response = requests.post(self.url, json=payload)
-            response.raise_for_status()
-            return response.json().get("response", "")
-        
-        except Exception as e:
-            print(f"Error calling Ollama: {e}")
-            return ""
-
-def load_llm(model="mistral"):
+        # Options configured on the model take precedence over a request's limit
+        options = dict(limit.options(), **self.options) if limit is not None else self.options
+        context_tokens = len(continues.context) if continues is not None else 0
+        options = get_context_budget().options_for(prompt, options, self.agent, self.model, context_tokens)
+        if options:
+            payload["options"] = options
+        if continues is not None:
+            payload["context"] = continues.context
+            record_reuse(self.agent, self.model, continues)
+        keep_alive = get_residency().keep_alive_for(self.model)
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        return payload
+
+    def _key(self, prompt, limit: Optional[OutputLimit], continues: Optional[Turn] = None) -> str:
+        """Cache and coalescing key; requests without a limit or context keep their earlier keys."""
+        options = dict(self.options, limit=limit.key()) if limit is not None else self.options
+        if continues is not None:
+            options = dict(options, continues=continues.key)
+        return make_cache_key(self.model, prompt, options)
+
+    def _remembering(self, label: Optional[str]) -> Optional[Callable[[str, dict], None]]:
+        """Return a callback that keeps a finished generation in the current conversation under label."""
+        current = current_conversation()
+        if label is None or current is None or not reuse_enabled():
+            return None
+        return lambda text, final: current.remember(label, self.model, text, final.get("context"))
+
+    def invoke(
+        self,
+        prompt,
+        use_cache: bool = True,
+        limit: Optional[OutputLimit] = None,
+        continues: Optional[Turn] = None,
+        remember_as: Optional[str] = None,
+    ):
+        """
+        Send prompt to Ollama and return the generated response.
+
+        A call identical to one already in flight (same model, prompt and
+        options) waits for that call and returns its response instead of
+        generating again.
+
+        Under a cancellation token the response is streamed internally, so
+        cancelling the token ends the generation on the server.
+
+        Args:
+            prompt (str): The prompt to send.
+            use_cache (bool): Set to False to bypass the response cache.
+            limit (OutputLimit): Caps how much is generated. Structural limits
+                stream the response internally so it can be ended early.
+            continues (Turn): An earlier generation whose context the prompt
+                follows on from (see utils.conversation.continuation()).
+            remember_as (str): Keep the finished generation in the current
+                conversation under this label, for a later stage to continue.
+
+        Raises:
+            OllamaError: If Ollama cannot be reached, fails, or returns an empty response.
+            RunCancelled: If the current cancellation token fires.
+        """
+        check_cancelled("llm")
+        started = time.perf_counter()
+        limit = limit if limits_enabled() else None
+        key = self._key(prompt, limit, continues)
+        if self.cache is not None and use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                record_llm_call(self.agent, self.model, None, time.perf_counter() - started, cached=True)
+                return cached
+
+        payload = self._payload(prompt, limit, continues)
+        remember = self._remembering(remember_as)
+        if (limit is not None and limit.structural) or current_token() is not None:
+            generate = lambda: "".join(self._stream_generate(payload, started, None, limit, remember))
+        else:
+            generate = lambda: self._generate(payload, started, remember)
+        text, shared = _in_flight.do(key, generate)
+        if shared:
+            record_llm_call(self.agent, self.model, None, time.perf_counter() - started, coalesced=True)
+        elif self.cache is not None and use_cache:
+            self.cache.set(key, text)
+        return text
+
+    def _generate(self, payload: dict, started: float, remember: Optional[Callable[[str, dict], None]] = None) -> str:
+        """Run one non-streaming generation and return its text."""
+        with get_scheduler().slot(self.model):
+            response = self.client.generate(payload)
+        record_llm_call(self.agent, self.model, response, time.perf_counter() - started)
+        text = response.get("response", "")
+        if not text.strip():
+            raise OllamaResponseError(f"Ollama returned an empty response for model {self.model}")
+        if remember is not None:
+            remember(text, response)
+        return text
+
+    def stream(
+        self,
+        prompt,
+        use_cache: bool = True,
+        limit: Optional[OutputLimit] = None,
+        continues: Optional[Turn] = None,
+        remember_as: Optional[str] = None,
+    ) -> Iterator[str]:
+        """
+        Send prompt to Ollama and yield the response text as it is generated.
+
+        A cached response is yielded in one piece. The full text is cached only
+        if the stream runs to completion. A stream identical to one already in
+        flight replays that stream's tokens instead of generating again.
+
+        Args:
+            prompt (str): The prompt to send.
+            use_cache (bool): Set to False to bypass the response cache.
+            limit (OutputLimit): Caps how much is generated; the stream ends
+                once a structural limit is met.
+            continues (Turn): As in invoke().
+            remember_as (str): As in invoke(); only a stream that runs to
+                completion is kept.
+
+        Yields:
+            str: Chunks of generated text.
+
+        Raises:
+            OllamaError: If Ollama cannot be reached, fails, or returns an empty response.
+            RunCancelled: If the current cancellation token fires.
+        """
+        check_cancelled("llm")
+        started = time.perf_counter()
+        limit = limit if limits_enabled() else None
+        key = self._key(prompt, limit, continues)
+        if self.cache is not None and use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                record_llm_call(self.agent, self.model, None, time.perf_counter() - started, cached=True)
+                yield cached
+                return
+
+        cache_key = key if self.cache is not None and use_cache else None
+        remember = self._remembering(remember_as)
+        yield from _in_flight.stream(
+            key,
+            lambda: self._stream_generate(self._payload(prompt, limit, continues), started, cache_key, limit, remember),
+        )
+
+    def _stream_generate(
+        self,
+        payload: dict,
+        started: float,
+        cache_key: Optional[str],
+        limit: Optional[OutputLimit] = None,
+        remember: Optional[Callable[[str, dict], None]] = None,
+    ) -> Iterator[str]:
+        """
+        Run one streaming generation, caching the full text under cache_key.
+
+        The current cancellation token is checked between chunks; when it
+        fires, the stream is closed, which stops generation on the server.
+        """
+        cancel_token = current_token()
+        stopper = limit.stopper() if limit is not None and limit.structural else None
+        parts = []
+        final = None
+        with get_scheduler().slot(self.model):
+            chunks = self.client.stream_generate(payload)
+            try:
+                for chunk in chunks:
+                    if cancel_token is not None:
+                        cancel_token.raise_if_cancelled("llm_stream")
+                    token = chunk.get("response", "")
+                    if stopper is not None:
+                        token = stopper.feed(token)
+                    if token:
+                        parts.append(token)
+                        yield token
+                    if chunk.get("done"):
+                        final = chunk
+                    if stopper is not None and stopper.done:
+                        # Closing the stream stops generation on the server
+                        break
+            finally:
+                chunks.close()
+            tail = stopper.flush() if stopper is not None else ""
+            if tail:
+                parts.append(tail)
+                yield tail
+        self._record_stream(final, started, stopper)
+
+        text = "".join(parts)
+        if not text.strip():
+            raise OllamaResponseError(f"Ollama returned an empty response for model {self.model}")
+        # A stream ended early has no final chunk, and so no context to continue
+        if remember is not None and final is not None:
+            remember(text, final)
+
+        if cache_key is not None:
+            self.cache.set(cache_key, text)
+
+    def _record_stream(self, final: Optional[dict], started: float, stopper: Optional[StructuralStopper]) -> None:
+        record_llm_call(self.agent, self.model, final, time.perf_counter() - started)
+        if stopper is not None and stopper.done:
+            record_early_stop(self.agent, self.model, stopper.reason)
+
+    async def ainvoke(
+        self,
+        prompt,
+        use_cache: bool = True,
+        limit: Optional[OutputLimit] = None,
+        continues: Optional[Turn] = None,
+        remember_as: Optional[str] = None,
+    ):
+        """
+        Async variant of invoke() that does not block the event loop.
+
+        Identical calls in flight are coalesced with each other and with
+        invoke() calls.
+
+        Args:
+            prompt (str): The prompt to send.
+            use_cache (bool): Set to False to bypass the response cache.
+            limit (OutputLimit): Caps how much is generated.
+            continues (Turn): As in invoke().
+            remember_as (str): As in invoke().
+
+        Raises:
+            OllamaError: If Ollama cannot be reached, fails, or returns an empty response.
+            RunCancelled: If the current cancellation token fires.
+        """
+        check_cancelled("llm")
+        started = time.perf_counter()
+        limit = limit if limits_enabled() else None
+        key = self._key(prompt, limit, continues)
+        if self.cache is not None and use_cache:
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                record_llm_call(self.agent, self.model, None, time.perf_counter() - started, cached=True)
+                return cached
+
+        payload = self._payload(prompt, limit, continues)
+        remember = self._remembering(remember_as)
+        if (limit is not None and limit.structural) or current_token() is not None:
+            generate = lambda: self._acollect(payload, started, limit, remember)
+        else:
+            generate = lambda: self._agenerate(payload, started, remember)
+        text, shared = await _in_flight.ado(key, generate)
+        if shared:
+            record_llm_call(self.agent, self.model, None, time.perf_counter() - started, coalesced=True)
+        elif self.cache is not None and use_cache:
+            await asyncio.to_thread(self.cache.set, key, text)
+        return text
+
+    async def _agenerate(self, payload: dict, started: float, remember: Optional[Callable[[str, dict], None]] = None) -> str:
+        """Async variant of _generate()."""
+        client = self.async_client or get_shared_async_client()
+        async with get_scheduler().aslot(self.model):
+            response = await client.generate(payload)
+        record_llm_call(self.agent, self.model, response, time.perf_counter() - started)
+        text = response.get("response", "")
+        if not text.strip():
+            raise OllamaResponseError(f"Ollama returned an empty response for model {self.model}")
+        if remember is not None:
+            remember(text, response)
+        return text
+
+    async def _acollect(
+        self,
+        payload: dict,
+        started: float,
+        limit: Optional[OutputLimit],
+        remember: Optional[Callable[[str, dict], None]] = None,
+    ) -> str:
+        """Stream one generation, which can be limited or cancelled, and return its text."""
+        return "".join([token async for token in self._astream_generate(payload, started, None, limit, remember)])
+
+    async def astream(
+        self,
+        prompt,
+        use_cache: bool = True,
+        limit: Optional[OutputLimit] = None,
+        continues: Optional[Turn] = None,
+        remember_as: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Async variant of stream().
+
+        Args:
+            prompt (str): The prompt to send.
+            use_cache (bool): Set to False to bypass the response cache.
+            limit (OutputLimit): Caps how much is generated.
+            continues (Turn): As in invoke().
+            remember_as (str): As in stream().
+
+        Yields:
+            str: Chunks of generated text.
+        """
+        check_cancelled("llm")
+        started = time.perf_counter()
+        limit = limit if limits_enabled() else None
+        cache_key = None
+        if self.cache is not None and use_cache:
+            cache_key = self._key(prompt, limit, continues)
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                record_llm_call(self.agent, self.model, None, time.perf_counter() - started, cached=True)
+                yield cached
+                return
+
+        remember = self._remembering(remember_as)
+        payload = self._payload(prompt, limit, continues)
+        async for token in self._astream_generate(payload, started, cache_key, limit, remember):
+            yield token
+
+    async def _astream_generate(
+        self,
+        payload: dict,
+        started: float,
+        cache_key: Optional[str],
+        limit: Optional[OutputLimit] = None,
+        remember: Optional[Callable[[str, dict], None]] = None,
+    ) -> AsyncIterator[str]:
+        """Async variant of _stream_generate()."""
+        client = self.async_client or get_shared_async_client()
+        cancel_token = current_token()
+        stopper = limit.stopper() if limit is not None and limit.structural else None
+        parts = []
+        final = None
+        async with get_scheduler().aslot(self.model):
+            chunks = client.stream_generate(payload)
+            try:
+                async for chunk in chunks:
+                    if cancel_token is not None:
+                        cancel_token.raise_if_cancelled("llm_stream")
+                    token = chunk.get("response", "")
+                    if stopper is not None:
+                        token = stopper.feed(token)
+                    if token:
+                        parts.append(token)
+                        yield token
+                    if chunk.get("done"):
+                        final = chunk
+                    if stopper is not None and stopper.done:
+                        break
+            finally:
+                await chunks.aclose()
+            tail = stopper.flush() if stopper is not None else ""
+            if tail:
+                parts.append(tail)
+                yield tail
+        self._record_stream(final, started, stopper)
+
+        text = "".join(parts)
+        if not text.strip():
+            raise OllamaResponseError(f"Ollama returned an empty response for model {self.model}")
+        if remember is not None and final is not None:
+            remember(text, final)
+
+        if cache_key is not None:
+            await asyncio.to_thread(self.cache.set, cache_key, text)
+
+def load_llm(
+    model="mistral",
+    options: Optional[dict] = None,
+    cache=_DEFAULT,
+    client: Optional[OllamaClient] = None,
+    agent: str = "default",
+    hosts: Optional[List[str]] = None,
+):
     """
     Load and return an Ollama LLM instance.
-    
+
     Args:
         model (str): The name of the model to load.
-        
+        options (dict): Optional Ollama generation options (temperature, seed, ...).
+        cache (LLMCache): Response cache to use. Defaults to the shared on-disk
+            cache; pass None to disable caching for this instance.
+        client (OllamaClient): HTTP client to use. Defaults to the shared
+            connection-pooled client.
+        agent (str): Name of the calling agent, used to label metrics.
+        hosts (List[str]): Ollama hosts to load-balance across. Defaults to the
+            comma-separated OLLAMA_HOSTS; when neither is set, the single
+            OLLAMA_HOST client is used.
+
     Returns:
         OllamaLLM: An instance of the Ollama LLM.
     """
+    if cache is _DEFAULT:
+        cache = get_default_cache()
+
     # If model already contains a tag, use it as is
-    if ":" in model:
-        return OllamaLLM(model=model)
-    else:
-        return OllamaLLM(model=f"{model}:latest")
\ No newline at end of file
+    if ":" not in model:
+        model = f"{model}:latest"
+
+    async_client = None
+    if client is None:
+        hosts = hosts or hosts_from_env()
+        if hosts:
+            pool = get_shared_pool(hosts)
+            client, async_client = pool, pool.async_client
+        else:
+            client = get_shared_client()
+    return OllamaLLM(
+        model=model, options=options, cache=cache, client=client, async_client=async_client, agent=agent
+    )
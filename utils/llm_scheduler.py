@@ -0,0 +1,304 @@
+# utils/llm_scheduler.py
+import asyncio
+import contextvars
+import itertools
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from utils.cancellation import await_or_cancel, current_token, wait_event
+from utils.metrics import REGISTRY
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = {INTERACTIVE: 0, BATCH: 1}
+
+REGISTRY.describe("article_llm_queue_depth", "LLM requests waiting for a scheduler slot, by priority.")
+REGISTRY.describe("article_llm_queue_seconds", "Time LLM requests waited for a scheduler slot.")
+REGISTRY.describe("article_llm_model_switches_total", "Slots granted to a different model than the previous one.")
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(level: str) -> Iterator[None]:
+    """
+    Run LLM calls made in this context (and threads/tasks started from it) at a priority.
+
+    Args:
+        level (str): INTERACTIVE or BATCH.
+
+    Raises:
+        ValueError: If the level is unknown.
+    """
+    if level not in PRIORITIES:
+        raise ValueError(f"unknown LLM priority {level!r}; expected one of {', '.join(PRIORITIES)}")
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        try:
+            _priority.reset(token)
+        except ValueError:
+            # Exited from another context, e.g. a generator finished by another thread
+            pass
+
+
+def current_priority() -> str:
+    """The priority class of LLM calls made from the current context."""
+    return _priority.get()
+
+
+class _Waiter:
+    def __init__(self, model: str, priority: str, sequence: int, grant: Callable[[], None]):
+        self.model = model
+        self.priority = priority
+        self.sequence = sequence
+        self.grant = grant
+        self.enqueued = time.perf_counter()
+        self.granted = False
+
+
+class LLMScheduler:
+    """
+    Admission control for LLM requests.
+
+    Every generation takes a slot before it is sent to Ollama. Slots are
+    limited overall (max_concurrency), per model (model_limits, falling back
+    to model_concurrency) and in how many different models may run at once
+    (max_active_models, 0 for no limit). When a slot frees up, the waiting
+    request to run next is chosen by:
+
+        1. priority class: interactive before batch; a batch request that has
+           waited longer than starvation_seconds is treated as interactive;
+        2. model: requests for a model that is already running or ran last,
+           so queued requests for one model are served as a batch instead of
+           forcing the server to swap models back and forth, up to max_batch
+           grants in a row while other models are waiting;
+        3. arrival order.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        model_concurrency: int = 4,
+        model_limits: Optional[Dict[str, int]] = None,
+        max_active_models: int = 0,
+        max_batch: int = 8,
+        starvation_seconds: float = 60.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.model_concurrency = model_concurrency
+        self.model_limits = dict(model_limits or {})
+        self.max_active_models = max_active_models
+        self.max_batch = max_batch
+        self.starvation_seconds = starvation_seconds
+        self._lock = threading.Lock()
+        self._waiters: List[_Waiter] = []
+        self._running: Dict[str, int] = {}
+        self._last_model: Optional[str] = None
+        self._streak = 0
+        self._sequence = itertools.count()
+
+    # ---------------------------
+    # Slots
+    # ---------------------------
+    @contextmanager
+    def slot(self, model: str, priority: Optional[str] = None) -> Iterator[None]:
+        """
+        Hold a slot for one request to model, waiting for it if necessary.
+
+        Args:
+            model (str): The model the request targets.
+            priority (str): Defaults to the current context's priority.
+
+        Raises:
+            RunCancelled: If the current cancellation token fires while queued.
+        """
+        ready = threading.Event()
+        waiter = self._enqueue(model, priority, ready.set)
+        try:
+            wait_event(ready, current_token(), "llm_queue")
+        except BaseException:
+            if not self._withdraw(waiter):
+                self._release(model)
+            raise
+        try:
+            yield
+        finally:
+            self._release(model)
+
+    @asynccontextmanager
+    async def aslot(self, model: str, priority: Optional[str] = None) -> AsyncIterator[None]:
+        """Async variant of slot() that waits without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+
+        def grant() -> None:
+            loop.call_soon_threadsafe(lambda: ready.done() or ready.set_result(None))
+
+        waiter = self._enqueue(model, priority, grant)
+        try:
+            await await_or_cancel(ready, current_token(), "llm_queue")
+        except BaseException:
+            # Cancelled while queued: give the slot back if it was granted meanwhile
+            if not self._withdraw(waiter):
+                self._release(model)
+            raise
+        try:
+            yield
+        finally:
+            self._release(model)
+
+    def stats(self) -> dict:
+        """
+        Report the scheduler's current state.
+
+        Returns:
+            dict: Running requests per model and queued requests per priority.
+        """
+        with self._lock:
+            queued = {level: 0 for level in PRIORITIES}
+            for waiter in self._waiters:
+                queued[waiter.priority] += 1
+            return {"running": dict(self._running), "queued": queued, "last_model": self._last_model}
+
+    # ---------------------------
+    # Dispatch
+    # ---------------------------
+    def _enqueue(self, model: str, priority: Optional[str], grant: Callable[[], None]) -> _Waiter:
+        priority = priority or current_priority()
+        if priority not in PRIORITIES:
+            raise ValueError(f"unknown LLM priority {priority!r}")
+        with self._lock:
+            waiter = _Waiter(model, priority, next(self._sequence), grant)
+            self._waiters.append(waiter)
+            self._dispatch()
+            self._report()
+        return waiter
+
+    def _withdraw(self, waiter: _Waiter) -> bool:
+        """Remove a waiter that gave up; False if it had already been granted a slot."""
+        with self._lock:
+            if waiter.granted:
+                return False
+            self._waiters.remove(waiter)
+            self._report()
+            return True
+
+    def _release(self, model: str) -> None:
+        with self._lock:
+            self._running[model] -= 1
+            if not self._running[model]:
+                del self._running[model]
+            self._dispatch()
+            self._report()
+
+    def _limit(self, model: str) -> int:
+        return self.model_limits.get(model, self.model_concurrency)
+
+    def _needs_switch(self, model: str) -> bool:
+        """Whether model can only start once a running model drains (max_active_models)."""
+        return bool(
+            self.max_active_models
+            and model not in self._running
+            and len(self._running) >= self.max_active_models
+        )
+
+    def _admissible(self, model: str) -> bool:
+        if sum(self._running.values()) >= self.max_concurrency:
+            return False
+        if self._running.get(model, 0) >= self._limit(model):
+            return False
+        return not self._needs_switch(model)
+
+    def _rank(self, waiter: _Waiter, now: float) -> tuple:
+        priority = PRIORITIES[waiter.priority]
+        if now - waiter.enqueued >= self.starvation_seconds:
+            priority = 0
+        warm = waiter.model in self._running or waiter.model == self._last_model
+        if warm and self._streak >= self.max_batch and any(other.model != waiter.model for other in self._waiters):
+            # Let another model have a turn
+            warm = False
+        return (priority, not warm, waiter.sequence)
+
+    def _dispatch(self) -> None:
+        """Grant slots to waiters, best first, while capacity allows; the caller holds the lock."""
+        now = time.perf_counter()
+        while self._waiters:
+            waiter = min(self._waiters, key=lambda waiter: self._rank(waiter, now))
+            if not self._admissible(waiter.model):
+                if self._needs_switch(waiter.model):
+                    # Drain the running model for the best waiter instead of
+                    # letting requests for the running model overtake it forever
+                    return
+                candidates = [other for other in self._waiters if self._admissible(other.model)]
+                if not candidates:
+                    return
+                waiter = min(candidates, key=lambda waiter: self._rank(waiter, now))
+            self._waiters.remove(waiter)
+            waiter.granted = True
+            self._running[waiter.model] = self._running.get(waiter.model, 0) + 1
+            if waiter.model == self._last_model:
+                self._streak += 1
+            else:
+                if self._last_model is not None:
+                    REGISTRY.inc("article_llm_model_switches_total")
+                self._last_model = waiter.model
+                self._streak = 1
+            REGISTRY.observe(
+                "article_llm_queue_seconds", now - waiter.enqueued,
+                labels={"model": waiter.model, "priority": waiter.priority},
+            )
+            waiter.grant()
+
+    def _report(self) -> None:
+        queued = {level: 0 for level in PRIORITIES}
+        for waiter in self._waiters:
+            queued[waiter.priority] += 1
+        for level, count in queued.items():
+            REGISTRY.set_gauge("article_llm_queue_depth", count, labels={"priority": level})
+
+
+def _parse_limits(spec: str) -> Dict[str, int]:
+    """Parse "model=limit,model=limit"; models without a tag get ":latest"."""
+    limits = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        model, _, limit = entry.rpartition("=")
+        if ":" not in model:
+            model = f"{model}:latest"
+        limits[model] = int(limit)
+    return limits
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """
+    Return the process-wide LLM scheduler.
+
+    Configured from the environment on first use:
+    LLM_MAX_CONCURRENCY (all models, default 4), LLM_MODEL_CONCURRENCY
+    (per model, default 4), LLM_MODEL_LIMITS (per-model overrides such as
+    "mistral=3,codellama:7b=1"), LLM_MAX_ACTIVE_MODELS (models running at
+    once, default 0 = no limit; 1 suits a GPU that holds one model) and
+    LLM_STARVATION_SECONDS (default 60).
+
+    Returns:
+        LLMScheduler: The shared scheduler.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(
+                max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", 4)),
+                model_concurrency=int(os.environ.get("LLM_MODEL_CONCURRENCY", 4)),
+                model_limits=_parse_limits(os.environ.get("LLM_MODEL_LIMITS", "")),
+                max_active_models=int(os.environ.get("LLM_MAX_ACTIVE_MODELS", 0)),
+                starvation_seconds=float(os.environ.get("LLM_STARVATION_SECONDS", 60.0)),
+            )
+        return _scheduler
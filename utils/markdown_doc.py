@@ -0,0 +1,338 @@
+# utils/markdown_doc.py
+import html
+import re
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Tuple
+
+_FENCE = re.compile(r'^\s*(`{3,}|~{3,})\s*([^\s`]*)')
+_HEADING = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+_RULE = re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$')
+_LIST_ITEM = re.compile(r'^(\s*)([-*+]|\d+[.)])\s+(.*)$')
+_QUOTE = re.compile(r'^\s*>\s?(.*)$')
+_TABLE_SEPARATOR = re.compile(r'^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$')
+_INLINE = re.compile(
+    r'`(?P<code>[^`]+)`'
+    r'|\[(?P<link_text>[^\]]+)\]\((?P<href>[^)\s]+)\)'
+    r'|\*\*(?P<bold>.+?)\*\*|(?<!\w)__(?P<bold_u>.+?)__(?!\w)'
+    r'|\*(?P<italic>[^*\s](?:[^*]*[^*\s])?)\*|(?<!\w)_(?P<italic_u>[^_\s](?:[^_]*[^_\s])?)_(?!\w)'
+)
+
+
+class Block(NamedTuple):
+    """
+    One block-level element of a Markdown document.
+
+    kind is one of "heading", "paragraph", "list", "code", "table", "quote"
+    or "rule". Inline Markdown in text, items and rows is kept as written;
+    use parse_inline() to split it into styled spans.
+    """
+    kind: str
+    text: str = ""
+    level: int = 0
+    language: str = ""
+    items: Tuple[Tuple[int, str], ...] = ()
+    ordered: bool = False
+    rows: Tuple[Tuple[str, ...], ...] = ()
+
+
+class Span(NamedTuple):
+    """A run of inline text with its styling."""
+    text: str
+    bold: bool = False
+    italic: bool = False
+    code: bool = False
+    href: Optional[str] = None
+
+
+class Document:
+    """
+    A parsed Markdown article: an immutable sequence of blocks.
+
+    Built by parse_markdown(), which caches documents by source text so the
+    formatter and every export backend share a single parse per article.
+    """
+
+    def __init__(self, blocks: Tuple[Block, ...]):
+        self.blocks = blocks
+
+    @property
+    def title(self) -> Optional[str]:
+        """The text of the first level-1 heading, if any."""
+        for block in self.blocks:
+            if block.kind == "heading" and block.level == 1:
+                return block.text
+        return None
+
+    def headers(self) -> List[Tuple[int, str]]:
+        """
+        List the document's headings.
+
+        Returns:
+            List[Tuple[int, str]]: (level, text) for each heading, in order.
+        """
+        return [(block.level, block.text) for block in self.blocks if block.kind == "heading"]
+
+    def is_title(self, block: Block, title: Optional[str]) -> bool:
+        """Whether block is a level-1 heading repeating the given document title."""
+        return (
+            title is not None
+            and block.kind == "heading"
+            and block.level == 1
+            and title.lower() in block.text.lower()
+        )
+
+
+def _starts_block(lines: List[str], i: int) -> bool:
+    """Whether lines[i] starts a block other than a paragraph continuation."""
+    line = lines[i]
+    return bool(
+        _FENCE.match(line)
+        or _HEADING.match(line)
+        or _RULE.match(line)
+        or _LIST_ITEM.match(line)
+        or _QUOTE.match(line)
+        or _is_table_start(lines, i)
+    )
+
+
+def _is_table_start(lines: List[str], i: int) -> bool:
+    return (
+        lines[i].lstrip().startswith('|')
+        and i + 1 < len(lines)
+        and bool(_TABLE_SEPARATOR.match(lines[i + 1]))
+    )
+
+
+def _table_cells(line: str) -> Tuple[str, ...]:
+    line = line.strip()
+    if line.startswith('|'):
+        line = line[1:]
+    if line.endswith('|'):
+        line = line[:-1]
+    return tuple(cell.strip() for cell in line.split('|'))
+
+
+@lru_cache(maxsize=32)
+def parse_markdown(markdown_text: str) -> Document:
+    """
+    Parse Markdown into a Document.
+
+    Supports ATX headings, paragraphs, nested bullet and numbered lists,
+    fenced code blocks (an unclosed fence runs to the end of the text),
+    pipe tables, block quotes and horizontal rules.
+
+    Args:
+        markdown_text (str): The Markdown source.
+
+    Returns:
+        Document: The parsed document. Results are cached by source text, so
+        callers must not modify the returned object.
+    """
+    lines = markdown_text.replace('\r\n', '\n').split('\n')
+    blocks = []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+
+        fence = _FENCE.match(line)
+        if fence:
+            marker = fence.group(1)
+            code = []
+            i += 1
+            while i < len(lines) and not lines[i].strip().startswith(marker):
+                code.append(lines[i])
+                i += 1
+            if i >= len(lines):
+                # Unclosed fence: drop the trailing blank lines it swallowed
+                while code and not code[-1].strip():
+                    code.pop()
+            blocks.append(Block("code", text='\n'.join(code), language=fence.group(2)))
+            i += 1
+            continue
+
+        if not line.strip():
+            i += 1
+            continue
+
+        heading = _HEADING.match(line)
+        if heading:
+            blocks.append(Block("heading", text=heading.group(2).strip(), level=len(heading.group(1))))
+            i += 1
+            continue
+
+        if _RULE.match(line):
+            blocks.append(Block("rule"))
+            i += 1
+            continue
+
+        if _is_table_start(lines, i):
+            rows = [_table_cells(line)]
+            i += 2
+            while i < len(lines) and lines[i].lstrip().startswith('|'):
+                rows.append(_table_cells(lines[i]))
+                i += 1
+            blocks.append(Block("table", rows=tuple(rows)))
+            continue
+
+        if _QUOTE.match(line):
+            quoted = []
+            while i < len(lines) and _QUOTE.match(lines[i]):
+                quoted.append(_QUOTE.match(lines[i]).group(1).strip())
+                i += 1
+            blocks.append(Block("quote", text=' '.join(part for part in quoted if part)))
+            continue
+
+        item = _LIST_ITEM.match(line)
+        if item:
+            ordered = item.group(2)[0].isdigit()
+            base_indent = len(item.group(1).expandtabs(4))
+            items = []
+
+            def same_list(match) -> bool:
+                # A top-level marker of the other kind starts a new list
+                indent = len(match.group(1).expandtabs(4)) - base_indent
+                return indent > 1 or match.group(2)[0].isdigit() == ordered
+
+            while i < len(lines):
+                item = _LIST_ITEM.match(lines[i])
+                if item and not same_list(item):
+                    break
+                if item:
+                    indent = len(item.group(1).expandtabs(4)) - base_indent
+                    items.append([max(0, indent // 2), item.group(3).strip()])
+                elif lines[i].strip() and lines[i][:1].isspace() and not _starts_block(lines, i):
+                    # Continuation of the previous item
+                    items[-1][1] += ' ' + lines[i].strip()
+                elif (
+                    not lines[i].strip()
+                    and i + 1 < len(lines)
+                    and _LIST_ITEM.match(lines[i + 1])
+                    and same_list(_LIST_ITEM.match(lines[i + 1]))
+                ):
+                    # A blank line between items does not end the list
+                    pass
+                else:
+                    break
+                i += 1
+            blocks.append(Block("list", items=tuple((level, text) for level, text in items), ordered=ordered))
+            continue
+
+        paragraph = [line.strip()]
+        i += 1
+        while i < len(lines) and lines[i].strip() and not _starts_block(lines, i):
+            paragraph.append(lines[i].strip())
+            i += 1
+        blocks.append(Block("paragraph", text=' '.join(paragraph)))
+
+    return Document(tuple(blocks))
+
+
+@lru_cache(maxsize=4096)
+def parse_inline(text: str) -> Tuple[Span, ...]:
+    """
+    Split inline Markdown into styled spans.
+
+    Handles `code`, [links](url), **bold** / __bold__ and *italic* / _italic_.
+    Emphasis does not nest.
+
+    Args:
+        text (str): Inline Markdown, e.g. a paragraph or list item.
+
+    Returns:
+        Tuple[Span, ...]: The spans, in order.
+    """
+    spans = []
+    position = 0
+    for match in _INLINE.finditer(text):
+        if match.start() > position:
+            spans.append(Span(text[position:match.start()]))
+        if match.group("code") is not None:
+            spans.append(Span(match.group("code"), code=True))
+        elif match.group("href") is not None:
+            spans.append(Span(match.group("link_text"), href=match.group("href")))
+        elif match.group("bold") is not None or match.group("bold_u") is not None:
+            spans.append(Span(match.group("bold") or match.group("bold_u"), bold=True))
+        else:
+            spans.append(Span(match.group("italic") or match.group("italic_u"), italic=True))
+        position = match.end()
+    if position < len(text):
+        spans.append(Span(text[position:]))
+    return tuple(spans)
+
+
+def inline_html(text: str) -> str:
+    """Render inline Markdown as escaped HTML."""
+    parts = []
+    for span in parse_inline(text):
+        part = html.escape(span.text, quote=False)
+        if span.code:
+            part = f"<code>{part}</code>"
+        if span.bold:
+            part = f"<strong>{part}</strong>"
+        if span.italic:
+            part = f"<em>{part}</em>"
+        if span.href:
+            part = f'<a href="{html.escape(span.href)}">{part}</a>'
+        parts.append(part)
+    return ''.join(parts)
+
+
+def _list_html(items: Tuple[Tuple[int, str], ...], ordered: bool) -> str:
+    tag = "ol" if ordered else "ul"
+    out = []
+    depth = -1
+    for level, text in items:
+        level = min(level, depth + 1)
+        if level > depth:
+            out.append(f"<{tag}>")
+            depth = level
+        else:
+            out.append("</li>")
+            while depth > level:
+                out.append(f"</{tag}></li>")
+                depth -= 1
+        out.append(f"<li>{inline_html(text)}")
+    out.append("</li>")
+    while depth > 0:
+        out.append(f"</{tag}></li>")
+        depth -= 1
+    out.append(f"</{tag}>")
+    return ''.join(out)
+
+
+def to_html(document: Document, skip_title: Optional[str] = None) -> str:
+    """
+    Render a Document as an HTML fragment.
+
+    Args:
+        document (Document): The parsed document.
+        skip_title (str): If given, the first level-1 heading containing this
+            title is left out, since the page template renders it separately.
+
+    Returns:
+        str: The HTML body content.
+    """
+    out = []
+    for block in document.blocks:
+        if skip_title is not None and document.is_title(block, skip_title):
+            skip_title = None
+            continue
+        if block.kind == "heading":
+            out.append(f"<h{block.level}>{inline_html(block.text)}</h{block.level}>")
+        elif block.kind == "paragraph":
+            out.append(f"<p>{inline_html(block.text)}</p>")
+        elif block.kind == "list":
+            out.append(_list_html(block.items, block.ordered))
+        elif block.kind == "code":
+            language = f' class="language-{html.escape(block.language)}"' if block.language else ""
+            out.append(f"<pre><code{language}>{html.escape(block.text, quote=False)}</code></pre>")
+        elif block.kind == "table":
+            header, body = block.rows[0], block.rows[1:]
+            rows = ["<tr>" + ''.join(f"<th>{inline_html(cell)}</th>" for cell in header) + "</tr>"]
+            rows += ["<tr>" + ''.join(f"<td>{inline_html(cell)}</td>" for cell in row) + "</tr>" for row in body]
+            out.append("<table>" + ''.join(rows) + "</table>")
+        elif block.kind == "quote":
+            out.append(f"<blockquote><p>{inline_html(block.text)}</p></blockquote>")
+        elif block.kind == "rule":
+            out.append("<hr />")
+    return '\n'.join(out)
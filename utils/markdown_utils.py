@@ -1,6 +1,7 @@
 # utils/markdown_utils.py
 import markdown2
 import re
+from utils.markdown_doc import parse_markdown
 
 def convert_markdown_to_html(markdown_text: str) -> str:
     """
@@ -24,15 +25,156 @@ def extract_headers(markdown_text: str) -> list:
     Returns:
         list: A list of tuples containing (header_level, header_text).
     """
-    headers = []
-    lines = markdown_text.split('\n')
-    for line in lines:
-        match = re.match(r'^(#{1,6})\s+(.+)$', line)
+    return parse_markdown(markdown_text).headers()
+
+def extract_list_items(markdown_text: str, header: str) -> list:
+    """
+    Extract the list items that follow a given header.
+
+    Matches Markdown headers ("### Key Sub-Topics") as well as bold labels
+    ("**Key Sub-Topics**"), case-insensitively, and stops at the next header.
+
+    Args:
+        markdown_text (str): The markdown text to search.
+        header (str): The header text to look for.
+
+    Returns:
+        list: The item texts, with emphasis markers removed.
+    """
+    items = []
+    in_section = False
+    header_pattern = re.compile(r'^\s*(#{1,6}\s+|\*\*)\s*' + re.escape(header) + r'\b', re.IGNORECASE)
+    for line in markdown_text.split('\n'):
+        if header_pattern.match(line):
+            in_section = True
+            continue
+        if not in_section:
+            continue
+        if re.match(r'^\s*(#{1,6}\s+|\*\*[^*]+\*\*\s*$)', line):
+            break
+        match = re.match(r'^\s*(?:[-*+]|\d+[.)])\s+(.+)$', line)
         if match:
-            level = len(match.group(1))
-            text = match.group(2).strip()
-            headers.append((level, text))
-    return headers
+            item = match.group(1).replace('**', '').strip()
+            items.append(item)
+    return items
+
+def split_sections(markdown_text: str, level: int = 2) -> list:
+    """
+    Split markdown text into sections at headers of the given level.
+
+    Header-like lines inside fenced code blocks are ignored.
+
+    Args:
+        markdown_text (str): The markdown text to split.
+        level (int): The header level that starts a new section.
+
+    Returns:
+        list: (header_text, body) tuples. Text before the first header is
+        returned with an empty header_text.
+    """
+    sections = []
+    heading = ""
+    body = []
+    in_code_block = False
+    prefix = '#' * level + ' '
+    for line in markdown_text.split('\n'):
+        if line.startswith('```'):
+            in_code_block = not in_code_block
+        if not in_code_block and line.startswith(prefix):
+            if heading or ''.join(body).strip():
+                sections.append((heading, '\n'.join(body).strip()))
+            heading = line[len(prefix):].strip()
+            body = []
+        else:
+            body.append(line)
+    if heading or ''.join(body).strip():
+        sections.append((heading, '\n'.join(body).strip()))
+    return sections
+
+class SectionStreamSplitter:
+    """
+    Detect "## " sections of a Markdown document as it is streamed in.
+
+    feed() returns the sections completed by each chunk, i.e. every section
+    whose next "## " header has arrived; close() returns the final one.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._heading = ""
+        self._body = []
+        self._in_code_block = False
+
+    def feed(self, text: str) -> list:
+        """
+        Add streamed text.
+
+        Args:
+            text (str): The next chunk of the document.
+
+        Returns:
+            list: (header_text, body) tuples for sections completed by this chunk.
+        """
+        self._buffer += text
+        completed = []
+        while '\n' in self._buffer:
+            line, self._buffer = self._buffer.split('\n', 1)
+            section = self._push_line(line)
+            if section:
+                completed.append(section)
+        return completed
+
+    def close(self) -> list:
+        """
+        Flush the last section once the stream has ended.
+
+        Returns:
+            list: The remaining (header_text, body) tuple, if any.
+        """
+        completed = []
+        if self._buffer:
+            section = self._push_line(self._buffer)
+            self._buffer = ""
+            if section:
+                completed.append(section)
+        if self._heading or ''.join(self._body).strip():
+            completed.append((self._heading, '\n'.join(self._body).strip()))
+        self._heading, self._body = "", []
+        return completed
+
+    def _push_line(self, line: str):
+        if line.startswith('```'):
+            self._in_code_block = not self._in_code_block
+        if self._in_code_block or not line.startswith('## '):
+            self._body.append(line)
+            return None
+        finished = None
+        if self._heading or ''.join(self._body).strip():
+            finished = (self._heading, '\n'.join(self._body).strip())
+        self._heading, self._body = line[3:].strip(), []
+        return finished
+
+def demote_headers(markdown_text: str, min_level: int) -> str:
+    """
+    Push headers down so that none is above the given level.
+
+    Args:
+        markdown_text (str): The markdown text to adjust.
+        min_level (int): The highest header level allowed (2 turns "#" into "##").
+
+    Returns:
+        str: The adjusted markdown text.
+    """
+    lines = []
+    in_code_block = False
+    for line in markdown_text.split('\n'):
+        if line.startswith('```'):
+            in_code_block = not in_code_block
+        match = None if in_code_block else re.match(r'^(#{1,6})\s+(.+)$', line)
+        if match and len(match.group(1)) < min_level:
+            line = '#' * min_level + ' ' + match.group(2)
+        lines.append(line)
+    return '\n'.join(lines)
 
 def add_syntax_highlighting(html_content: str) -> str:
     """
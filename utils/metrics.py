@@ -0,0 +1,360 @@
+# utils/metrics.py
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Timing fields returned by Ollama on the final (or only) /api/generate response.
+# Durations are reported in nanoseconds.
+OLLAMA_TIMING_FIELDS = (
+    "eval_count",
+    "eval_duration",
+    "prompt_eval_count",
+    "prompt_eval_duration",
+    "load_duration",
+    "total_duration",
+)
+
+DEFAULT_METRICS_LOG = os.path.join("logs", "metrics.jsonl")
+
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Optional[dict]) -> _Key:
+    return name, tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+
+def _labels_text(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    escaped = ((k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+class MetricsRegistry:
+    """
+    Thread-safe, in-process store of counters, gauges and summaries.
+
+    Metrics are identified by name plus a label dict, in the style of
+    Prometheus, and can be rendered in its text exposition format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[_Key, float] = {}
+        self._gauges: Dict[_Key, float] = {}
+        self._summaries: Dict[_Key, List[float]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str) -> None:
+        """Attach a HELP line to a metric name."""
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1.0, labels: Optional[dict] = None) -> None:
+        """Increase a counter."""
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, labels: Optional[dict] = None) -> None:
+        """Set a gauge to a value."""
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, labels: Optional[dict] = None) -> None:
+        """Record one observation in a summary (count, sum and max)."""
+        key = _key(name, labels)
+        with self._lock:
+            summary = self._summaries.setdefault(key, [0, 0.0, 0.0])
+            summary[0] += 1
+            summary[1] += value
+            summary[2] = max(summary[2], value)
+
+    def snapshot(self) -> dict:
+        """
+        Return every metric as plain data.
+
+        Returns:
+            dict: {"counters": [...], "gauges": [...], "summaries": [...]} with
+            one entry per name/label combination.
+        """
+        with self._lock:
+            return {
+                "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in self._counters.items()],
+                "gauges": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in self._gauges.items()],
+                "summaries": [
+                    {"name": n, "labels": dict(l), "count": s[0], "sum": s[1], "max": s[2]}
+                    for (n, l), s in self._summaries.items()
+                ],
+            }
+
+    def render_prometheus(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: The exposition text.
+        """
+        lines = []
+        with self._lock:
+            for kind, store in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted({n for n, _ in store}):
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for (n, labels), value in sorted(store.items()):
+                        if n == name:
+                            lines.append(f"{name}{_labels_text(labels)} {value}")
+            for name in sorted({n for n, _ in self._summaries}):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} summary")
+                for (n, labels), (count, total, _) in sorted(self._summaries.items()):
+                    if n == name:
+                        lines.append(f"{name}_count{_labels_text(labels)} {count}")
+                        lines.append(f"{name}_sum{_labels_text(labels)} {total}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """Drop every recorded metric."""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._summaries.clear()
+
+
+REGISTRY = MetricsRegistry()
+REGISTRY.describe("article_llm_requests_total", "LLM requests by agent and model; cached=\"true\" means served from the response cache, coalesced=\"true\" joined an identical request in flight.")
+REGISTRY.describe("article_llm_eval_tokens_total", "Tokens generated (Ollama eval_count).")
+REGISTRY.describe("article_llm_eval_seconds_total", "Time spent generating tokens (Ollama eval_duration).")
+REGISTRY.describe("article_llm_prompt_eval_tokens_total", "Prompt tokens evaluated (Ollama prompt_eval_count).")
+REGISTRY.describe("article_llm_prompt_eval_seconds_total", "Time spent evaluating prompts (Ollama prompt_eval_duration).")
+REGISTRY.describe("article_llm_load_seconds_total", "Time spent loading models (Ollama load_duration).")
+REGISTRY.describe("article_llm_request_seconds", "Local wall time per LLM request.")
+REGISTRY.describe("article_stage_seconds", "Local wall time per pipeline stage.")
+REGISTRY.describe("article_runs_total", "Completed pipeline runs by status.")
+REGISTRY.describe("article_exports_total", "Exported files by format and the renderer that produced them.")
+REGISTRY.describe("article_export_cache_total", "Exports served from the artifact store (hit) or rendered (miss).")
+REGISTRY.describe("article_export_renderer_info", "Renderer selected for each export format on this host.")
+
+
+class RunMetrics:
+    """
+    Per-run collection of LLM call timings and stage wall times.
+    """
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.started = time.time()
+        self.finished: Optional[float] = None
+        self.status = "running"
+        self.llm_calls: List[dict] = []
+        self.stages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add_llm_call(self, record: dict) -> None:
+        with self._lock:
+            self.llm_calls.append(record)
+
+    def add_stage(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def summary(self) -> dict:
+        """
+        Aggregate the run's metrics per agent.
+
+        Returns:
+            dict: Run ID, status, wall time, stage times and per-agent token
+            counts, durations (seconds) and tokens/sec.
+        """
+        agents: Dict[str, dict] = {}
+        with self._lock:
+            calls = list(self.llm_calls)
+            stages = dict(self.stages)
+        for call in calls:
+            agent = agents.setdefault(call["agent"], {
+                "model": call["model"], "calls": 0, "cached_calls": 0, "coalesced_calls": 0, "wall_seconds": 0.0,
+                "eval_count": 0, "eval_seconds": 0.0, "prompt_eval_count": 0,
+                "prompt_eval_seconds": 0.0, "load_seconds": 0.0,
+            })
+            agent["calls"] += 1
+            agent["cached_calls"] += int(call["cached"])
+            agent["coalesced_calls"] += int(call.get("coalesced", False))
+            agent["wall_seconds"] += call["wall_seconds"]
+            agent["eval_count"] += call.get("eval_count", 0)
+            agent["eval_seconds"] += call.get("eval_duration", 0) / 1e9
+            agent["prompt_eval_count"] += call.get("prompt_eval_count", 0)
+            agent["prompt_eval_seconds"] += call.get("prompt_eval_duration", 0) / 1e9
+            agent["load_seconds"] += call.get("load_duration", 0) / 1e9
+        for agent in agents.values():
+            agent["tokens_per_second"] = (
+                round(agent["eval_count"] / agent["eval_seconds"], 2) if agent["eval_seconds"] else None
+            )
+        end = self.finished or time.time()
+        return {
+            "run_id": self.run_id,
+            "status": self.status,
+            "started_at": self.started,
+            "wall_seconds": round(end - self.started, 3),
+            "stages": {stage: round(seconds, 3) for stage, seconds in stages.items()},
+            "agents": agents,
+        }
+
+
+_current_run: contextvars.ContextVar[Optional[RunMetrics]] = contextvars.ContextVar("current_run", default=None)
+
+
+def current_run() -> Optional[RunMetrics]:
+    """Return the metrics of the run executing in the current context, if any."""
+    return _current_run.get()
+
+
+@contextmanager
+def track_run(run_id: Optional[str] = None, log_path: Optional[str] = None) -> Iterator[RunMetrics]:
+    """
+    Collect metrics for one pipeline run.
+
+    LLM calls and stage timers in this context (including threads started with
+    a copied context) are attributed to the run. On exit the run summary is
+    appended as one JSON line to log_path, METRICS_LOG_PATH or logs/metrics.jsonl;
+    set METRICS_LOG_PATH to an empty string to disable the log.
+
+    Args:
+        run_id (str): Identifier of the run. A random one is used if omitted.
+        log_path (str): Where to append the JSON summary.
+
+    Yields:
+        RunMetrics: The run's metrics collector.
+    """
+    run = RunMetrics(run_id or uuid.uuid4().hex[:16])
+    token = _current_run.set(run)
+    try:
+        yield run
+        run.status = "ok"
+    except BaseException:
+        run.status = "error"
+        raise
+    finally:
+        try:
+            _current_run.reset(token)
+        except ValueError:
+            # A streaming generator closed from another context
+            pass
+        run.finished = time.time()
+        REGISTRY.inc("article_runs_total", labels={"status": run.status})
+        _write_log(run.summary(), log_path)
+
+
+def _write_log(summary: dict, log_path: Optional[str]) -> None:
+    if log_path is None:
+        log_path = os.environ.get("METRICS_LOG_PATH", DEFAULT_METRICS_LOG)
+    if not log_path:
+        return
+    try:
+        directory = os.path.dirname(log_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(summary) + "\n")
+    except OSError as e:
+        print(f"Could not write metrics log: {e}")
+
+
+def record_llm_call(
+    agent: str,
+    model: str,
+    response: Optional[dict],
+    wall_seconds: float,
+    cached: bool = False,
+    coalesced: bool = False,
+) -> None:
+    """
+    Record one LLM request in the registry and the current run.
+
+    Args:
+        agent (str): The agent that made the call.
+        model (str): The model name.
+        response (dict): The final Ollama response carrying timing fields, or
+            None for cache hits and coalesced calls.
+        wall_seconds (float): Local wall time of the call.
+        cached (bool): Whether the response came from the cache.
+        coalesced (bool): Whether the call joined an identical one in flight,
+            whose generation is recorded (and its tokens counted) by that call.
+    """
+    labels = {"agent": agent, "model": model}
+    timings = {field: (response or {}).get(field, 0) or 0 for field in OLLAMA_TIMING_FIELDS}
+
+    REGISTRY.inc(
+        "article_llm_requests_total",
+        labels=dict(labels, cached=str(cached).lower(), coalesced=str(coalesced).lower()),
+    )
+    REGISTRY.observe("article_llm_request_seconds", wall_seconds, labels=labels)
+    if not (cached or coalesced):
+        REGISTRY.inc("article_llm_eval_tokens_total", timings["eval_count"], labels=labels)
+        REGISTRY.inc("article_llm_eval_seconds_total", timings["eval_duration"] / 1e9, labels=labels)
+        REGISTRY.inc("article_llm_prompt_eval_tokens_total", timings["prompt_eval_count"], labels=labels)
+        REGISTRY.inc("article_llm_prompt_eval_seconds_total", timings["prompt_eval_duration"] / 1e9, labels=labels)
+        REGISTRY.inc("article_llm_load_seconds_total", timings["load_duration"] / 1e9, labels=labels)
+
+    run = current_run()
+    if run is not None:
+        run.add_llm_call(dict(
+            timings, agent=agent, model=model, cached=cached, coalesced=coalesced, wall_seconds=wall_seconds
+        ))
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """
+    Measure the local wall time of a pipeline stage.
+
+    Args:
+        stage (str): The stage name, e.g. "format" or "export_pdf".
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        REGISTRY.observe("article_stage_seconds", elapsed, labels={"stage": stage})
+        run = current_run()
+        if run is not None:
+            run.add_stage(stage, elapsed)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int = 9108, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """
+    Serve the registry at http://<host>:<port>/metrics from a daemon thread.
+
+    Args:
+        port (int): Port to listen on.
+        host (str): Interface to bind.
+
+    Returns:
+        ThreadingHTTPServer: The running server; call shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,143 @@
+# utils/model_residency.py
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Union
+
+from utils.context_budget import tagged_model_name, get_context_budget
+from utils.metrics import REGISTRY
+from utils.ollama_client import OllamaError, get_shared_client
+from utils.ollama_pool import get_shared_pool, hosts_from_env
+
+REGISTRY.describe("article_model_warmup_seconds", "Model load time reported by the last warm-up request.")
+
+KeepAlive = Union[str, int]
+
+
+def _parse_keep_alive(value: str) -> KeepAlive:
+    """Ollama takes durations ("10m", "1h") or seconds (-1 keeps a model loaded forever)."""
+    value = value.strip()
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+class ModelResidency:
+    """
+    Controls how long Ollama keeps each model in memory, and preloads models.
+
+    Every generate request carries the model's keep_alive, so models that are
+    used all the time can stay resident while rarely used ones are unloaded
+    early to make room. warm_up() loads models before the first real request,
+    so no user waits for a cold load.
+    """
+
+    def __init__(
+        self,
+        keep_alive: Optional[Dict[str, KeepAlive]] = None,
+        default_keep_alive: Optional[KeepAlive] = None,
+        warm_models: Optional[List[str]] = None,
+    ):
+        """
+        Args:
+            keep_alive (Dict[str, KeepAlive]): keep_alive per model.
+            default_keep_alive (KeepAlive): keep_alive for other models; None
+                leaves it to the server (OLLAMA_KEEP_ALIVE, 5 minutes by default).
+            warm_models (List[str]): Models that warm_up() loads by default.
+        """
+        self.keep_alive = {tagged_model_name(model): value for model, value in (keep_alive or {}).items()}
+        self.default_keep_alive = default_keep_alive
+        self.warm_models = [tagged_model_name(model) for model in warm_models or []]
+
+    def keep_alive_for(self, model: str) -> Optional[KeepAlive]:
+        """
+        Return the keep_alive to send with requests for a model.
+
+        Args:
+            model (str): The model name.
+
+        Returns:
+            Optional[KeepAlive]: The value, or None to use the server default.
+        """
+        return self.keep_alive.get(tagged_model_name(model), self.default_keep_alive)
+
+    def warm_up(self, models: Optional[List[str]] = None, background: bool = False) -> Dict[str, Optional[float]]:
+        """
+        Load models into memory on every Ollama host.
+
+        Sends an empty prompt, which makes Ollama load the model without
+        generating anything.
+
+        Args:
+            models (List[str]): Models to load. Defaults to the configured ones.
+            background (bool): Return immediately and warm up in a daemon thread.
+
+        Returns:
+            Dict[str, Optional[float]]: Seconds each model took to load (0 if
+            it was already resident, None if loading failed). Empty when run
+            in the background.
+        """
+        models = [tagged_model_name(model) for model in models] if models is not None else self.warm_models
+        if not models:
+            return {}
+        if background:
+            threading.Thread(target=self.warm_up, args=(models,), name="model-warmup", daemon=True).start()
+            return {}
+
+        hosts = hosts_from_env()
+        clients = [host.client for host in get_shared_pool(hosts).hosts] if hosts else [get_shared_client()]
+        loaded = {}
+        for model in models:
+            payload = {"model": model, "prompt": ""}
+            # Load with the window every request for the model uses, or the first one reloads it
+            num_ctx = get_context_budget().num_ctx_for(model)
+            if num_ctx:
+                payload["options"] = {"num_ctx": num_ctx}
+            keep_alive = self.keep_alive_for(model)
+            if keep_alive is not None:
+                payload["keep_alive"] = keep_alive
+            for client in clients:
+                started = time.perf_counter()
+                try:
+                    response = client.generate(payload)
+                except OllamaError as e:
+                    print(f"Could not warm up {model} on {client.base_url}: {e}")
+                    loaded[model] = None
+                    continue
+                seconds = response.get("load_duration", 0) / 1e9
+                REGISTRY.set_gauge("article_model_warmup_seconds", seconds, labels={"model": model, "host": client.base_url})
+                print(f"Warmed up {model} on {client.base_url} in {time.perf_counter() - started:.1f}s")
+                loaded.setdefault(model, seconds)
+        return loaded
+
+
+_residency: Optional[ModelResidency] = None
+_residency_lock = threading.Lock()
+
+
+def get_residency() -> ModelResidency:
+    """
+    Return the process-wide residency settings.
+
+    Configured from the environment on first use:
+    LLM_KEEP_ALIVE ("mistral=30m,codellama:7b=2m", with an optional bare
+    value such as "10m" as the default for other models) and
+    LLM_WARMUP_MODELS (comma-separated models to preload at startup).
+
+    Returns:
+        ModelResidency: The shared settings.
+    """
+    global _residency
+    with _residency_lock:
+        if _residency is None:
+            keep_alive, default = {}, None
+            for entry in filter(None, (part.strip() for part in os.environ.get("LLM_KEEP_ALIVE", "").split(","))):
+                model, _, value = entry.rpartition("=")
+                if model:
+                    keep_alive[model] = _parse_keep_alive(value)
+                else:
+                    default = _parse_keep_alive(value)
+            warm_models = [model.strip() for model in os.environ.get("LLM_WARMUP_MODELS", "").split(",") if model.strip()]
+            _residency = ModelResidency(keep_alive, default, warm_models)
+        return _residency
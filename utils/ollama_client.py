@@ -0,0 +1,379 @@
+# utils/ollama_client.py
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from typing import AsyncIterator, Iterator, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_OLLAMA_HOST = "http://localhost:11434"
+
+
+class OllamaError(Exception):
+    """Base class for failures talking to the Ollama server."""
+
+
+class OllamaConnectionError(OllamaError):
+    """The Ollama server could not be reached."""
+
+
+class OllamaTimeoutError(OllamaError):
+    """The Ollama server did not answer within the configured timeout."""
+
+
+class OllamaHTTPError(OllamaError):
+    """The Ollama server answered with an error status code."""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class OllamaResponseError(OllamaError):
+    """The Ollama server answered, but the body was empty or malformed."""
+
+
+def _backoff_delay(attempt: int, backoff_factor: float, max_backoff: float) -> float:
+    """Exponential backoff with jitter for the given retry attempt."""
+    delay = min(max_backoff, backoff_factor * (2 ** attempt))
+    return delay * (0.5 + random.random() / 2)
+
+
+def _normalize_base_url(base_url: str) -> str:
+    """Accept "host:port" as well as a full URL, as the Ollama CLI does."""
+    if "://" not in base_url:
+        base_url = f"http://{base_url}"
+    return base_url.rstrip("/")
+
+
+class OllamaClient:
+    """
+    Connection-pooled HTTP client for the Ollama REST API.
+
+    A single requests.Session is shared by every caller so TCP connections are
+    kept alive between prompts. Connection errors, connect timeouts and 5xx
+    responses are retried with exponential backoff; everything else is raised
+    as a typed OllamaError.
+    """
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_OLLAMA_HOST,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 600.0,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        max_backoff: float = 10.0,
+        pool_size: int = 16,
+    ):
+        self.base_url = _normalize_base_url(base_url)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _backoff(self, attempt: int) -> float:
+        """Exponential backoff with jitter for the given retry attempt."""
+        return _backoff_delay(attempt, self.backoff_factor, self.max_backoff)
+
+    def post(self, path: str, payload: dict, stream: bool = False) -> requests.Response:
+        """
+        POST a JSON payload to the Ollama API, retrying transient failures.
+
+        Args:
+            path (str): API path, e.g. "/api/generate".
+            payload (dict): JSON body to send.
+            stream (bool): Whether to stream the response body.
+
+        Returns:
+            requests.Response: The successful (2xx) response.
+
+        Raises:
+            OllamaError: If the request fails after all retries.
+        """
+        url = f"{self.base_url}{path}"
+        last_error: Optional[OllamaError] = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self._backoff(attempt - 1))
+            try:
+                response = self.session.post(
+                    url,
+                    json=payload,
+                    stream=stream,
+                    timeout=(self.connect_timeout, self.read_timeout),
+                )
+            except requests.exceptions.ConnectTimeout as e:
+                last_error = OllamaTimeoutError(f"Timed out connecting to Ollama at {url}: {e}")
+                continue
+            except requests.exceptions.ReadTimeout as e:
+                # The model was already generating; retrying would only double the cost.
+                raise OllamaTimeoutError(f"Ollama did not respond within {self.read_timeout}s: {e}") from e
+            except requests.exceptions.ConnectionError as e:
+                last_error = OllamaConnectionError(f"Could not connect to Ollama at {url}: {e}")
+                continue
+            except requests.exceptions.RequestException as e:
+                raise OllamaError(f"Error calling Ollama: {e}") from e
+
+            if response.status_code >= 500:
+                last_error = OllamaHTTPError(
+                    f"Ollama returned {response.status_code} for {url}: {response.text[:200]}",
+                    response.status_code,
+                )
+                response.close()
+                continue
+            if response.status_code >= 400:
+                message = f"Ollama returned {response.status_code} for {url}: {response.text[:200]}"
+                response.close()
+                raise OllamaHTTPError(message, response.status_code)
+            return response
+
+        raise last_error
+
+    def generate(self, payload: dict) -> dict:
+        """
+        Call /api/generate without streaming and return the decoded JSON body.
+
+        Args:
+            payload (dict): The generate request body.
+
+        Returns:
+            dict: The Ollama response, including "response" and timing fields.
+        """
+        response = self.post("/api/generate", dict(payload, stream=False))
+        try:
+            return response.json()
+        except ValueError as e:
+            raise OllamaResponseError(f"Ollama returned invalid JSON: {e}") from e
+
+    def stream_generate(self, payload: dict) -> Iterator[dict]:
+        """
+        Call /api/generate with streaming and yield each NDJSON chunk.
+
+        Only the initial request is retried; once tokens start flowing a
+        failure is raised to the caller. Closing the generator early closes the
+        underlying connection, which stops generation on the server.
+
+        Args:
+            payload (dict): The generate request body.
+
+        Yields:
+            dict: Decoded chunks; the last one has "done": True and the timing fields.
+        """
+        response = self.post("/api/generate", dict(payload, stream=True), stream=True)
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                try:
+                    chunk = json.loads(line)
+                except ValueError as e:
+                    raise OllamaResponseError(f"Ollama returned an invalid stream chunk: {e}") from e
+                if "error" in chunk:
+                    raise OllamaResponseError(f"Ollama stream failed: {chunk['error']}")
+                yield chunk
+                if chunk.get("done"):
+                    break
+        except requests.exceptions.RequestException as e:
+            raise OllamaConnectionError(f"Ollama stream was interrupted: {e}") from e
+        finally:
+            response.close()
+
+    def close(self) -> None:
+        """Close pooled connections."""
+        self.session.close()
+
+
+class AsyncOllamaClient:
+    """
+    Asyncio counterpart of OllamaClient built on httpx.AsyncClient.
+
+    Uses the same timeout, retry and error semantics, so one event loop can
+    drive many concurrent generations without a thread per request.
+    """
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_OLLAMA_HOST,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 600.0,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        max_backoff: float = 10.0,
+        pool_size: int = 64,
+    ):
+        self.base_url = _normalize_base_url(base_url)
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    async def _send(self, path: str, payload: dict, stream: bool = False) -> httpx.Response:
+        """
+        POST a JSON payload to the Ollama API, retrying transient failures.
+
+        Args:
+            path (str): API path, e.g. "/api/generate".
+            payload (dict): JSON body to send.
+            stream (bool): Whether to leave the response body unread for streaming.
+
+        Returns:
+            httpx.Response: The successful (2xx) response. Streaming responses
+            must be closed with aclose() by the caller.
+
+        Raises:
+            OllamaError: If the request fails after all retries.
+        """
+        url = f"{self.base_url}{path}"
+        last_error: Optional[OllamaError] = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(_backoff_delay(attempt - 1, self.backoff_factor, self.max_backoff))
+            try:
+                request = self.client.build_request("POST", url, json=payload)
+                response = await self.client.send(request, stream=stream)
+            except httpx.ConnectTimeout as e:
+                last_error = OllamaTimeoutError(f"Timed out connecting to Ollama at {url}: {e}")
+                continue
+            except httpx.TimeoutException as e:
+                # The model was already generating; retrying would only double the cost.
+                raise OllamaTimeoutError(f"Ollama did not respond within {self.read_timeout}s: {e}") from e
+            except httpx.TransportError as e:
+                last_error = OllamaConnectionError(f"Could not connect to Ollama at {url}: {e}")
+                continue
+            except httpx.HTTPError as e:
+                raise OllamaError(f"Error calling Ollama: {e}") from e
+
+            if response.status_code >= 400:
+                body = (await response.aread()).decode("utf-8", "replace")
+                await response.aclose()
+                error = OllamaHTTPError(
+                    f"Ollama returned {response.status_code} for {url}: {body[:200]}",
+                    response.status_code,
+                )
+                if response.status_code >= 500:
+                    last_error = error
+                    continue
+                raise error
+            return response
+
+        raise last_error
+
+    async def generate(self, payload: dict) -> dict:
+        """
+        Call /api/generate without streaming and return the decoded JSON body.
+
+        Args:
+            payload (dict): The generate request body.
+
+        Returns:
+            dict: The Ollama response, including "response" and timing fields.
+        """
+        response = await self._send("/api/generate", dict(payload, stream=False))
+        try:
+            return response.json()
+        except ValueError as e:
+            raise OllamaResponseError(f"Ollama returned invalid JSON: {e}") from e
+
+    async def stream_generate(self, payload: dict) -> AsyncIterator[dict]:
+        """
+        Call /api/generate with streaming and yield each NDJSON chunk.
+
+        Args:
+            payload (dict): The generate request body.
+
+        Yields:
+            dict: Decoded chunks; the last one has "done": True and the timing fields.
+        """
+        response = await self._send("/api/generate", dict(payload, stream=True), stream=True)
+        try:
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                try:
+                    chunk = json.loads(line)
+                except ValueError as e:
+                    raise OllamaResponseError(f"Ollama returned an invalid stream chunk: {e}") from e
+                if "error" in chunk:
+                    raise OllamaResponseError(f"Ollama stream failed: {chunk['error']}")
+                yield chunk
+                if chunk.get("done"):
+                    break
+        except httpx.HTTPError as e:
+            raise OllamaConnectionError(f"Ollama stream was interrupted: {e}") from e
+        finally:
+            await response.aclose()
+
+    async def aclose(self) -> None:
+        """Close pooled connections."""
+        await self.client.aclose()
+
+
+def _settings_from_env() -> dict:
+    """Client settings shared by the sync and async clients."""
+    return {
+        "base_url": os.environ.get("OLLAMA_HOST", DEFAULT_OLLAMA_HOST),
+        "connect_timeout": float(os.environ.get("OLLAMA_CONNECT_TIMEOUT", 5.0)),
+        "read_timeout": float(os.environ.get("OLLAMA_READ_TIMEOUT", 600.0)),
+        "max_retries": int(os.environ.get("OLLAMA_MAX_RETRIES", 3)),
+    }
+
+
+_shared_client: Optional[OllamaClient] = None
+_shared_client_lock = threading.Lock()
+
+
+def get_shared_client() -> OllamaClient:
+    """
+    Return the process-wide Ollama client used by every agent.
+
+    Configured from the environment on first use:
+    OLLAMA_HOST, OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT and OLLAMA_MAX_RETRIES.
+
+    Returns:
+        OllamaClient: The shared client.
+    """
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = OllamaClient(**_settings_from_env())
+        return _shared_client
+
+
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOllamaClient]" = weakref.WeakKeyDictionary()
+
+
+def get_shared_async_client() -> AsyncOllamaClient:
+    """
+    Return the async Ollama client shared by every agent on the running event loop.
+
+    httpx connection pools are bound to the loop that created them, so one
+    client is kept per loop. Must be called from inside a coroutine.
+
+    Returns:
+        AsyncOllamaClient: The shared async client for the current loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncOllamaClient(**_settings_from_env())
+        _async_clients[loop] = client
+    return client
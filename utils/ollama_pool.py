@@ -0,0 +1,492 @@
+# utils/ollama_pool.py
+import asyncio
+import os
+import threading
+import time
+import weakref
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
+
+import requests
+
+from utils.cancellation import current_token
+from utils.metrics import REGISTRY
+from utils.ollama_client import (
+    AsyncOllamaClient,
+    OllamaClient,
+    OllamaConnectionError,
+    OllamaError,
+    OllamaHTTPError,
+    OllamaTimeoutError,
+    _normalize_base_url,
+)
+
+REGISTRY.describe("article_ollama_host_healthy", "1 if the Ollama host passed its last health check.")
+REGISTRY.describe("article_ollama_host_in_flight", "Requests currently running on each Ollama host.")
+REGISTRY.describe("article_ollama_failovers_total", "Requests moved to another host after the given host failed.")
+
+
+def _wake(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class OllamaHost:
+    """One backend of an OllamaPool and what the pool knows about it."""
+
+    def __init__(self, url: str, client: OllamaClient, max_concurrency: int, client_settings: dict):
+        self.url = url
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.healthy = True
+        self.available_models: Set[str] = set()
+        self.loaded_models: Set[str] = set()
+        self.last_error: Optional[str] = None
+        self.last_probe: Optional[float] = None
+        self._client_settings = client_settings
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOllamaClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def async_client(self) -> AsyncOllamaClient:
+        """The async client for this host on the running event loop."""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = AsyncOllamaClient(self.url, **self._client_settings)
+            self._async_clients[loop] = client
+        return client
+
+    def rank(self, model: str) -> Tuple[bool, bool, float]:
+        """Sort key: hosts with the model loaded, then with it pulled, then the least busy."""
+        return (
+            model not in self.loaded_models,
+            model not in self.available_models,
+            self.in_flight / self.max_concurrency,
+        )
+
+    def snapshot(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "available_models": sorted(self.available_models),
+            "loaded_models": sorted(self.loaded_models),
+            "last_error": self.last_error,
+            "last_probe": self.last_probe,
+        }
+
+
+def _failover_action(error: OllamaError) -> Tuple[bool, bool]:
+    """
+    Decide how the pool reacts to a failed request.
+
+    Returns:
+        Tuple[bool, bool]: Whether to retry on another host, and whether to
+        mark the failed host unhealthy until its next successful probe.
+    """
+    if isinstance(error, (OllamaConnectionError, OllamaTimeoutError)):
+        return True, True
+    if isinstance(error, OllamaHTTPError):
+        if error.status_code >= 500:
+            return True, True
+        # The model may only be pulled on some hosts
+        return error.status_code == 404, False
+    return False, False
+
+
+class OllamaPool:
+    """
+    Load-balancing client over several Ollama hosts.
+
+    Exposes the same generate()/stream_generate() interface as OllamaClient
+    (and async ones via .async_client), routing each request to the
+    least-loaded healthy host, preferring hosts that already have the model
+    in memory (/api/ps) or pulled (/api/tags). Each host runs at most
+    max_concurrency requests at once; further requests wait for a free slot.
+    A request that fails to connect, times out or gets a 5xx moves to the
+    next host, and the failed host is skipped until a background probe finds
+    it healthy again. Streams only fail over before their first chunk. Each
+    failover is counted in article_ollama_failovers_total and its error kept
+    as the failed host's last_error (see stats()).
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        max_concurrency: int = 4,
+        probe_interval: float = 15.0,
+        probe_timeout: float = 2.0,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 600.0,
+        max_retries: int = 1,
+    ):
+        if not urls:
+            raise ValueError("OllamaPool needs at least one host")
+        settings = {"connect_timeout": connect_timeout, "read_timeout": read_timeout, "max_retries": max_retries}
+        self.hosts = []
+        for url in dict.fromkeys(_normalize_base_url(url) for url in urls):
+            self.hosts.append(OllamaHost(url, OllamaClient(url, **settings), max_concurrency, settings))
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.async_client = _AsyncPoolClient(self)
+        self._condition = threading.Condition()
+        # Async requests waiting for a slot, woken with the threads waiting on the condition
+        self._async_waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = set()
+        self._stop = threading.Event()
+        for host in self.hosts:
+            self._report(host)
+        threading.Thread(target=self._probe_loop, name="ollama-pool-probe", daemon=True).start()
+
+    # ---------------------------
+    # Health
+    # ---------------------------
+    def probe(self) -> None:
+        """Check every host's health and model lists now."""
+        for host in self.hosts:
+            self._probe_host(host)
+
+    def _probe_loop(self) -> None:
+        while True:
+            self.probe()
+            if self._stop.wait(self.probe_interval):
+                return
+
+    def _probe_host(self, host: OllamaHost) -> None:
+        try:
+            response = host.client.session.get(f"{host.url}/api/tags", timeout=self.probe_timeout)
+            response.raise_for_status()
+            available = {model["name"] for model in response.json().get("models", [])}
+            try:
+                response = host.client.session.get(f"{host.url}/api/ps", timeout=self.probe_timeout)
+                response.raise_for_status()
+                loaded = {model["name"] for model in response.json().get("models", [])}
+            except (requests.RequestException, ValueError):
+                # Older servers have no /api/ps
+                loaded = set()
+        except (requests.RequestException, ValueError) as e:
+            with self._condition:
+                host.healthy = False
+                host.last_error = str(e)
+                host.last_probe = time.time()
+        else:
+            with self._condition:
+                host.healthy = True
+                host.available_models = available
+                host.loaded_models = loaded
+                host.last_error = None
+                host.last_probe = time.time()
+                # A recovered host may unblock waiting requests
+                self._notify()
+        self._report(host)
+
+    # ---------------------------
+    # Routing
+    # ---------------------------
+    def _pick(self, model: str, exclude: Set[str]) -> Tuple[Optional[OllamaHost], bool]:
+        """
+        Choose a host with a free slot; the caller holds the condition.
+
+        Returns:
+            Tuple[Optional[OllamaHost], bool]: The host (None if all are busy),
+            and whether every host has already been tried.
+        """
+        candidates = [host for host in self.hosts if host.url not in exclude]
+        if not candidates:
+            return None, True
+        # When every remaining host looks down, try them anyway
+        healthy = [host for host in candidates if host.healthy] or candidates
+        free = [host for host in healthy if host.in_flight < host.max_concurrency]
+        if not free:
+            return None, False
+        host = min(free, key=lambda host: host.rank(model))
+        host.in_flight += 1
+        return host, False
+
+    def _acquire(self, model: str, exclude: Set[str]) -> Optional[OllamaHost]:
+        """
+        Wait for a slot on the best host; None once every host has been tried.
+
+        Raises:
+            RunCancelled: If the current cancellation token fires while waiting.
+        """
+        token = current_token()
+        unregister = token.on_cancel(self._wake) if token is not None else (lambda: None)
+        try:
+            with self._condition:
+                while True:
+                    host, exhausted = self._pick(model, exclude)
+                    if host is not None or exhausted:
+                        break
+                    # Checked under the condition, so a cancel that lands
+                    # before wait() still wakes it through _wake()
+                    if token is not None:
+                        token.raise_if_cancelled("ollama_host")
+                    self._condition.wait()
+        finally:
+            unregister()
+        if host is not None:
+            self._report(host)
+        return host
+
+    async def _aacquire(self, model: str, exclude: Set[str]) -> Optional[OllamaHost]:
+        """Async variant of _acquire() that waits on the event loop instead of blocking it."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                host, exhausted = self._pick(model, exclude)
+                if host is None and not exhausted:
+                    # Registered under the lock, so a slot freed right after is not missed
+                    waiter = (loop, loop.create_future())
+                    self._async_waiters.add(waiter)
+            if host is not None:
+                self._report(host)
+                return host
+            if exhausted:
+                return None
+            try:
+                await waiter[1]
+            finally:
+                with self._condition:
+                    self._async_waiters.discard(waiter)
+
+    def _wake(self) -> None:
+        """Wake every request waiting for a slot, e.g. so a cancelled one can give up."""
+        with self._condition:
+            self._notify()
+
+    def _notify(self) -> None:
+        """Wake every request waiting for a slot; the caller holds the condition."""
+        self._condition.notify_all()
+        for loop, future in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                # The waiter's loop is closed
+                pass
+        self._async_waiters.clear()
+
+    def _release(self, host: OllamaHost, error: Optional[OllamaError] = None) -> bool:
+        """
+        Free a host's slot after a request.
+
+        Returns:
+            bool: Whether the request may be retried on another host; the
+            caller reports a retry it makes with _failover().
+        """
+        retry, unhealthy = _failover_action(error) if error is not None else (False, False)
+        with self._condition:
+            host.in_flight -= 1
+            if unhealthy:
+                host.healthy = False
+                host.last_error = str(error)
+            self._notify()
+        self._report(host)
+        return retry
+
+    def _failover(self, host: OllamaHost, error: OllamaError) -> None:
+        """Record that a request failed on host and moves to another one."""
+        with self._condition:
+            host.last_error = str(error)
+        REGISTRY.inc("article_ollama_failovers_total", labels={"host": host.url})
+
+    def _report(self, host: OllamaHost) -> None:
+        REGISTRY.set_gauge("article_ollama_host_healthy", 1 if host.healthy else 0, labels={"host": host.url})
+        REGISTRY.set_gauge("article_ollama_host_in_flight", host.in_flight, labels={"host": host.url})
+
+    @staticmethod
+    def _exhausted(last_error: Optional[OllamaError]) -> OllamaError:
+        return last_error or OllamaConnectionError("No Ollama host is available")
+
+    # ---------------------------
+    # OllamaClient interface
+    # ---------------------------
+    def generate(self, payload: dict) -> dict:
+        """
+        Call /api/generate on the best host, failing over to the others.
+
+        Args:
+            payload (dict): The generate request body.
+
+        Returns:
+            dict: The Ollama response, including "response" and timing fields.
+        """
+        tried: Set[str] = set()
+        last_error = None
+        failed = None
+        while True:
+            host = self._acquire(payload.get("model", ""), tried)
+            if host is None:
+                raise self._exhausted(last_error)
+            if failed is not None:
+                # Counted once the request is actually moving to another host
+                self._failover(failed, last_error)
+            try:
+                response = host.client.generate(payload)
+            except OllamaError as e:
+                if not self._release(host, e):
+                    raise
+                failed = host
+                tried.add(host.url)
+                last_error = e
+                continue
+            except BaseException:
+                self._release(host)
+                raise
+            self._release(host)
+            return response
+
+    def stream_generate(self, payload: dict) -> Iterator[dict]:
+        """
+        Stream /api/generate from the best host, failing over until the first chunk arrives.
+
+        Args:
+            payload (dict): The generate request body.
+
+        Yields:
+            dict: Decoded chunks; the last one has "done": True and the timing fields.
+        """
+        tried: Set[str] = set()
+        last_error = None
+        failed = None
+        while True:
+            host = self._acquire(payload.get("model", ""), tried)
+            if host is None:
+                raise self._exhausted(last_error)
+            if failed is not None:
+                # Counted once the request is actually moving to another host
+                self._failover(failed, last_error)
+            started = False
+            try:
+                for chunk in host.client.stream_generate(payload):
+                    started = True
+                    yield chunk
+            except OllamaError as e:
+                if not self._release(host, e) or started:
+                    raise
+                failed = host
+                tried.add(host.url)
+                last_error = e
+                continue
+            except BaseException:
+                self._release(host)
+                raise
+            self._release(host)
+            return
+
+    def stats(self) -> List[dict]:
+        """
+        Report the state of every host.
+
+        Returns:
+            List[dict]: Health, load and known models per host.
+        """
+        with self._condition:
+            return [host.snapshot() for host in self.hosts]
+
+    def close(self) -> None:
+        """Stop probing and close pooled connections."""
+        self._stop.set()
+        for host in self.hosts:
+            host.client.close()
+
+
+class _AsyncPoolClient:
+    """The async (AsyncOllamaClient) interface of an OllamaPool."""
+
+    def __init__(self, pool: OllamaPool):
+        self.pool = pool
+
+    async def generate(self, payload: dict) -> dict:
+        """Async variant of OllamaPool.generate()."""
+        tried: Set[str] = set()
+        last_error = None
+        failed = None
+        while True:
+            host = await self.pool._aacquire(payload.get("model", ""), tried)
+            if host is None:
+                raise self.pool._exhausted(last_error)
+            if failed is not None:
+                # Counted once the request is actually moving to another host
+                self.pool._failover(failed, last_error)
+            try:
+                response = await host.async_client().generate(payload)
+            except OllamaError as e:
+                if not self.pool._release(host, e):
+                    raise
+                failed = host
+                tried.add(host.url)
+                last_error = e
+                continue
+            except BaseException:
+                self.pool._release(host)
+                raise
+            self.pool._release(host)
+            return response
+
+    async def stream_generate(self, payload: dict) -> AsyncIterator[dict]:
+        """Async variant of OllamaPool.stream_generate()."""
+        tried: Set[str] = set()
+        last_error = None
+        failed = None
+        while True:
+            host = await self.pool._aacquire(payload.get("model", ""), tried)
+            if host is None:
+                raise self.pool._exhausted(last_error)
+            if failed is not None:
+                # Counted once the request is actually moving to another host
+                self.pool._failover(failed, last_error)
+            started = False
+            try:
+                async for chunk in host.async_client().stream_generate(payload):
+                    started = True
+                    yield chunk
+            except OllamaError as e:
+                if not self.pool._release(host, e) or started:
+                    raise
+                failed = host
+                tried.add(host.url)
+                last_error = e
+                continue
+            except BaseException:
+                self.pool._release(host)
+                raise
+            self.pool._release(host)
+            return
+
+
+def hosts_from_env() -> List[str]:
+    """The comma-separated host list in OLLAMA_HOSTS, if set."""
+    return [url.strip() for url in os.environ.get("OLLAMA_HOSTS", "").split(",") if url.strip()]
+
+
+_pools: Dict[Tuple[str, ...], OllamaPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_shared_pool(urls: List[str]) -> OllamaPool:
+    """
+    Return the process-wide pool for a set of hosts, starting it on first use.
+
+    Configured from the environment: OLLAMA_HOST_CONCURRENCY (requests per
+    host, default 4), OLLAMA_PROBE_INTERVAL (seconds between health checks,
+    default 15), OLLAMA_CONNECT_TIMEOUT and OLLAMA_READ_TIMEOUT.
+
+    Args:
+        urls (List[str]): The Ollama hosts.
+
+    Returns:
+        OllamaPool: The shared pool.
+    """
+    key = tuple(_normalize_base_url(url) for url in urls)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = OllamaPool(
+                list(key),
+                max_concurrency=int(os.environ.get("OLLAMA_HOST_CONCURRENCY", 4)),
+                probe_interval=float(os.environ.get("OLLAMA_PROBE_INTERVAL", 15.0)),
+                connect_timeout=float(os.environ.get("OLLAMA_CONNECT_TIMEOUT", 5.0)),
+                read_timeout=float(os.environ.get("OLLAMA_READ_TIMEOUT", 600.0)),
+            )
+        return _pools[key]
@@ -0,0 +1,200 @@
+# utils/output_limits.py
+import os
+import re
+from typing import List, Optional
+
+from utils.metrics import REGISTRY
+
+REGISTRY.describe("article_llm_early_stops_total", "Generations ended by their output limit before the model finished, by reason.")
+
+_HEADER = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+
+
+def limits_enabled() -> bool:
+    """Output limits apply unless LLM_OUTPUT_LIMITS_DISABLED is set."""
+    return os.environ.get("LLM_OUTPUT_LIMITS_DISABLED", "").lower() not in ("1", "true", "yes")
+
+
+class OutputLimit:
+    """
+    How much one kind of request may generate.
+
+    num_predict and stop are passed to Ollama, which enforces them itself.
+    The structural limits are checked on the streamed text as it arrives, and
+    the request is ended at a clean boundary as soon as the target is met:
+
+        max_words: stop at the first paragraph break after this many words;
+        max_sections: stop at the "## " header after this many;
+        last_section: stop at the next header of the same or a higher level
+            once a header matching this pattern has been written;
+        max_items: stop at the header after this many headers matching
+            item_pattern (e.g. "### Example 3").
+
+    A "# " header after any output always ends it, since it starts a new document.
+    """
+
+    def __init__(
+        self,
+        num_predict: Optional[int] = None,
+        stop: Optional[List[str]] = None,
+        max_words: Optional[int] = None,
+        max_sections: Optional[int] = None,
+        last_section: Optional[str] = None,
+        max_items: Optional[int] = None,
+        item_pattern: str = r"^example\b",
+    ):
+        self.num_predict = num_predict
+        self.stop = list(stop or [])
+        self.max_words = max_words
+        self.max_sections = max_sections
+        self.last_section = last_section
+        self.max_items = max_items
+        self.item_pattern = item_pattern
+
+    def options(self) -> dict:
+        """The Ollama options that enforce this limit on the server."""
+        options = {}
+        if self.num_predict:
+            options["num_predict"] = self.num_predict
+        if self.stop:
+            options["stop"] = self.stop
+        return options
+
+    def key(self) -> dict:
+        """Everything that affects the output, for cache and coalescing keys."""
+        return dict(
+            self.options(),
+            structure=[self.max_words, self.max_sections, self.last_section, self.max_items, self.item_pattern],
+        )
+
+    @property
+    def structural(self) -> bool:
+        """Whether the limit needs the response streamed to enforce it."""
+        return bool(self.max_words or self.max_sections or self.last_section or self.max_items)
+
+    def stopper(self) -> "StructuralStopper":
+        return StructuralStopper(self)
+
+
+class StructuralStopper:
+    """
+    Watches streamed Markdown and decides when an OutputLimit has been met.
+
+    feed() returns the part of each chunk that may be passed on. Lines that
+    could be headers are held back until they are complete, so a header that
+    ends the output is never emitted; everything else passes through at once.
+    """
+
+    def __init__(self, limit: OutputLimit):
+        self.limit = limit
+        self.done = False
+        self.reason: Optional[str] = None
+        self.words = 0
+        self._line = ""
+        self._sent = 0
+        self._in_code = False
+        self._has_content = False
+        self._sections = 0
+        self._items = 0
+        self._last_level: Optional[int] = None
+
+    def feed(self, text: str) -> str:
+        """
+        Add streamed text.
+
+        Args:
+            text (str): The next chunk of the response.
+
+        Returns:
+            str: Text to emit; empty once the limit is met.
+        """
+        emitted = []
+        for piece in re.split(r"(?<=\n)", text):
+            if self.done:
+                break
+            if not piece:
+                continue
+            self._line += piece
+            if not self._line.endswith("\n"):
+                if not self._holding():
+                    emitted.append(self._line[self._sent:])
+                    self._sent = len(self._line)
+                continue
+
+            line, sent = self._line, self._sent
+            self._line, self._sent = "", 0
+            if self._ends_before(line):
+                break
+            emitted.append(line[sent:])
+            self._count(line)
+        return "".join(emitted)
+
+    def flush(self) -> str:
+        """
+        Return held-back text once the stream has ended.
+
+        Returns:
+            str: The rest of an unterminated last line, unless it ends the output.
+        """
+        line, sent = self._line, self._sent
+        self._line, self._sent = "", 0
+        if self.done or not line or self._ends_before(line):
+            return ""
+        return line[sent:]
+
+    def _holding(self) -> bool:
+        """Whether the unfinished current line might turn out to be a header."""
+        if self._in_code or self._sent:
+            return False
+        stripped = self._line.lstrip(" ")
+        return not stripped or stripped.startswith("#")
+
+    def _stop(self, reason: str) -> bool:
+        self.done = True
+        self.reason = reason
+        return True
+
+    def _ends_before(self, line: str) -> bool:
+        """Whether line starts past the limit, so it and everything after it are dropped."""
+        match = None if self._in_code else _HEADER.match(line)
+        if not match:
+            return False
+        level, title = len(match.group(1)), match.group(2)
+        if level == 1 and self._has_content:
+            return self._stop("document")
+        if self._last_level is not None and level <= self._last_level:
+            return self._stop("last_section")
+        if level == 2 and self.limit.max_sections and self._sections >= self.limit.max_sections:
+            return self._stop("sections")
+        if self.limit.max_items and self._items >= self.limit.max_items and re.search(self.limit.item_pattern, title, re.IGNORECASE):
+            return self._stop("items")
+        return False
+
+    def _count(self, line: str) -> None:
+        """Update the counts with an emitted line; may end the output after it."""
+        stripped = line.strip()
+        if stripped.startswith("```"):
+            self._in_code = not self._in_code
+            self._has_content = True
+            return
+        match = None if self._in_code else _HEADER.match(line)
+        if match:
+            level, title = len(match.group(1)), match.group(2)
+            self._has_content = True
+            if level == 2:
+                self._sections += 1
+            if re.search(self.limit.item_pattern, title, re.IGNORECASE):
+                self._items += 1
+            if self.limit.last_section and re.search(self.limit.last_section, title, re.IGNORECASE):
+                self._last_level = level
+            return
+        if stripped:
+            self._has_content = True
+            self.words += len(stripped.split())
+        elif self.limit.max_words and self.words >= self.limit.max_words and not self._in_code:
+            self._stop("words")
+
+
+def record_early_stop(agent: str, model: str, reason: str) -> None:
+    """Count a generation ended by a structural limit."""
+    REGISTRY.inc("article_llm_early_stops_total", labels={"agent": agent, "model": model, "reason": reason})
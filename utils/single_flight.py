@@ -0,0 +1,264 @@
+# utils/single_flight.py
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from utils.cancellation import (
+    CancellationGroup,
+    CancellationToken,
+    await_or_cancel,
+    cancellation,
+    check_cancelled,
+    context_with,
+    current_token,
+    wait_event,
+)
+from utils.metrics import REGISTRY
+
+REGISTRY.describe(
+    "article_coalesced_requests_total",
+    "Requests that joined an identical request already in flight instead of running it, by kind.",
+)
+
+
+class _SharedStream:
+    """
+    One iterator consumed by several readers, each of which sees every item.
+
+    Items are kept for readers that join late. Whichever reader reaches the
+    end of the buffered items pulls the next one from the source, so the
+    stream keeps going as long as any reader is left; the source is closed
+    when the last reader stops early. The source always runs in the context
+    it was created in, with the group's cancellation token, which is
+    cancelled once every reader has cancelled.
+    """
+
+    def __init__(self, source: Iterator):
+        self.source = source
+        self.group = CancellationGroup()
+        self.context = context_with(self.group.token)
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.readers = 0
+        self._pulling = False
+        self._condition = threading.Condition()
+
+    def attach(self) -> bool:
+        """Register a reader; False if the stream has already finished."""
+        with self._condition:
+            if self.done:
+                return False
+            self.readers += 1
+            return True
+
+    def read(self, token: Optional[CancellationToken] = None) -> Iterator:
+        """Iterate every item from the start, until token is cancelled; call attach() first."""
+        index = 0
+        unregister = token.on_cancel(self._wake) if token is not None else lambda: None
+        try:
+            while True:
+                pull = False
+                with self._condition:
+                    self._condition.wait_for(
+                        lambda: index < len(self.items) or self.done or not self._pulling
+                        or (token is not None and token.cancelled)
+                    )
+                    if token is not None:
+                        token.raise_if_cancelled("stream")
+                    if index < len(self.items):
+                        item = self.items[index]
+                    elif self.done:
+                        if self.error is not None:
+                            raise self.error
+                        return
+                    else:
+                        self._pulling = pull = True
+
+                if pull:
+                    self._pull()
+                    continue
+                index += 1
+                yield item
+        finally:
+            unregister()
+            with self._condition:
+                self.readers -= 1
+                abandoned = self.readers == 0 and not self.done
+                if abandoned:
+                    self.done = True
+                    self.error = RuntimeError("shared stream was abandoned by all of its readers")
+            if abandoned:
+                self.context.run(self.source.close)
+
+    def _wake(self) -> None:
+        with self._condition:
+            self._condition.notify_all()
+
+    def _pull(self) -> None:
+        """Fetch the next item from the source; called by one reader at a time."""
+        try:
+            item = self.context.run(next, self.source)
+        except StopIteration:
+            with self._condition:
+                self.done = True
+        except BaseException as e:
+            with self._condition:
+                self.done = True
+                self.error = e
+        else:
+            with self._condition:
+                self.items.append(item)
+        finally:
+            with self._condition:
+                self._pulling = False
+                self._condition.notify_all()
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls.
+
+    While a call for a key is in flight, further calls with the same key do
+    not run their own function; they wait for the first one and receive its
+    result (or exception). The key is forgotten as soon as the call finishes,
+    so this deduplicates concurrent work only and never serves stale results.
+
+    Callers that are cancelled (through the current CancellationToken) stop
+    waiting at once. The shared call runs with a token of its own that is
+    cancelled only when every caller waiting for it has been cancelled; a
+    cancelled caller that is running the call itself carries on for the
+    others and raises RunCancelled when it returns.
+    """
+
+    def __init__(self, kind: str):
+        """
+        Args:
+            kind (str): Label for the coalesced-requests metric, e.g. "llm".
+        """
+        self.kind = kind
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Tuple[Future, CancellationGroup]] = {}
+        self._streams: Dict[Hashable, _SharedStream] = {}
+
+    def _join(self, key: Hashable) -> Tuple[Future, CancellationGroup, Callable[[], None], bool]:
+        """
+        Return the in-flight call for key, the caller's leave() for its
+        cancellation group, and whether the caller leads the call.
+        """
+        token = current_token()
+        with self._lock:
+            call = self._calls.get(key)
+            # A call that every caller has abandoned is being torn down; start afresh
+            if call is not None and not call[1].token.cancelled:
+                REGISTRY.inc("article_coalesced_requests_total", labels={"kind": self.kind})
+                return call[0], call[1], call[1].join(token), False
+            call = self._calls[key] = (Future(), CancellationGroup())
+            return call[0], call[1], call[1].join(token), True
+
+    def _leave(self, key: Hashable, future: Future) -> None:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call[0] is future:
+                del self._calls[key]
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Call fn, or wait for an identical call already in flight.
+
+        Args:
+            key: Identifies calls that are interchangeable.
+            fn: Computes the result.
+
+        Returns:
+            Tuple[Any, bool]: The result, and whether it was shared from
+            another caller's call.
+        """
+        future, group, leave, leader = self._join(key)
+        if not leader:
+            try:
+                done = threading.Event()
+                future.add_done_callback(lambda _: done.set())
+                wait_event(done, current_token(), "coalesced")
+                return future.result(), True
+            finally:
+                leave()
+
+        try:
+            with cancellation(group.token):
+                value = fn()
+        except BaseException as e:
+            self._leave(key, future)
+            future.set_exception(e)
+            raise
+        finally:
+            leave()
+        self._leave(key, future)
+        future.set_result(value)
+        check_cancelled("coalesced")
+        return value, False
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Async variant of do(). Shares in-flight calls with do() callers.
+
+        Args:
+            key: Identifies calls that are interchangeable.
+            fn: Returns an awaitable that computes the result.
+
+        Returns:
+            Tuple[Any, bool]: The result, and whether it was shared.
+        """
+        future, group, leave, leader = self._join(key)
+        if not leader:
+            try:
+                # Shielded, so a follower giving up does not cancel the shared future
+                return await await_or_cancel(asyncio.shield(asyncio.wrap_future(future)), current_token(), "coalesced"), True
+            finally:
+                leave()
+
+        try:
+            with cancellation(group.token):
+                value = await fn()
+        except BaseException as e:
+            self._leave(key, future)
+            future.set_exception(e)
+            raise
+        finally:
+            leave()
+        self._leave(key, future)
+        future.set_result(value)
+        check_cancelled("coalesced")
+        return value, False
+
+    def stream(self, key: Hashable, fn: Callable[[], Iterator]) -> Iterator:
+        """
+        Iterate fn(), or replay an identical stream already in flight.
+
+        Every caller receives every item from the start, including items
+        produced before it joined.
+
+        Args:
+            key: Identifies streams that are interchangeable.
+            fn: Returns the iterator to share.
+
+        Yields:
+            The shared stream's items.
+        """
+        token = current_token()
+        with self._lock:
+            shared = self._streams.get(key)
+            if shared is not None and not shared.group.token.cancelled and shared.attach():
+                REGISTRY.inc("article_coalesced_requests_total", labels={"kind": self.kind})
+            else:
+                shared = self._streams[key] = _SharedStream(fn())
+                shared.attach()
+            leave = shared.group.join(token)
+        try:
+            yield from shared.read(token)
+        finally:
+            leave()
+            with self._lock:
+                if shared.done and self._streams.get(key) is shared:
+                    del self._streams[key]